@@ -2,15 +2,23 @@ import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-import ticketing.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'helpdesk.settings')
 
+# Apps must be loaded before the routing (consumers, models) is imported
+django_asgi_app = get_asgi_application()
+
+import ticketing.routing
+from ticketing.authentication import JWTWebsocketMiddleware
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            ticketing.routing.websocket_urlpatterns
+        # API clients authenticate with the same JWT access tokens as REST requests
+        JWTWebsocketMiddleware(
+            URLRouter(
+                ticketing.routing.websocket_urlpatterns
+            )
         )
     ),
-})
\ No newline at end of file
+})
@@ -72,13 +72,117 @@ CHANNEL_LAYERS = {
         "BACKEND": "channels.layers.InMemoryChannelLayer",  # For dev; use Redis in prod
     },
 }
+# WebSocket notifications are written to an outbox and sent after commit.
+# Set DISPATCH_IN_PROCESS to False when running `manage.py dispatch_notifications` instead.
+NOTIFICATION_OUTBOX = {
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 10,
+    "RETRY_DELAY": 2,
+    "CLAIM_TIMEOUT": 60,  # seconds a batch being sent is hidden from other dispatchers
+    "DEAD_RETENTION": 7 * 24 * 60 * 60,  # seconds rows that ran out of attempts are kept
+    "POLL_INTERVAL": 5,
+    "COALESCE_WINDOW": 0.25,  # seconds; bursts per user/ticket are merged into one frame
+    "DISPATCH_IN_PROCESS": True,
+}
+
+# Per-user notification history replayed to reconnecting sockets (?last_seq=N).
+# Prune expired rows with `manage.py prune_notifications`.
+NOTIFICATION_REPLAY = {
+    "RETENTION": 7 * 24 * 60 * 60,  # seconds
+    "MAX_REPLAY": 500,
+}
+
 #Simple JWt Authentication classes 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Resolves request.user from token claims (see LoginSerializer.tokens) instead of
+        # loading the user row on every request. Use
+        # "rest_framework_simplejwt.authentication.JWTAuthentication" to always hit the DB.
+        "ticketing.authentication.ClaimsJWTAuthentication",
     )
 }
 
+# Shared by every worker for rate limiting and caching. Local memory is per process;
+# use "django.core.cache.backends.redis.RedisCache" with a LOCATION in production.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+# Rendered list pages shared by every caller of a role, invalidated by model generation
+# counters bumped from post_save / post_delete (see ticketing.listcache).
+LIST_CACHE = {
+    "CACHE": "default",
+    "TIMEOUT": 300,
+    "ROLES": ["super_admin"],
+}
+
+# Buffered audit log writer (ticketing.audit)
+AUDIT_LOG = {
+    "BATCH_SIZE": 200,
+    "FLUSH_INTERVAL": 1.0,  # seconds
+    "MAX_QUEUE": 10000,
+    "FLUSH_IN_PROCESS": True,
+}
+
+# Resolved tickets move to ArchivedTicket after AFTER_DAYS (manage.py archive_tickets)
+TICKET_ARCHIVE = {
+    "AFTER_DAYS": 90,
+    "BATCH_SIZE": 500,
+}
+
+# Near-duplicate warnings on ticket creation (ticketing.similarity)
+DUPLICATE_DETECTION = {
+    "THRESHOLD": 0.35,
+    "LIMIT": 5,
+    "REJECT": False,
+}
+
+# Ticket/task change log behind GET /api/changes/?since=<cursor> (ticketing.changefeed)
+CHANGE_FEED = {
+    "PAGE_SIZE": 500,
+    "MAX_PAGE_SIZE": 2000,
+    "RETENTION": 30 * 24 * 60 * 60,  # seconds (manage.py prune_changes)
+}
+
+# Overdue-task notices (manage.py run_deadline_scheduler, ticketing.deadlines)
+TASK_DEADLINES = {
+    "HORIZON_DAYS": 7,
+    "POLL_INTERVAL": 5,  # seconds
+    "BATCH_SIZE": 500,
+}
+
+# Resolution times, agent throughput and backlog curves at GET /api/analytics/ (ticketing.analytics)
+ANALYTICS = {
+    "CACHE": "default",
+    "TIMEOUT": 300,  # seconds, windows reaching the present
+    "HISTORICAL_TIMEOUT": 24 * 60 * 60,  # seconds, windows entirely in the past
+    "BATCH_SIZE": 50000,
+    "MAX_BUCKETS": 1000,
+    "DEFAULT_DAYS": 30,
+}
+
+# Least-loaded assignment of new tickets and of tasks created without an assignee
+# (ticketing.assignment); agents are matched on these CustomUser fields, broadest first
+AUTO_ASSIGNMENT = {
+    "ENABLED": False,
+    "MATCH": ["branch", "location", "department"],
+    "RELOAD_INTERVAL": 60,  # seconds between background reloads; 0 turns them off
+}
+
+# Sliding-window limits per endpoint rule, optionally per user_type ("anonymous" when
+# not logged in). Rates are "<count>/<s|min|hour|day>"; None disables the limit.
+RATE_LIMITS = {
+    "tickets.create": {"default": "10/day"},
+    "auth.login": {"default": "10/min"},
+    "auth.reset": {"default": "5/hour"},
+    "auth.confirm_reset": {"default": "10/hour"},
+}
+
+# Seconds a user row fetched for claims the access token does not carry stays cached
+CLAIMS_USER_CACHE_TTL = 30
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=50),
@@ -141,6 +245,47 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Attachments go through the "attachments" storage; point it at
+# "storages.backends.s3.S3Storage" (django-storages) in production.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    "attachments": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.path.join(MEDIA_ROOT, 'attachments'),
+            "base_url": MEDIA_URL + 'attachments/',
+        },
+    },
+}
+
+# Resumable uploads are staged on local disk; share UPLOAD_DIR between hosts
+# if uploads can be resumed against a different machine.
+ATTACHMENT_UPLOADS = {
+    "UPLOAD_DIR": os.path.join(MEDIA_ROOT, 'uploads'),
+    "MAX_CHUNK_SIZE": 5 * 1024 * 1024,
+    "EXPIRY": 24 * 60 * 60,  # seconds an idle upload is kept
+}
+
+# Set OFFLOAD to "x-accel-redirect" behind nginx (with an `internal` location at
+# ACCEL_PREFIX aliased to the attachments directory) or "x-sendfile" behind
+# Apache/lighttpd, so the proxy streams downloads instead of a worker.
+ATTACHMENT_DOWNLOADS = {
+    "OFFLOAD": None,
+    "ACCEL_PREFIX": "/protected-attachments/",
+}
+
+# Image attachment thumbnails, rendered by Pillow in a process pool (ticketing.thumbnails)
+THUMBNAILS = {
+    "SIZES": {"thumb": 128, "small": 320, "preview": 1024},
+    "WORKERS": 2,
+    "WAIT": 0.25,
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWS_CREDENTIALS = True
 
@@ -0,0 +1,208 @@
+import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+
+from ticketing import models
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,  # seconds, for windows that include the present
+    'HISTORICAL_TIMEOUT': 24 * 60 * 60,  # seconds, for windows entirely in the past
+    'BATCH_SIZE': 50000,  # rows per values_list() query
+    'MAX_BUCKETS': 1000,
+    'DEFAULT_DAYS': 30,
+}
+
+BUCKETS = ['day', 'week', 'month']
+RESOLVED_STATUSES = ['resolved', 'closed']
+PERCENTILES = [50, 90, 95, 99]
+# Resolution-time histogram edges in hours; the last count is everything above the last edge
+HISTOGRAM_HOURS = [0, 1, 4, 8, 24, 48, 72, 168, 336, 720]
+
+
+def get_setting(name):
+    return getattr(settings, 'ANALYTICS', {}).get(name, DEFAULTS[name])
+
+
+def to_epoch(values):
+    return np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+
+
+def columns(queryset, fields, batch_size=None):
+    # Yields the rows of `queryset` as one tuple of columns per batch, read in keyset order
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    last_id = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_id is not None:
+            batch = batch.filter(pk__gt=last_id)
+        rows = list(batch.values_list('pk', *fields)[:batch_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield list(zip(*rows))[1:]
+
+
+def load_tickets(start, end):
+    # Creation and resolution times (epoch seconds, NaN while open) of the tickets that
+    # were created or resolved in the window, archived ones included, and the count of
+    # older tickets still open at its end, which only shift the backlog curve
+    created, resolved = [], []
+    resolved_before_end = Q(status__in=RESOLVED_STATUSES, updated_at__lt=end)
+    tickets = models.Ticket.objects.filter(created_at__lt=end)
+    archived = models.ArchivedTicket.objects.filter(created_at__lt=end)
+
+    # A resolved ticket's last update is its resolution, as in archive_batch
+    queryset = tickets.filter(Q(created_at__gte=start) | (resolved_before_end & Q(updated_at__gte=start)))
+    for created_at, updated_at, status in columns(queryset, ['created_at', 'updated_at', 'status']):
+        is_resolved = np.isin(np.array(status), RESOLVED_STATUSES)
+        created.append(to_epoch(created_at))
+        resolved.append(np.where(is_resolved, to_epoch(updated_at), np.nan))
+
+    queryset = archived.filter(Q(created_at__gte=start) | Q(resolved_at__gte=start, resolved_at__lt=end))
+    for created_at, resolved_at in columns(queryset, ['created_at', 'resolved_at']):
+        created.append(to_epoch(created_at))
+        resolved.append(to_epoch(resolved_at))
+
+    carried = (
+        tickets.filter(created_at__lt=start).exclude(resolved_before_end).count()
+        + archived.filter(created_at__lt=start, resolved_at__gte=end).count()
+    )
+    if not created:
+        return np.empty(0), np.empty(0), carried
+    return np.concatenate(created), np.concatenate(resolved), carried
+
+
+def load_tasks(start, end):
+    # Tasks created before the window's end that were finished since its start or are
+    # still open, the only ones agent_throughput() counts. Hot-table tasks only: archived
+    # tickets keep theirs as JSON, so windows older than TICKET_ARCHIVE["AFTER_DAYS"]
+    # undercount agent throughput.
+    assignees, done, created, updated = [], [], [], []
+    queryset = models.Task.objects.filter(Q(updated_at__gte=start) | ~Q(status='done'), created_at__lt=end)
+    for assigned_to_id, status, created_at, updated_at in columns(
+        queryset, ['assigned_to_id', 'status', 'created_at', 'updated_at'],
+    ):
+        assignees.append(np.array(assigned_to_id, dtype=np.int64))
+        done.append(np.array(status) == 'done')
+        created.append(to_epoch(created_at))
+        updated.append(to_epoch(updated_at))
+
+    if not assignees:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), np.empty(0), np.empty(0)
+    return np.concatenate(assignees), np.concatenate(done), np.concatenate(created), np.concatenate(updated)
+
+
+def resolution_stats(created, resolved, start, end):
+    with np.errstate(invalid='ignore'):
+        in_window = (resolved >= start) & (resolved < end)
+    hours = (resolved[in_window] - created[in_window]) / 3600
+    counts, _ = np.histogram(hours, bins=HISTOGRAM_HOURS + [np.inf])
+    stats = {
+        "count": int(hours.size),
+        "mean_hours": None,
+        "percentiles_hours": {f"p{p}": None for p in PERCENTILES},
+        "histogram": {"edges_hours": HISTOGRAM_HOURS, "counts": counts.tolist()},
+    }
+    if hours.size:
+        stats["mean_hours"] = round(float(hours.mean()), 2)
+        stats["percentiles_hours"] = {
+            f"p{p}": round(float(value), 2) for p, value in zip(PERCENTILES, np.percentile(hours, PERCENTILES))
+        }
+    return stats
+
+
+def backlog_curve(created, resolved, edges, carried=0):
+    # Per bucket: tickets opened, tickets resolved, and tickets still open at its end;
+    # `carried` tickets were opened before the window and stay open through it
+    opened = np.searchsorted(np.sort(created), edges, side='left')
+    closed = np.searchsorted(np.sort(resolved[~np.isnan(resolved)]), edges, side='left')
+    return {
+        "created": np.diff(opened).tolist(),
+        "resolved": np.diff(closed).tolist(),
+        "open": (carried + opened[1:] - closed[1:]).tolist(),
+    }
+
+
+def agent_throughput(assignees, done, created, updated, start, end):
+    # Tasks finished in the window, mean hours to finish them, and tasks open at its end,
+    # per agent. A done task's last update is taken as its finish, so one finished after
+    # the window still counts as open, as the backlog curve counts tickets.
+    if not assignees.size:
+        return []
+    agent_ids, inverse = np.unique(assignees, return_inverse=True)
+    finished = done & (updated >= start) & (updated < end)
+    finished_counts = np.bincount(inverse, weights=finished, minlength=agent_ids.size)
+    open_counts = np.bincount(inverse, weights=~done | (updated >= end), minlength=agent_ids.size)
+    hours = np.bincount(inverse, weights=np.where(finished, (updated - created) / 3600, 0), minlength=agent_ids.size)
+
+    rows = []
+    for position in np.argsort(-finished_counts, kind='stable'):
+        rows.append({
+            "agent_id": int(agent_ids[position]),
+            "done": int(finished_counts[position]),
+            "open": int(open_counts[position]),
+            "mean_hours_to_done": (
+                round(float(hours[position] / finished_counts[position]), 2) if finished_counts[position] else None
+            ),
+        })
+    return rows
+
+
+def add_months(moment, months):
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1)
+
+
+def bucket_edges(start, end, bucket):
+    if bucket == 'month':
+        start = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    edges = [start]
+    while edges[-1] < end:
+        if len(edges) > get_setting('MAX_BUCKETS'):
+            raise ValueError(f"More than {get_setting('MAX_BUCKETS')} buckets; use a wider bucket or a shorter window.")
+        if bucket == 'month':
+            edges.append(add_months(start, len(edges)))
+        else:
+            edges.append(start + datetime.timedelta(days=len(edges) * (7 if bucket == 'week' else 1)))
+    return edges
+
+
+def default_window():
+    # Whole days, so repeated requests during a day share one cache entry
+    end = timezone.make_aware(datetime.datetime.combine(timezone.localdate() + datetime.timedelta(days=1), datetime.time.min))
+    return end - datetime.timedelta(days=get_setting('DEFAULT_DAYS')), end
+
+
+def report(start, end, bucket='day'):
+    edges = bucket_edges(start, end, bucket)
+    epoch_edges = np.array([edge.timestamp() for edge in edges])
+    start, end = epoch_edges[0], epoch_edges[-1]
+
+    created, resolved, carried = load_tickets(edges[0], edges[-1])
+    agents = agent_throughput(*load_tasks(edges[0], edges[-1]), start, end)
+    names = {user.pk: str(user) for user in models.CustomUser.objects.filter(pk__in=[row["agent_id"] for row in agents])}
+    for row in agents:
+        row["agent"] = names.get(row["agent_id"])
+
+    return {
+        "window": {"start": edges[0], "end": edges[-1], "bucket": bucket},
+        "resolution": resolution_stats(created, resolved, start, end),
+        "agents": agents,
+        "backlog": {"buckets": edges[:-1], **backlog_curve(created, resolved, epoch_edges, carried)},
+    }
+
+
+def cached_report(start, end, bucket='day'):
+    cache = caches[get_setting('CACHE')]
+    key = f"analytics:{start.isoformat()}:{end.isoformat()}:{bucket}"
+    data = cache.get(key)
+    if data is None:
+        data = report(start, end, bucket)
+        timeout = get_setting('HISTORICAL_TIMEOUT') if end <= timezone.now() else get_setting('TIMEOUT')
+        cache.set(key, data, timeout)
+    return data
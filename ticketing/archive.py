@@ -0,0 +1,133 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ticketing import changefeed
+from ticketing import listcache
+from ticketing import models
+from ticketing import search
+
+DEFAULTS = {
+    'AFTER_DAYS': 90,  # resolved tickets untouched for this long leave the hot table
+    'BATCH_SIZE': 500,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TICKET_ARCHIVE', {}).get(name, DEFAULTS[name])
+
+
+def cutoff(days=None):
+    days = get_setting('AFTER_DAYS') if days is None else days
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def archive_batch(before, batch_size=None):
+    # Moves one batch of resolved tickets last updated before `before`; returns how many moved
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    with transaction.atomic():
+        candidates = models.Ticket.objects.filter(status='resolved', updated_at__lt=before).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Tickets being reopened right now are left for the next run
+            candidates = candidates.select_for_update(skip_locked=True)
+        tickets = list(candidates.values()[:batch_size])
+        if not tickets:
+            return 0
+
+        ids = [row['id'] for row in tickets]
+        tasks = {}
+        for row in models.Task.objects.filter(ticket_id__in=ids).order_by('pk').values():
+            tasks.setdefault(row['ticket_id'], []).append(row)
+        files = {}
+        for row in models.Attachment.objects.filter(ticket_id__in=ids).order_by('pk').values():
+            files.setdefault(row['ticket_id'], []).append(row)
+        for row in tickets:
+            # Attachment rows ride along with the ticket; the stored blobs stay where they are
+            row['attachments'] = files.get(row['id'], [])
+
+        archived = models.ArchivedTicket.objects.bulk_create([
+            models.ArchivedTicket(
+                id=row['id'], user_id=row['user_id'], subject=row['subject'],
+                created_at=row['created_at'], resolved_at=row['updated_at'],
+                ticket=row, tasks=tasks.get(row['id'], []),
+            )
+            for row in tickets
+        ])
+        # Cascades to the tasks, search index and duplicate signatures. Synced clients
+        # get 'archived' changes rather than deletes: the tickets can still be fetched.
+        with changefeed.archiving():
+            models.Ticket.objects.filter(pk__in=ids).delete()
+        changefeed.record_many('ticket', [row.as_ticket() for row in archived], action='archived')
+        changefeed.record_many('task', [task for row in archived for task in row.as_tasks()], action='archived')
+    return len(tickets)
+
+
+def archive(before=None, batch_size=None):
+    before = before or cutoff()
+    while True:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            return
+        yield moved
+
+
+def get_ticket(pk):
+    # Falls back to the archive, so old links keep working after tickets move
+    ticket = models.Ticket.objects.for_list().filter(pk=pk).first()
+    if ticket is not None:
+        return ticket, False
+
+    archived = models.ArchivedTicket.objects.select_related('user').filter(pk=pk).first()
+    if archived is None:
+        return None, False
+    return archived.as_ticket(), True
+
+
+def restore(pk):
+    # Moves an archived ticket and its tasks back into the hot tables
+    with transaction.atomic():
+        archived = models.ArchivedTicket.objects.select_for_update().get(pk=pk)
+        ticket = archived.as_ticket()
+
+        # Assignees deleted since archiving would have taken their tasks with them
+        tasks = archived.as_tasks()
+        files = archived.ticket.get('attachments', [])
+        users = set(models.CustomUser.objects.filter(
+            pk__in={task.assigned_to_id for task in tasks} | {task.assigned_by_id for task in tasks}
+            | {row['uploaded_by_id'] for row in files}
+        ).values_list('pk', flat=True))
+        tasks = [task for task in tasks if task.assigned_to_id in users]
+        for task in tasks:
+            if task.assigned_by_id not in users:
+                task.assigned_by_id = None
+
+        for status, field in models.TASK_STATUS_COUNTERS.items():
+            setattr(ticket, field, sum(1 for task in tasks if task.status == status))
+
+        # bulk_create skips save()/full_clean(); the rows were valid when archived.
+        # It stamps auto_now_add fields, so the original creation times are put back after.
+        created = {task.pk: task.created_at for task in tasks}
+        models.Ticket.objects.bulk_create([ticket])
+        models.Ticket.objects.filter(pk=ticket.pk).update(created_at=archived.created_at)
+        models.Task.objects.bulk_create(tasks)
+        for task_id, created_at in created.items():
+            models.Task.objects.filter(pk=task_id).update(created_at=created_at)
+
+        for row in files:
+            if row['uploaded_by_id'] not in users:
+                row['uploaded_by_id'] = None
+            models.Attachment.objects.create(**row)
+            models.Attachment.objects.filter(pk=row['id']).update(created_at=row['created_at'])
+
+        archived.delete()
+        search.index_ticket(ticket)
+        ticket.created_at = archived.created_at
+        for task in tasks:
+            task.created_at = created[task.pk]
+        changefeed.record_many('ticket', [ticket])
+        changefeed.record_many('task', tasks)
+        listcache.bump_on_commit('ticket')
+        listcache.bump_on_commit('task')
+    return ticket, len(tasks)
@@ -0,0 +1,259 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+
+from ticketing import models
+from ticketing import utils
+
+DEFAULTS = {
+    'ENABLED': False,  # give every new ticket a task for the least-loaded eligible IT person
+    'MATCH': ['branch', 'location', 'department'],  # CustomUser fields, broadest first
+    # Seconds between background reloads, which pick up other workers' changes; 0 turns them off
+    'RELOAD_INTERVAL': 60,
+}
+
+OPEN_TASK_STATUSES = ['pending', 'in_progress']
+
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name):
+    return getattr(settings, 'AUTO_ASSIGNMENT', {}).get(name, DEFAULTS[name])
+
+
+def normalise(value):
+    return (value or '').strip().lower()
+
+
+def attrs_of(user):
+    if user is None:
+        return ()
+    return tuple(normalise(getattr(user, field)) for field in get_setting('MATCH'))
+
+
+def pools_for(attrs):
+    # ("hq", "floor 2", "finance") -> (), ("hq",), ("hq", "floor 2"), ("hq", "floor 2", "finance");
+    # a blank field ends the chain, so a blank value never narrows the pool
+    keys = [()]
+    for value in attrs:
+        if not value:
+            break
+        keys.append(keys[-1] + (value,))
+    return keys
+
+
+class LoadIndex:
+    # Open task count per IT person, with one min-heap per pool of agents sharing a
+    # branch / location / department prefix. A load change pushes a fresh entry
+    # instead of reheapifying; entries that no longer match `state` are dropped when
+    # they reach the top, so picks and updates stay O(log n).
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.state = {}  # agent id -> (load, seq); seq rotates agents with equal load
+        self.pools = {}  # agent id -> pool keys
+        self.heaps = {}  # pool key -> [(load, seq, agent id)]
+        self.reserved = {}  # agent id -> picks counted before their tasks are saved
+        self.counter = itertools.count()
+        self.loaded_at = None
+        # Held for the first load, which requests wait for, and by the background reloads
+        self.load_lock = threading.Lock()
+        self.thread = None
+
+    def push(self, agent_id, load):
+        entry = (load, next(self.counter), agent_id)
+        self.state[agent_id] = entry[:2]
+        for key in self.pools[agent_id]:
+            heap = self.heaps.setdefault(key, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(self.state) + 64:
+                self.compact(key)
+
+    def compact(self, key):
+        heap = [
+            (load, seq, agent_id) for agent_id, (load, seq) in self.state.items() if key in self.pools[agent_id]
+        ]
+        heapq.heapify(heap)
+        self.heaps[key] = heap
+
+    def set_agent(self, agent_id, attrs, load=None):
+        with self.lock:
+            if load is None:
+                load = self.state.get(agent_id, (0,))[0]
+            self.pools[agent_id] = pools_for(attrs)
+            self.push(agent_id, load)
+
+    def remove_agent(self, agent_id):
+        with self.lock:
+            self.state.pop(agent_id, None)
+            self.pools.pop(agent_id, None)
+
+    def adjust(self, agent_id, delta):
+        with self.lock:
+            if agent_id in self.state:
+                self.push(agent_id, max(0, self.state[agent_id][0] + delta))
+
+    def load_of(self, agent_id):
+        with self.lock:
+            return self.state.get(agent_id, (None,))[0]
+
+    def least_loaded(self, key, exclude):
+        heap = self.heaps.get(key)
+        if not heap:
+            return None
+        skipped = []
+        found = None
+        while heap:
+            load, seq, agent_id = heap[0]
+            if self.state.get(agent_id) != (load, seq):
+                heapq.heappop(heap)
+            elif agent_id in exclude:
+                skipped.append(heapq.heappop(heap))
+            else:
+                found = agent_id
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return found
+
+    def pick(self, attrs, exclude=(), reserve=False):
+        # The least-loaded agent in the narrowest pool that has one; `reserve` counts the
+        # new task right away, for callers assigning several before anything is saved
+        with self.lock:
+            for key in reversed(pools_for(attrs)):
+                agent_id = self.least_loaded(key, exclude)
+                if agent_id is not None:
+                    if reserve:
+                        self.reserved[agent_id] = self.reserved.get(agent_id, 0) + 1
+                        self.adjust(agent_id, 1)
+                    return agent_id
+        return None
+
+    def release(self, agent_id):
+        with self.lock:
+            remaining = self.reserved.get(agent_id, 0) - 1
+            if remaining > 0:
+                self.reserved[agent_id] = remaining
+            else:
+                self.reserved.pop(agent_id, None)
+            self.adjust(agent_id, -1)
+
+    def load(self, agents, loads):
+        # Saved tasks come from `loads`; picks still reserved are not in the table yet,
+        # so they are added back rather than dropped
+        with self.lock:
+            self.state, self.pools, self.heaps = {}, {}, {}
+            for agent_id, attrs in agents:
+                self.set_agent(agent_id, attrs, loads.get(agent_id, 0) + self.reserved.get(agent_id, 0))
+            self.loaded_at = time.monotonic()
+
+    def start(self):
+        if not get_setting('RELOAD_INTERVAL'):
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='assignment-reload', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(get_setting('RELOAD_INTERVAL') or 60)
+            try:
+                close_old_connections()
+                with self.load_lock:
+                    reload(self)
+            except Exception:
+                logger.exception("Assignment load reload failed; keeping the current counts")
+            finally:
+                close_old_connections()
+
+
+index = LoadIndex()
+
+
+def reload(target=None):
+    # The one full scan of the task table: run once per process, then in the background.
+    # Loads changed by commits that land while it runs are off until the next reload.
+    fields = get_setting('MATCH')
+    agents = models.CustomUser.objects.filter(user_type='it_personnel', is_active=True).values_list('pk', *fields)
+    loads = dict(
+        models.Task.objects.filter(status__in=OPEN_TASK_STATUSES)
+        .values('assigned_to').annotate(open_tasks=Count('pk')).values_list('assigned_to', 'open_tasks')
+    )
+    (target or index).load([(row[0], tuple(normalise(value) for value in row[1:])) for row in agents], loads)
+
+
+def sync():
+    # Loads the index on first use; from then on task_changed() keeps it current in
+    # this process and the background thread picks up other workers' changes
+    if index.loaded_at is not None:
+        return
+    with index.load_lock:
+        if index.loaded_at is None:
+            reload()
+    index.start()
+
+
+def choose(owner=None, exclude=(), reserve=None):
+    # Id of the least-loaded IT person matching the owner's branch / location / department
+    # as closely as possible, or None when there is nobody to assign. Pass the list from
+    # reservations() as `reserve` to count the pick before anything is saved.
+    sync()
+    agent_id = index.pick(
+        attrs_of(owner), exclude={pk for pk in exclude if pk is not None}, reserve=reserve is not None,
+    )
+    if agent_id is not None and reserve is not None:
+        reserve.append(agent_id)
+    return agent_id
+
+
+@contextlib.contextmanager
+def reservations():
+    # Picks made with the yielded list count at once, so one batch spreads across agents.
+    # They are handed back when the block exits, whether the batch commits, rolls back
+    # or raises; the tasks actually saved are counted by task_changed() on commit.
+    reserved = []
+    try:
+        yield reserved
+    finally:
+        for agent_id in reserved:
+            index.release(agent_id)
+
+
+def auto_assign(ticket, assigned_by_id=None):
+    # Creates a pending task on `ticket` for the chosen agent; returns (task, rolled up ticket)
+    agent_id = choose(ticket.user, exclude=[assigned_by_id])
+    if agent_id is None:
+        return None, ticket
+    task = models.Task.objects.create(ticket=ticket, assigned_to_id=agent_id, assigned_by_id=assigned_by_id)
+    ticket, _ = models.Ticket.objects.rollup_status(ticket.pk)
+    utils.send_ws_notification(
+        user_id=agent_id, event_type="tasks_assigned", data={"tasks": [{"task_id": task.id, "ticket_id": ticket.id}]},
+    )
+    return task, ticket
+
+
+def task_changed(before, after):
+    # before / after are (assignee id, status) or None; applied once the write commits
+    def apply():
+        for state, delta in [(before, -1), (after, 1)]:
+            if state is not None and state[1] in OPEN_TASK_STATUSES:
+                index.adjust(state[0], delta)
+    transaction.on_commit(apply)
+
+
+def agent_changed(user, deleted=False):
+    attrs = attrs_of(user)
+
+    def apply():
+        if deleted or user.user_type != 'it_personnel' or not user.is_active:
+            index.remove_agent(user.pk)
+        elif index.loaded_at is not None:
+            index.set_agent(user.pk, attrs)
+    transaction.on_commit(apply)
@@ -0,0 +1,250 @@
+import collections
+import datetime
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils import timezone
+
+from ticketing import models
+
+DEFAULTS = {
+    'UPLOAD_DIR': os.path.join(settings.MEDIA_ROOT, 'uploads'),
+    'MAX_CHUNK_SIZE': 5 * 1024 * 1024,
+    'EXPIRY': 24 * 60 * 60,
+}
+DOWNLOAD_DEFAULTS = {
+    'OFFLOAD': None,  # "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd)
+    'ACCEL_PREFIX': '/protected-attachments/',  # nginx `internal` location mapped to the storage root
+}
+READ_SIZE = 64 * 1024
+MAX_HASHERS = 256
+
+# Running SHA-256 per upload, so a chunk hashes only its own bytes when the same
+# worker received the previous one; otherwise the staged prefix is rehashed.
+_hashers = collections.OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'ATTACHMENT_UPLOADS', {}).get(name, DEFAULTS[name])
+
+
+def get_download_setting(name):
+    return getattr(settings, 'ATTACHMENT_DOWNLOADS', {}).get(name, DOWNLOAD_DEFAULTS[name])
+
+
+def get_storage():
+    return storages['attachments']
+
+
+def can_attach(user, ticket):
+    return user.user_type in ['super_admin', 'it_personnel'] or ticket.user_id == user.id
+
+
+def staging_path(upload):
+    return os.path.join(get_setting('UPLOAD_DIR'), f"{upload.pk}.part")
+
+
+def blob_name(digest):
+    # Fan out by prefix so no directory (or S3 prefix) grows unbounded
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def resume_hasher(upload, path):
+    with _hashers_lock:
+        entry = _hashers.get(upload.pk)
+    if entry is not None and entry[0] == upload.offset:
+        # A copy: a concurrent retry of the same chunk must not pick up this one's bytes
+        return entry[1].copy()
+
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    if remaining:
+        with open(path, 'rb') as staged:
+            while remaining:
+                data = staged.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+def keep_hasher(upload_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def check_chunk(upload, offset, length):
+    if offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if length > get_setting('MAX_CHUNK_SIZE') or upload.offset + length > upload.size:
+        raise ChunkTooLarge()
+
+
+def receive(stream, length, path, hasher):
+    # Copies up to `length` bytes of the request body to `path`; returns how many arrived
+    remaining = length
+    with open(path, 'wb') as chunk:
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            chunk.write(data)
+            hasher.update(data)
+            remaining -= len(data)
+    return length - remaining
+
+
+def append_chunk(upload_id, offset, stream, length):
+    # Streams one chunk from the request to its own file, then appends that to the
+    # staging file under the row lock; returns (upload, attachment or None)
+    upload = models.AttachmentUpload.objects.get(pk=upload_id)
+    check_chunk(upload, offset, length)
+
+    path = staging_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hasher = resume_hasher(upload, path)
+    chunk_path = f"{path}.{uuid.uuid4().hex}"
+    try:
+        # No transaction while the client is read: a slow sender holds no lock or connection state
+        received = receive(stream, length, chunk_path, hasher)
+
+        with transaction.atomic():
+            # Serialises concurrent chunks of the same upload
+            upload = models.AttachmentUpload.objects.select_for_update().get(pk=upload_id)
+            if upload.offset != offset:
+                raise OffsetMismatch(upload.offset)
+
+            with open(path, 'ab') as staged, open(chunk_path, 'rb') as chunk:
+                # Drop bytes a failed earlier request wrote past the committed offset
+                staged.truncate(upload.offset)
+                shutil.copyfileobj(chunk, staged, READ_SIZE)
+
+            upload.offset += received
+            upload.save(update_fields=['offset', 'updated_at'])
+    finally:
+        discard_file(chunk_path)
+
+    if upload.offset < upload.size:
+        keep_hasher(upload.pk, upload.offset, hasher)
+        return upload, None
+    # A client whose final request failed past this point resends an empty chunk at
+    # the full offset, which lands here again
+    return upload, complete(upload, hasher.hexdigest(), path)
+
+
+def complete(upload, digest, path):
+    # The blob is written before any lock is taken: a save to remote storage can take a
+    # while, and no other request may touch an upload that has all its bytes
+    stored = None
+    if not models.AttachmentBlob.objects.filter(pk=digest).exists():
+        storage = get_storage()
+        name = blob_name(digest)
+        if not storage.exists(name):
+            with open(path, 'rb') as staged:
+                stored = name = storage.save(name, File(staged))
+
+    try:
+        with transaction.atomic():
+            upload = models.AttachmentUpload.objects.select_for_update().get(pk=upload.pk)
+            blob, _ = models.AttachmentBlob.objects.get_or_create(
+                sha256=digest, defaults={'size': upload.size, 'name': blob_name(digest) if stored is None else stored},
+            )
+            attachment = models.Attachment.objects.create(
+                ticket_id=upload.ticket_id, blob=blob, filename=upload.filename, uploaded_by_id=upload.uploaded_by_id,
+            )
+            upload_id = upload.pk
+            upload.delete()
+            transaction.on_commit(lambda: discard_staged(upload_id, path))
+    except Exception:
+        # Aborted or finished elsewhere meanwhile: drop the object unless a blob row took it
+        if stored is not None and not models.AttachmentBlob.objects.filter(name=stored).exists():
+            get_storage().delete(stored)
+        raise
+    return attachment
+
+
+def discard_staged(upload_id, path):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    discard_file(path)
+
+
+def discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def abort(upload):
+    path = staging_path(upload)
+    upload_id = upload.pk
+    upload.delete()
+    transaction.on_commit(lambda: discard_staged(upload_id, path))
+
+
+def prune_uploads():
+    # Drops uploads idle longer than EXPIRY along with their staged bytes
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_setting('EXPIRY'))
+    count = 0
+    for upload in models.AttachmentUpload.objects.filter(updated_at__lt=cutoff).iterator():
+        with transaction.atomic():
+            abort(upload)
+        count += 1
+    return count
+
+
+class RangedFile:
+    # Reads at most `length` bytes from an already positioned file
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def local_path(blob):
+    # The blob's path on this host for X-Sendfile, or None when the storage has no
+    # local files (S3 and the like)
+    try:
+        return get_storage().path(blob.name)
+    except NotImplementedError:
+        return None
+
+
+def open_blob(blob, start=0, end=None):
+    stored = get_storage().open(blob.name, 'rb')
+    if end is None:
+        # The storage's own file object: a WSGI server can hand it to os.sendfile
+        return stored
+    stored.seek(start)
+    return RangedFile(stored, end - start + 1)
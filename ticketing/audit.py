@@ -0,0 +1,152 @@
+import atexit
+import collections
+import logging
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from ticketing import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 200,  # flush as soon as this many events are waiting
+    'FLUSH_INTERVAL': 1.0,  # seconds; otherwise flush at least this often
+    'MAX_QUEUE': 10000,  # oldest events are dropped past this while the database is unreachable
+    'FLUSH_IN_PROCESS': True,  # False to flush only on size or with flush() (tests, one-off scripts)
+}
+
+AUDITED_METHODS = {'POST': 'create', 'PUT': 'update', 'PATCH': 'update', 'DELETE': 'delete'}
+
+
+def get_setting(name):
+    return getattr(settings, 'AUDIT_LOG', {}).get(name, DEFAULTS[name])
+
+
+class AuditBuffer:
+    # Events wait in memory and are written with one bulk_create per batch, so
+    # auditing adds no statements to the request's own transaction. Events still
+    # buffered when the process is killed without a clean exit are lost.
+    def __init__(self):
+        self.events = collections.deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def add(self, actor_id, event, timestamp):
+        with self.lock:
+            if len(self.events) >= get_setting('MAX_QUEUE'):
+                self.events.popleft()
+                logger.warning("Audit buffer full; dropped the oldest event")
+            self.events.append((actor_id, event, timestamp))
+            pending = len(self.events)
+
+        if not get_setting('FLUSH_IN_PROCESS'):
+            if pending >= get_setting('BATCH_SIZE'):
+                self.flush()
+            return
+
+        self.start()
+        if pending >= get_setting('BATCH_SIZE'):
+            self.wakeup.set()
+
+    def take(self, limit):
+        with self.lock:
+            return [self.events.popleft() for _ in range(min(limit, len(self.events)))]
+
+    def requeue(self, batch):
+        with self.lock:
+            self.events.extendleft(reversed(batch))
+
+    def flush(self):
+        written = 0
+        with self.flush_lock:
+            while True:
+                batch = self.take(get_setting('BATCH_SIZE'))
+                if not batch:
+                    return written
+                try:
+                    written += self.write(batch)
+                except Exception:
+                    self.requeue(batch)
+                    raise
+
+    def write(self, batch):
+        rows = [
+            models.AuditLog(actor_id=actor_id, event=event, timestamp=timestamp, month=models.month_of(timestamp))
+            for actor_id, event, timestamp in batch
+        ]
+        try:
+            with transaction.atomic():
+                models.AuditLog.objects.bulk_create(rows)
+        except IntegrityError:
+            # An actor deleted while its events were buffered; keep the rest of the batch
+            actors = set(models.CustomUser.objects.filter(pk__in={row.actor_id for row in rows}).values_list('pk', flat=True))
+            rows = [row for row in rows if row.actor_id in actors]
+            models.AuditLog.objects.bulk_create(rows)
+        return len(rows)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self.run, name='audit-log-writer', daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(get_setting('FLUSH_INTERVAL'))
+            self.wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed; events kept for the next attempt")
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Audit log flush at shutdown failed; %s event(s) lost", len(self.events))
+
+
+buffer = AuditBuffer()
+atexit.register(buffer.shutdown)
+
+
+def log(actor_id, event):
+    # Queued once the surrounding transaction commits, so rolled-back changes leave no entry
+    timestamp = timezone.now()
+    transaction.on_commit(lambda: buffer.add(actor_id, event, timestamp))
+
+
+def flush():
+    return buffer.flush()
+
+
+class AuditMixin:
+    # Logs successful POST/PUT/PATCH/DELETE requests as "<audit_resource>.<action> #<id>"
+    audit_resource = None
+
+    def get_audit_event(self, request, response):
+        action = AUDITED_METHODS.get(request.method)
+        if action is None or response.status_code >= 400 or not request.user.is_authenticated:
+            return None
+
+        pk = self.kwargs.get('pk')
+        if pk is None and isinstance(getattr(response, 'data', None), dict):
+            pk = response.data.get('id')
+        event = f"{self.audit_resource}.{action}"
+        return request.user.id, f"{event} #{pk}" if pk is not None else event
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        audit_event = self.get_audit_event(request, response)
+        if audit_event is not None:
+            log(*audit_event)
+        return response
@@ -0,0 +1,162 @@
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from ticketing import models
+
+# Copied into every access token at login so hot requests never need the user row.
+# Refresh tokens do not carry them: they outlive any role change by weeks.
+USER_CLAIMS = ('user_type', 'is_staff', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def user_cache_key(user_id):
+    return f"claims_user:{user_id}"
+
+
+def changed_at_key(user_id):
+    return f"claims_changed:{user_id}"
+
+
+def mark_user_changed(user_id):
+    # Access tokens issued before now may carry an old role or belong to a deactivated
+    # account; until they expire, requests with them are checked against the row
+    lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+    cache.set(changed_at_key(user_id), time.time(), lifetime)
+    cache.delete(user_cache_key(user_id))
+
+
+# The only row fields read for tokens issued before the user last changed; a dict,
+# so the shared cache never holds the password hash or the rest of the row
+CACHED_FIELDS = ('is_active', 'username', 'user_type', 'is_staff', 'is_superuser')
+
+
+def get_cached_user(user_id):
+    ttl = getattr(settings, 'CLAIMS_USER_CACHE_TTL', 30)
+    if ttl:
+        fields = cache.get(user_cache_key(user_id))
+        if fields is not None:
+            return fields
+
+    fields = models.CustomUser.objects.filter(pk=user_id).values(*CACHED_FIELDS).first()
+    if fields is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+
+    if ttl:
+        cache.set(user_cache_key(user_id), fields, ttl)
+    return fields
+
+
+def resolve_user(user):
+    # The CustomUser row behind request.user, for writes and relations
+    return getattr(user, 'instance', user)
+
+
+class ClaimsUser(TokenUser):
+    # Reads id, user_type, is_staff and is_superuser from the token. Tokens issued
+    # before the user last changed read them, and the username, from a briefly cached
+    # copy of CACHED_FIELDS. Anything else raises: use resolve_user() for the row.
+    stale = False
+
+    @cached_property
+    def instance(self):
+        # Always a fresh row: callers may save it, which must not write back stale data
+        try:
+            return models.CustomUser.objects.get(pk=self.id)
+        except models.CustomUser.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+    def claim(self, name):
+        if name in self.token and not self.stale:
+            return self.token[name]
+        if name in CACHED_FIELDS:
+            return get_cached_user(self.id)[name]
+        if name in self.token:
+            return self.token[name]
+        raise AttributeError(f"{name} is not a claim of the access token")
+
+    @property
+    def is_staff(self):
+        return self.claim('is_staff')
+
+    @property
+    def is_superuser(self):
+        return self.claim('is_superuser')
+
+    @property
+    def username(self):
+        return self.claim('username')
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return self.claim(attr)
+
+    def __str__(self):
+        return self.username
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        user = ClaimsUser(validated_token)
+
+        # One cache read per request: only tokens older than the user's last change touch the row
+        changed_at = cache.get(changed_at_key(user.id))
+        if changed_at is not None and validated_token.get('iat', 0) <= changed_at:
+            if not get_cached_user(user.id)['is_active']:
+                raise AuthenticationFailed("User is inactive", code="user_inactive")
+            user.stale = True
+        return user
+
+
+# Browsers cannot set headers on a WebSocket handshake, so sockets pass the access
+# token as the protocol after this one (new WebSocket(url, ["bearer", token])) or,
+# where subprotocols are unavailable, as ?token=
+TOKEN_SUBPROTOCOL = 'bearer'
+
+
+def websocket_token(scope):
+    subprotocols = scope.get('subprotocols') or []
+    if TOKEN_SUBPROTOCOL in subprotocols[:-1]:
+        return subprotocols[subprotocols.index(TOKEN_SUBPROTOCOL) + 1], TOKEN_SUBPROTOCOL
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return (token[0], None) if token else (None, None)
+
+
+def websocket_user(raw_token):
+    # The same validation as API requests, so sockets and REST calls accept the same tokens
+    authenticator = ClaimsJWTAuthentication()
+    try:
+        return authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTWebsocketMiddleware(BaseMiddleware):
+    # Replaces the session user with the token's user when the socket presents a token;
+    # an invalid token leaves the socket anonymous, and the consumer closes it with 4401
+    async def __call__(self, scope, receive, send):
+        raw_token, subprotocol = websocket_token(scope)
+        if raw_token is not None:
+            scope = dict(scope, user=await database_sync_to_async(websocket_user)(raw_token))
+            if subprotocol:
+                scope['accepted_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
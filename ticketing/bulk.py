@@ -0,0 +1,399 @@
+import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from ticketing import assignment
+from ticketing import audit
+from ticketing import changefeed
+from ticketing import listcache
+from ticketing import models
+from ticketing import search
+from ticketing import serializers
+from ticketing import similarity
+from ticketing import utils
+
+MAX_ITEMS = 200
+
+
+class BulkResult:
+    # Per-item outcome, reported in request order
+    def __init__(self, items):
+        self.count = len(items)
+        self.errors = {}
+        self.ids = {}
+
+    def fail(self, index, field, message):
+        self.errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    def ok(self, index):
+        return index not in self.errors
+
+    def as_data(self):
+        results = []
+        for index in range(self.count):
+            if index in self.errors:
+                results.append({"index": index, "ok": False, "errors": self.errors[index]})
+            else:
+                results.append({"index": index, "ok": True, "id": self.ids.get(index)})
+        return {
+            "succeeded": self.count - len(self.errors),
+            "failed": len(self.errors),
+            "results": results,
+        }
+
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def group_by(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(key(row), []).append(row)
+    return grouped
+
+
+def apply_task_counts(deltas):
+    # One UPDATE per ticket for all of its counter changes, in id order to keep lock order stable
+    for ticket_id in sorted(deltas):
+        changes = {field: F(field) + delta for field, delta in deltas[ticket_id].items() if delta}
+        if changes:
+            models.Ticket.objects.filter(pk=ticket_id).update(**changes)
+
+
+def count_delta(deltas, ticket_id, status, delta):
+    if ticket_id is not None:
+        field = models.TASK_STATUS_COUNTERS[status]
+        fields = deltas.setdefault(ticket_id, {})
+        fields[field] = fields.get(field, 0) + delta
+
+
+def rollup(ticket_ids):
+    changed = []
+    for ticket_id in sorted(ticket_ids):
+        ticket, ticket_changed = models.Ticket.objects.rollup_status(ticket_id)
+        if ticket_changed:
+            changed.append(ticket)
+    return changed
+
+
+def notify_status_changes(tickets):
+    # One message per ticket owner, however many of their tickets moved
+    for user_id, owned in group_by(tickets, lambda ticket: ticket.user_id).items():
+        data = [{"ticket_id": ticket.id, "subject": ticket.subject, "status": ticket.status} for ticket in owned]
+        utils.send_ws_notification(user_id=user_id, event_type="tickets_status_changed", data={"tickets": data})
+    for ticket in tickets:
+        data = {"ticket_id": ticket.id, "subject": ticket.subject, "status": ticket.status}
+        utils.send_ticket_notification(ticket.id, "ticket_status_changed", data)
+
+
+def auto_assign(tickets, owners, actor_id):
+    # One pending task per new ticket; picks reserve load so the batch spreads across agents
+    tasks = []
+    with assignment.reservations() as reserved:
+        for ticket in tickets:
+            agent_id = assignment.choose(owners.get(ticket.user_id), exclude=[actor_id], reserve=reserved)
+            if agent_id is not None:
+                tasks.append(models.Task(
+                    ticket_id=ticket.id, assigned_by_id=actor_id, assigned_to_id=agent_id, status='pending',
+                ))
+        models.Task.objects.bulk_create(tasks)
+    for task in tasks:
+        assignment.task_changed(None, (task.assigned_to_id, task.status))
+    changefeed.record_many('task', tasks)
+
+    deltas = {}
+    for task in tasks:
+        count_delta(deltas, task.ticket_id, task.status, 1)
+    apply_task_counts(deltas)
+    statuses = {ticket.id: ticket.status for ticket in rollup(deltas)}
+    for ticket in tickets:
+        ticket.status = statuses.get(ticket.id, ticket.status)
+
+    for user_id, assigned in group_by(tasks, lambda task: task.assigned_to_id).items():
+        data = [{"task_id": task.id, "ticket_id": task.ticket_id} for task in assigned]
+        utils.send_ws_notification(user_id=user_id, event_type="tasks_assigned", data={"tasks": data})
+    if tasks:
+        listcache.bump_on_commit('task')
+    return tasks
+
+
+def create_tickets(items, actor_id, all_or_nothing=False):
+    result = BulkResult(items)
+    checker = serializers.TicketSerializer()
+    user_ids = {as_int(item.get('user_id')) for item in items}
+    # Owners are kept whole: auto-assignment matches on their branch / location / department
+    end_users = models.CustomUser.objects.filter(pk__in=user_ids - {None}, user_type='end_user').in_bulk()
+
+    cleaned = {}
+    for index, item in enumerate(items):
+        user_id = as_int(item.get('user_id'))
+        if user_id not in end_users:
+            result.fail(index, 'user_id', "Enter the id of an end user.")
+
+        values = {}
+        for field, validate in [('subject', checker.validate_subject), ('description', checker.validate_description)]:
+            value = item.get(field)
+            if not isinstance(value, str) or not value.strip():
+                result.fail(index, field, "This field is required.")
+                continue
+            try:
+                values[field] = validate(value)
+            except ValidationError as exc:
+                for message in exc.detail:
+                    result.fail(index, field, str(message))
+        if len(values.get('subject', '')) > 200:
+            result.fail(index, 'subject', "Ensure this field has no more than 200 characters.")
+
+        if result.ok(index):
+            cleaned[index] = models.Ticket(user_id=user_id, **values)
+
+    # Open-subject duplicates, against the table in one query and within the batch
+    keys = {(ticket.user_id, ticket.subject.lower()) for ticket in cleaned.values()}
+    taken = set(
+        models.Ticket.objects.filter(
+            user_id__in={user_id for user_id, _ in keys}, status__in=models.OPEN_TICKET_STATUSES,
+        ).annotate(subject_key=Lower('subject')).filter(
+            subject_key__in={subject for _, subject in keys},
+        ).values_list('user_id', 'subject_key')
+    )
+    for index, ticket in list(cleaned.items()):
+        key = (ticket.user_id, ticket.subject.lower())
+        if key in taken:
+            result.fail(index, 'subject', models.DUPLICATE_SUBJECT_MESSAGE)
+            del cleaned[index]
+        taken.add(key)
+
+    if all_or_nothing and result.errors:
+        return result
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                models.Ticket.objects.bulk_create(cleaned.values())
+            saved_one_by_one = False
+        except IntegrityError:
+            # A concurrent request took a subject meanwhile: find which, row by row
+            saved_one_by_one = True
+            for index, ticket in list(cleaned.items()):
+                try:
+                    with transaction.atomic():
+                        ticket.save()
+                except DjangoValidationError as exc:
+                    # Ticket.save() turns the open-subject IntegrityError into this;
+                    # anything else is not a duplicate and fails the whole request
+                    if exc.messages != [models.DUPLICATE_SUBJECT_MESSAGE]:
+                        raise
+                    result.fail(index, 'subject', models.DUPLICATE_SUBJECT_MESSAGE)
+                    del cleaned[index]
+            if all_or_nothing and result.errors:
+                transaction.set_rollback(True)
+                return result
+
+        created = list(cleaned.values())
+        for index, ticket in cleaned.items():
+            result.ids[index] = ticket.id
+            audit.log(actor_id, f"ticket.create #{ticket.id}")
+
+        # bulk_create sends no post_save: update what the signals would have
+        if created and not saved_one_by_one:
+            search.index_range(min(ticket.id for ticket in created), max(ticket.id for ticket in created))
+            similarity.record_many(created)
+            changefeed.record_many('ticket', created)
+            listcache.bump_on_commit('ticket')
+        if created and assignment.get_setting('ENABLED'):
+            auto_assign(created, end_users, actor_id)
+
+        for user_id, owned in group_by(created, lambda ticket: ticket.user_id).items():
+            data = [{"ticket_id": ticket.id, "subject": ticket.subject, "status": ticket.status} for ticket in owned]
+            utils.send_ws_notification(user_id=user_id, event_type="tickets_created", data={"tickets": data})
+        if created:
+            data = {"tickets": [{"ticket_id": ticket.id, "subject": ticket.subject, "status": ticket.status} for ticket in created]}
+            utils.send_role_notification("it_personnel", "tickets_created", data)
+            utils.send_role_notification("super_admin", "tickets_created", data)
+    return result
+
+
+def assign_tasks(items, actor, all_or_nothing=False):
+    # Items with a task_id reassign that task; items with a ticket_id create a new task on it,
+    # for the least-loaded matching IT person when assigned_to_id is left out and
+    # AUTO_ASSIGNMENT["ENABLED"] is set
+    result = BulkResult(items)
+    is_admin = actor.user_type == 'super_admin'
+    today = timezone.now().date()
+
+    with transaction.atomic():
+        task_ids = {as_int(item.get('task_id')) for item in items} - {None}
+        tasks = models.Task.objects.select_for_update().in_bulk(task_ids)
+        tickets = models.Ticket.objects.select_related('user').in_bulk(
+            {as_int(item.get('ticket_id')) for item in items} - {None}
+        )
+        assignees = set(models.CustomUser.objects.filter(
+            pk__in={as_int(item.get('assigned_to_id')) for item in items} - {None}, user_type='it_personnel',
+        ).values_list('pk', flat=True))
+
+        new_tasks, reassigned, seen, auto = {}, {}, set(), set()
+        for index, item in enumerate(items):
+            assigned_to_id = as_int(item.get('assigned_to_id'))
+            task_id = as_int(item.get('task_id'))
+            task = tasks.get(task_id)
+            # A reassigned task keeps its assigned_by; a new one is assigned by the actor
+            assigned_by_id = task.assigned_by_id if task is not None else actor.id
+            if item.get('assigned_to_id') is None and item.get('task_id') is None and assignment.get_setting('ENABLED'):
+                auto.add(index)
+            elif assigned_to_id not in assignees:
+                result.fail(index, 'assigned_to_id', "Only IT Personnel can be assigned tasks.")
+            elif assigned_to_id == assigned_by_id:
+                result.fail(index, 'assigned_to_id', "You cannot assign a task to yourself.")
+
+            if task_id is not None:
+                if task is None:
+                    result.fail(index, 'task_id', "Task does not exist.")
+                elif task_id in seen:
+                    result.fail(index, 'task_id', "Task appears more than once.")
+                elif not is_admin and task.assigned_by_id != actor.id:
+                    result.fail(index, 'task_id', "You do not have permission to reassign this task.")
+                elif task.status == 'done':
+                    result.fail(index, 'task_id', "You cannot reassign a task that is already marked as done.")
+                seen.add(task_id)
+                if result.ok(index):
+                    reassigned[index] = (task, task.assigned_to_id, assigned_to_id)
+                continue
+
+            ticket_id = as_int(item.get('ticket_id'))
+            if ticket_id not in tickets:
+                result.fail(index, 'ticket_id', "Ticket does not exist.")
+            deadline = item.get('deadline')
+            if deadline:
+                deadline = parse_date(str(deadline)) if not isinstance(deadline, datetime.date) else deadline
+                if deadline is None:
+                    result.fail(index, 'deadline', "Enter a valid date.")
+                elif deadline < today:
+                    result.fail(index, 'deadline', "Deadline cannot be in the past.")
+            if result.ok(index):
+                new_tasks[index] = models.Task(
+                    ticket_id=ticket_id, assigned_by_id=actor.id, assigned_to_id=assigned_to_id,
+                    deadline=deadline or None, status='pending',
+                )
+
+        with assignment.reservations() as reserved:
+            for index in sorted(auto & set(new_tasks)):
+                task = new_tasks[index]
+                task.assigned_to_id = assignment.choose(
+                    tickets[task.ticket_id].user, exclude=[actor.id], reserve=reserved,
+                )
+                if task.assigned_to_id is None:
+                    result.fail(index, 'assigned_to_id', "No IT Personnel are available to take this task.")
+                    del new_tasks[index]
+
+            if all_or_nothing and result.errors:
+                return result
+
+            models.Task.objects.bulk_create(new_tasks.values())
+        now = timezone.now()
+        for task, _, assigned_to_id in reassigned.values():
+            task.assigned_to_id = assigned_to_id
+            task.updated_at = now  # bulk_update skips auto_now
+        models.Task.objects.bulk_update([task for task, _, _ in reassigned.values()], ['assigned_to', 'updated_at'])
+        for task in new_tasks.values():
+            assignment.task_changed(None, (task.assigned_to_id, task.status))
+        for task, previous, assigned_to_id in reassigned.values():
+            assignment.task_changed((previous, task.status), (assigned_to_id, task.status))
+        changefeed.record_many('task', new_tasks.values())
+        changefeed.record_many(
+            'task', [task for task, _, _ in reassigned.values()],
+            previous_owners={task.pk: previous for task, previous, _ in reassigned.values()},
+        )
+
+        deltas = {}
+        for task in new_tasks.values():
+            count_delta(deltas, task.ticket_id, task.status, 1)
+        apply_task_counts(deltas)
+        changed = rollup(deltas)
+
+        for index, task in new_tasks.items():
+            result.ids[index] = task.id
+            audit.log(actor.id, f"task.create #{task.id}")
+        for index, (task, _, _) in reassigned.items():
+            result.ids[index] = task.id
+            audit.log(actor.id, f"task.update #{task.id}")
+        if new_tasks or reassigned:
+            listcache.bump_on_commit('task')
+
+        assigned = [(task.assigned_to_id, task) for task in new_tasks.values()]
+        assigned += [(new, task) for task, previous, new in reassigned.values() if previous != new]
+        for user_id, rows in group_by(assigned, lambda row: row[0]).items():
+            data = [{"task_id": task.id, "ticket_id": task.ticket_id} for _, task in rows]
+            utils.send_ws_notification(user_id=user_id, event_type="tasks_assigned", data={"tasks": data})
+        unassigned = [(previous, task) for task, previous, new in reassigned.values() if previous != new]
+        for user_id, rows in group_by(unassigned, lambda row: row[0]).items():
+            data = [{"task_id": task.id, "ticket_id": task.ticket_id} for _, task in rows]
+            utils.send_ws_notification(user_id=user_id, event_type="tasks_unassigned", data={"tasks": data})
+        notify_status_changes(changed)
+    return result
+
+
+def update_task_statuses(items, actor, all_or_nothing=False):
+    result = BulkResult(items)
+    is_admin = actor.user_type == 'super_admin'
+    statuses = {choice for choice, _ in models.Task.STATUS_CHOICES}
+
+    with transaction.atomic():
+        tasks = models.Task.objects.select_for_update().in_bulk(
+            {as_int(item.get('task_id')) for item in items} - {None}
+        )
+
+        updates, seen = {}, set()
+        for index, item in enumerate(items):
+            task = tasks.get(as_int(item.get('task_id')))
+            new_status = item.get('status')
+            if task is None:
+                result.fail(index, 'task_id', "Task does not exist.")
+            elif task.pk in seen:
+                result.fail(index, 'task_id', "Task appears more than once.")
+            elif not is_admin and actor.id not in [task.assigned_by_id, task.assigned_to_id]:
+                result.fail(index, 'task_id', "You do not have permission to update this task.")
+            if new_status not in statuses:
+                result.fail(index, 'status', f"Choose one of: {', '.join(sorted(statuses))}.")
+            if task is not None:
+                seen.add(task.pk)
+            if result.ok(index):
+                updates[index] = (task, task.status, new_status)
+
+        if all_or_nothing and result.errors:
+            return result
+
+        now = timezone.now()
+        deltas = {}
+        moved = []
+        for task, previous, new_status in updates.values():
+            if previous == new_status:
+                continue
+            count_delta(deltas, task.ticket_id, previous, -1)
+            count_delta(deltas, task.ticket_id, new_status, 1)
+            task.status = new_status
+            task.updated_at = now
+            moved.append(task)
+            assignment.task_changed((task.assigned_to_id, previous), (task.assigned_to_id, new_status))
+        models.Task.objects.bulk_update(moved, ['status', 'updated_at'])
+        changefeed.record_many('task', moved)
+        apply_task_counts(deltas)
+        changed = rollup(deltas)
+
+        for index, (task, _, _) in updates.items():
+            result.ids[index] = task.id
+        for task in moved:
+            audit.log(actor.id, f"task.update #{task.id}")
+        if moved:
+            listcache.bump_on_commit('task')
+        notify_status_changes(changed)
+    return result
@@ -0,0 +1,176 @@
+import contextlib
+import datetime
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from ticketing import models
+
+DEFAULTS = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 2000,
+    'SEQUENCE_BATCH': 1000,  # changes numbered per transaction
+    'RETENTION': 30 * 24 * 60 * 60,  # seconds; clients further behind must resync
+}
+
+# Bookkeeping that changes on every task write or scheduler pass, not data clients sync
+SKIPPED_FIELDS = {
+    'ticket': set(models.TASK_STATUS_COUNTERS.values()),
+    'task': {'overdue_notified'},
+}
+
+# Set while archive batches delete hot rows, which are moved rather than removed
+_archiving = threading.local()
+
+
+class ResyncRequired(Exception):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'CHANGE_FEED', {}).get(name, DEFAULTS[name])
+
+
+def tracked_fields(resource, model):
+    return [field for field in model._meta.concrete_fields if field.name not in SKIPPED_FIELDS[resource]]
+
+
+def snapshot(resource, instance):
+    return {field.attname: field.value_from_object(instance) for field in tracked_fields(resource, type(instance))}
+
+
+def owner_of(resource, instance):
+    return instance.user_id if resource == 'ticket' else instance.assigned_to_id
+
+
+def entry(resource, instance, previous_owner_id=None, action='upsert'):
+    owner_id = owner_of(resource, instance)
+    return models.ChangeLog(
+        resource=resource, object_id=instance.pk, action=action, owner_id=owner_id,
+        previous_owner_id=previous_owner_id if previous_owner_id != owner_id else None,
+        data=snapshot(resource, instance),
+    )
+
+
+def record(resource, instance, previous_owner_id=None, update_fields=None):
+    # Written in the caller's transaction, so a rolled-back change leaves no entry
+    if update_fields is not None:
+        tracked = {field.name for field in tracked_fields(resource, type(instance))}
+        if not tracked & set(update_fields):
+            return
+    entry(resource, instance, previous_owner_id).save()
+
+
+def record_many(resource, instances, previous_owners=None, action='upsert'):
+    previous_owners = previous_owners or {}
+    models.ChangeLog.objects.bulk_create([
+        entry(resource, instance, previous_owners.get(instance.pk), action) for instance in instances
+    ])
+
+
+@contextlib.contextmanager
+def archiving():
+    # Deletes inside the block are archive moves; the caller records them with
+    # record_many(..., action='archived') instead of as delete tombstones
+    _archiving.active = True
+    try:
+        yield
+    finally:
+        _archiving.active = False
+
+
+def record_delete(resource, instance):
+    if getattr(_archiving, 'active', False):
+        return
+    models.ChangeLog.objects.create(
+        resource=resource, object_id=instance.pk, action='delete', owner_id=owner_of(resource, instance),
+    )
+
+
+def lock_state():
+    state, _ = models.ChangeFeedState.objects.select_for_update().get_or_create(pk=1)
+    return state
+
+
+def sequence():
+    # Ids are taken at insert but rows appear at commit, so an archive batch or bulk
+    # write that commits late has a lower id than rows readers already passed. Readers
+    # therefore page by `seq`, numbered here under the state row lock: only committed
+    # rows are numbered, and every run numbers above all earlier runs.
+    unsequenced = models.ChangeLog.objects.filter(seq__isnull=True)
+    if not unsequenced.exists():
+        return
+    batch_size = get_setting('SEQUENCE_BATCH')
+    while True:
+        with transaction.atomic():
+            state = lock_state()
+            ids = list(unsequenced.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            # Keeps id order within the run; gaps are harmless, cursors only compare
+            offset = state.last_seq + 1 - ids[0]
+            unsequenced.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(seq=F('pk') + offset)
+            state.last_seq = ids[-1] + offset
+            state.save(update_fields=['last_seq'])
+        if len(ids) < batch_size:
+            return
+
+
+def latest_seq():
+    # Cursor for a client about to do a full fetch: it then asks for everything after it
+    sequence()
+    return models.ChangeFeedState.objects.filter(pk=1).values_list('last_seq', flat=True).first() or 0
+
+
+def changes_since(user, since, limit=None):
+    # Returns (changes, cursor, has_more); raises ResyncRequired if `since` was pruned
+    limit = min(limit or get_setting('PAGE_SIZE'), get_setting('MAX_PAGE_SIZE'))
+    sequence()
+
+    pruned = models.ChangeFeedState.objects.filter(pk=1).values_list('pruned_seq', flat=True).first() or 0
+    if since < pruned:
+        raise ResyncRequired()
+
+    rows = models.ChangeLog.objects.filter(seq__gt=since)
+    if user.user_type != 'super_admin':
+        rows = rows.filter(Q(owner_id=user.id) | Q(previous_owner_id=user.id))
+    rows = list(rows.order_by('seq')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].seq if rows else since
+
+    # Only the newest change per object: a ticket edited ten times since `since` is sent once
+    latest = {}
+    for row in rows:
+        latest.pop((row.resource, row.object_id), None)
+        latest[(row.resource, row.object_id)] = row
+
+    changes = []
+    for row in latest.values():
+        removed = row.action == 'delete' or (user.user_type != 'super_admin' and row.owner_id != user.id)
+        changes.append({
+            "seq": row.seq,
+            "resource": row.resource,
+            "id": row.object_id,
+            "action": 'delete' if removed else row.action,
+            "data": None if removed else row.data,
+            "changed_at": row.created_at,
+        })
+    return changes, cursor, has_more
+
+
+def prune():
+    sequence()
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_setting('RETENTION'))
+    with transaction.atomic():
+        state = lock_state()
+        expired = models.ChangeLog.objects.filter(created_at__lt=cutoff, seq__isnull=False)
+        last = expired.aggregate(last=Max('seq'))['last']
+        deleted, _ = expired.delete()
+        if last is not None and last > state.pruned_seq:
+            state.pruned_seq = last
+            state.save(update_fields=['pruned_seq'])
+    return deleted
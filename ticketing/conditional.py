@@ -0,0 +1,77 @@
+import hashlib
+import re
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def validators(objects, related=(), extra=()):
+    # ETag over (id, updated_at) of each row and of the related rows it renders,
+    # plus page state such as has_more; Last-Modified is the newest of those stamps.
+    digest = hashlib.sha1()
+    last_modified = None
+
+    for obj in objects:
+        stamps = [obj.updated_at]
+        for name in related:
+            related_obj = getattr(obj, name)
+            if related_obj is not None:
+                stamps.append(related_obj.updated_at)
+
+        digest.update(f"{obj.pk}:{','.join(stamp.isoformat() for stamp in stamps)};".encode())
+        newest = max(stamps)
+        if last_modified is None or newest > last_modified:
+            last_modified = newest
+
+    digest.update(f"#{len(objects)}:{':'.join(str(value) for value in extra)}".encode())
+    return f'"{digest.hexdigest()}"', last_modified
+
+
+def not_modified(request, etag, last_modified=None):
+    # A 304 for a matching If-None-Match / If-Modified-Since, before anything is serialised
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Representations differ per caller
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def parse_range(request, size, etag):
+    # The (start, end) byte span to send, inclusive; None for the whole entity and
+    # False when the range cannot be satisfied. Only single ranges are honoured:
+    # multipart/byteranges is rarely used and a full response is always allowed.
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
@@ -1,15 +1,139 @@
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from ticketing import notifications
+from ticketing import topics
+
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
-        self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.group_name = f"user_{self.user_id}"
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        # The legacy ws/notifications/<user_id>/ route may only name the authenticated user
+        url_user_id = self.scope['url_route']['kwargs'].get('user_id')
+        if url_user_id is not None and int(url_user_id) != user.id:
+            await self.close(code=4403)
+            return
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        self.user = user
+        self.user_id = user.id
+        self.topics = {}  # group -> (kind, value) of every subscription of this socket
+        self.checked_at = {}  # group -> when its permission was last confirmed
+        await self.accept(subprotocol=self.scope.get('accepted_subprotocol'))
+        await self.join(topics.user_group(self.user_id), ('user', self.user_id))
+
+        # Reconnecting clients pass ?last_seq=N to receive only what they missed
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'last_seq' in query:
+            await self.replay(query['last_seq'][0])
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        for group in topics.registry.discard_all(self.channel_name):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def join(self, group, topic):
+        await self.channel_layer.group_add(group, self.channel_name)
+        topics.registry.add(self.channel_name, group)
+        self.topics[group] = topic
+        self.checked_at[group] = time.monotonic()
+
+    async def leave(self, group):
+        await self.channel_layer.group_discard(group, self.channel_name)
+        topics.registry.discard(self.channel_name, group)
+        self.topics.pop(group, None)
+        self.checked_at.pop(group, None)
+
+    async def still_allowed(self, group):
+        if group not in self.topics:
+            return False  # sent just after this socket left the group
+        if time.monotonic() - self.checked_at[group] < topics.RECHECK_INTERVAL:
+            return True
+
+        kind, value = self.topics[group]
+        if await database_sync_to_async(topics.can_receive)(self.user_id, kind, value):
+            self.checked_at[group] = time.monotonic()
+            return True
+
+        if group == topics.user_group(self.user_id):
+            # The account itself was deactivated or deleted
+            await self.close(code=4401)
+        else:
+            await self.leave(group)
+            await self.send_json({"type": "unsubscribed", "data": {"topics": [f"{kind}:{value}"], "revoked": True}})
+        return False
+
+    async def receive_json(self, content):
+        action = content.get("action")
+        if action == "replay":
+            await self.replay(content.get("last_seq"))
+        elif action == "subscribe":
+            await self.subscribe(content.get("topics") or [])
+        elif action == "unsubscribe":
+            await self.unsubscribe(content.get("topics") or [])
+        else:
+            await self.send_json({"type": "error", "data": {"detail": "Invalid action."}})
+
+    async def subscribe(self, requested):
+        subscribed, denied = [], []
+        for topic in requested:
+            try:
+                kind, value = topics.parse_topic(topic)
+            except ValueError:
+                denied.append(topic)
+                continue
+
+            allowed = await database_sync_to_async(topics.can_subscribe)(self.user, kind, value)
+            if not allowed:
+                denied.append(topic)
+                continue
+
+            await self.join(topics.group_name(kind, value), (kind, value))
+            subscribed.append(topic)
+
+        await self.send_json({"type": "subscribed", "data": {"topics": subscribed, "denied": denied}})
+
+    async def unsubscribe(self, requested):
+        own_group = topics.user_group(self.user_id)
+        current = set(self.topics)
+        removed = []
+        for topic in requested:
+            try:
+                group = topics.group_name(*topics.parse_topic(topic))
+            except ValueError:
+                continue
+            if group in current and group != own_group:
+                await self.leave(group)
+                removed.append(topic)
+
+        await self.send_json({"type": "unsubscribed", "data": {"topics": removed}})
+
+    async def replay(self, last_seq):
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            await self.send_json({"type": "error", "data": {"detail": "last_seq must be an integer."}})
+            return
+
+        missed, complete = await database_sync_to_async(notifications.missed_since)(self.user_id, last_seq)
+        if not complete:
+            # Too old or too much to replay; the client should reload its lists
+            await self.send_json({"type": "resync_required", "data": {"last_seq": last_seq}})
+            return
+
+        # Live events may overlap the replay; clients drop anything with seq <= their last seen
+        for content in missed:
+            await self.send_json(content)
 
     async def notify(self, event):
-        await self.send_json(event["content"])
+        if "group" in event and not await self.still_allowed(event["group"]):
+            return
+        if "events" in event:
+            # Coalesced by the outbox dispatcher: several events in one frame
+            await self.send_json({"type": "batch", "events": event["events"]})
+        else:
+            await self.send_json(event["content"])
@@ -0,0 +1,145 @@
+import datetime
+import heapq
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ticketing import models
+from ticketing import utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'HORIZON_DAYS': 7,  # deadlines this far ahead are held in memory; later ones are loaded as the day comes
+    'POLL_INTERVAL': 5,  # seconds between polls for tasks saved by the web workers
+    'BATCH_SIZE': 500,
+}
+
+OPEN_TASK_STATUSES = ['pending', 'in_progress']
+# Transactions can commit out of updated_at order; polls re-read this far back
+SYNC_OVERLAP = datetime.timedelta(seconds=30)
+
+
+def get_setting(name):
+    return getattr(settings, 'TASK_DEADLINES', {}).get(name, DEFAULTS[name])
+
+
+def due_at(deadline):
+    # A deadline is the last day to finish: the task is overdue from the next midnight
+    return timezone.make_aware(datetime.datetime.combine(deadline + datetime.timedelta(days=1), datetime.time.min))
+
+
+def is_pending(status, deadline, overdue_notified):
+    return status in OPEN_TASK_STATUSES and deadline is not None and not overdue_notified
+
+
+class DeadlineScheduler:
+    # Min-heap of (due time, task id) for open tasks whose deadline falls within the
+    # horizon. Only ranges of the (status, deadline) index are read, plus the tasks
+    # saved since the last poll through the updated_at index; a changed deadline pushes
+    # a new entry and the stale one is skipped when it reaches the top.
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}  # task id -> deadline of its live heap entry
+        self.loaded_until = None
+        self.watermark = None
+
+    def schedule(self, task_id, deadline):
+        if self.deadlines.get(task_id) == deadline:
+            return
+        self.deadlines[task_id] = deadline
+        heapq.heappush(self.heap, (due_at(deadline), task_id, deadline))
+
+    def unschedule(self, task_id):
+        self.deadlines.pop(task_id, None)
+
+    def extend(self, until):
+        # Loads open, unnotified deadlines up to `until` that are not held yet
+        tasks = models.Task.objects.filter(
+            status__in=OPEN_TASK_STATUSES, deadline__lte=until, overdue_notified=False,
+        )
+        if self.loaded_until is not None:
+            tasks = tasks.filter(deadline__gt=self.loaded_until)
+        for task_id, deadline in tasks.values_list('pk', 'deadline').iterator():
+            self.schedule(task_id, deadline)
+        self.loaded_until = until
+
+    def sync(self):
+        now = timezone.now()
+        if self.watermark is None:
+            # Everything saved before now is covered by the initial load
+            self.watermark = now
+        else:
+            changed = models.Task.objects.filter(updated_at__gte=self.watermark - SYNC_OVERLAP)
+            self.watermark = now
+            rows = changed.values_list('pk', 'status', 'deadline', 'overdue_notified')
+            for task_id, status, deadline, overdue_notified in rows.iterator():
+                if is_pending(status, deadline, overdue_notified) and deadline <= self.loaded_until:
+                    self.schedule(task_id, deadline)
+                else:
+                    self.unschedule(task_id)
+
+        until = timezone.localdate() + datetime.timedelta(days=get_setting('HORIZON_DAYS'))
+        if self.loaded_until is None or until > self.loaded_until:
+            self.extend(until)
+
+    def next_due(self):
+        while self.heap:
+            when, task_id, deadline = self.heap[0]
+            if self.deadlines.get(task_id) == deadline:
+                return when
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now, limit):
+        due = []
+        while len(due) < limit:
+            when = self.next_due()
+            if when is None or when > now:
+                break
+            _, task_id, _ = heapq.heappop(self.heap)
+            del self.deadlines[task_id]
+            due.append(task_id)
+        return due
+
+    def fire(self, now=None):
+        # Sends the overdue notices that are due; returns how many tasks were notified
+        now = now or timezone.now()
+        notified = 0
+        while True:
+            due = self.pop_due(now, get_setting('BATCH_SIZE'))
+            if not due:
+                return notified
+            notified += notify_overdue(due, timezone.localdate(now))
+
+
+def notify_overdue(task_ids, today):
+    with transaction.atomic():
+        # Re-checked under the row locks: the task may have been finished or moved meanwhile
+        tasks = list(
+            models.Task.objects.select_for_update().filter(
+                pk__in=task_ids, status__in=OPEN_TASK_STATUSES, deadline__lt=today, overdue_notified=False,
+            ).select_related('ticket')
+        )
+        if not tasks:
+            return 0
+        # update() leaves updated_at (and the list caches) alone: the task itself did not change
+        models.Task.objects.filter(pk__in=[task.pk for task in tasks]).update(overdue_notified=True)
+
+        # One message per user, however many of their tasks went overdue
+        recipients = {}
+        for task in tasks:
+            data = {
+                "task_id": task.id,
+                "ticket_id": task.ticket_id,
+                "subject": task.ticket.subject if task.ticket else None,
+                "deadline": task.deadline.isoformat(),
+            }
+            for user_id in {task.assigned_to_id, task.assigned_by_id} - {None}:
+                recipients.setdefault(user_id, []).append(data)
+        for user_id, overdue in recipients.items():
+            utils.send_ws_notification(user_id=user_id, event_type="tasks_overdue", data={"tasks": overdue})
+    logger.info("Sent overdue notices for %s task(s)", len(tasks))
+    return len(tasks)
@@ -0,0 +1,102 @@
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from ticketing import filters
+from ticketing import models
+
+# resource -> (model, date field for range filters, exported columns)
+EXPORTS = {
+    'tickets': (models.Ticket, 'created_at', [
+        'id', 'user_id', 'user__username', 'subject', 'description', 'status', 'created_at', 'updated_at',
+    ]),
+    'tasks': (models.Task, 'created_at', [
+        'id', 'ticket_id', 'status', 'deadline', 'assigned_by_id', 'assigned_to_id', 'created_at', 'updated_at',
+    ]),
+    'audit_logs': (models.AuditLog, 'timestamp', [
+        'id', 'actor_id', 'actor__username', 'event', 'timestamp',
+    ]),
+}
+# resource -> (model, date field, columns matching EXPORTS) for rows archiving moved
+# out of the hot table; they follow the hot rows with `archived` set
+ARCHIVED = {
+    'tickets': (models.ArchivedTicket, 'created_at', [
+        # A resolved ticket's last update is its resolution, as in archive_batch
+        'id', 'user_id', 'user__username', 'subject', 'ticket__description', 'ticket__status', 'created_at',
+        'resolved_at',
+    ]),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+def query_rows(model, date_field, columns, params, chunk_size):
+    queryset = filters.filter_by_date_range(model.objects.all(), params, field=date_field)
+    # values_list + iterator(): rows stream from a cursor without building model instances
+    return queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def export_rows(resource, params, chunk_size=CHUNK_SIZE):
+    model, date_field, columns = EXPORTS[resource]
+    rows = query_rows(model, date_field, columns, params, chunk_size)
+    if resource not in ARCHIVED:
+        return columns, rows
+
+    archived = query_rows(*ARCHIVED[resource], params, chunk_size)
+    return columns + ['archived'], itertools.chain(
+        (row + (False,) for row in rows), (row + (True,) for row in archived),
+    )
+
+
+def render_ndjson(columns, rows):
+    names = [column.replace('__', '_') for column in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=str, ensure_ascii=False) + '\n'
+
+
+def render_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.replace('__', '_') for column in columns])
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode(lines):
+    # Group small lines into ~64KB writes
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(resource, output_format, params, compress=False):
+    columns, rows = export_rows(resource, params)
+    renderer = render_csv if output_format == 'csv' else render_ndjson
+    chunks = encode(renderer(columns, rows))
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,93 @@
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from ticketing import models
+
+
+def parse_datetime_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+
+    try:
+        parsed = parse_datetime(value)
+        date = parse_date(value) if parsed is None else None
+    except ValueError:
+        parsed = date = None
+
+    if parsed is None:
+        if date is None:
+            raise ValidationError({name: "Enter a valid date or datetime."})
+        parsed = datetime.datetime.combine(date, datetime.time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_by_date_range(queryset, params, field='created_at'):
+    created_after = parse_datetime_param(params, 'created_after')
+    created_before = parse_datetime_param(params, 'created_before')
+
+    if created_after:
+        queryset = queryset.filter(**{f'{field}__gte': created_after})
+    if created_before:
+        queryset = queryset.filter(**{f'{field}__lt': created_before})
+    return queryset
+
+
+def filter_by_status(queryset, params, choices):
+    value = params.get('status')
+    if not value:
+        return queryset
+
+    statuses = [status.strip() for status in value.split(',') if status.strip()]
+    allowed = {choice for choice, _ in choices}
+    invalid = [status for status in statuses if status not in allowed]
+    if invalid:
+        raise ValidationError({"status": f"Invalid status: {', '.join(invalid)}."})
+    return queryset.filter(status__in=statuses)
+
+
+def filter_by_user(queryset, params, field, param='user'):
+    value = params.get(param)
+    if not value:
+        return queryset
+
+    try:
+        user_id = int(value)
+    except ValueError:
+        raise ValidationError({param: "Enter a valid user id."})
+    return queryset.filter(**{f'{field}_id': user_id})
+
+
+def filter_tickets(queryset, params):
+    queryset = filter_by_status(queryset, params, models.Ticket.STATUS_CHOICES)
+    queryset = filter_by_user(queryset, params, 'user')
+    return filter_by_date_range(queryset, params)
+
+
+def filter_tasks(queryset, params):
+    queryset = filter_by_status(queryset, params, models.Task.STATUS_CHOICES)
+    queryset = filter_by_user(queryset, params, 'assigned_to')
+    return filter_by_date_range(queryset, params)
+
+
+def filter_audit_logs(queryset, params):
+    queryset = filter_by_user(queryset, params, 'actor', param='actor')
+
+    event = params.get('event')
+    if event:
+        queryset = queryset.filter(event__startswith=event)
+
+    month = params.get('month')
+    if month:
+        try:
+            first_day = datetime.datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            raise ValidationError({"month": "Use the YYYY-MM format."})
+        queryset = queryset.filter(month=first_day)
+    return filter_by_date_range(queryset, params, field='timestamp')
@@ -0,0 +1,24 @@
+import io
+
+from PIL import Image, ImageOps
+
+# Runs in thumbnail worker processes: keep this module free of Django imports so
+# it loads the same under fork and spawn.
+
+
+def render_thumbnail(source, edge, image_format):
+    # `source` is the original's bytes, or its path, which the worker then reads itself
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        # In place, keeps the aspect ratio and never upscales
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        options = {'optimize': True}
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            options['quality'] = 85
+        output = io.BytesIO()
+        image.save(output, image_format, **options)
+    return output.getvalue()
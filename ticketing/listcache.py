@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,  # seconds; the cache backend evicts least recently used entries first
+    'ROLES': ['super_admin'],  # roles whose list responses are shared and worth caching
+}
+
+# Models whose changes can alter each cached endpoint's output
+DEPENDENCIES = {
+    'tickets': ['ticket', 'user'],
+    'tasks': ['task', 'ticket', 'user'],
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'LIST_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def generation_key(model_name):
+    return f"listcache:gen:{model_name}"
+
+
+def generation(model_name):
+    cache = get_cache()
+    value = cache.get(generation_key(model_name))
+    if value is None:
+        # Start from the clock so a lost counter never reuses an old generation
+        cache.add(generation_key(model_name), int(time.time() * 1000), timeout=None)
+        value = cache.get(generation_key(model_name))
+    return value
+
+
+def bump(model_name):
+    # Invalidates every cached response that depends on model_name without scanning keys
+    cache = get_cache()
+    try:
+        cache.incr(generation_key(model_name))
+    except ValueError:
+        cache.set(generation_key(model_name), int(time.time() * 1000), timeout=None)
+
+
+def bump_on_commit(model_name):
+    # After commit, so a reader cannot cache pre-commit rows under the new generation
+    transaction.on_commit(lambda: bump(model_name))
+
+
+def key_for(endpoint, request):
+    role = request.user.user_type
+    if role not in get_setting('ROLES'):
+        return None
+
+    generations = '.'.join(str(generation(name)) for name in DEPENDENCIES[endpoint])
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f"listcache:{endpoint}:{role}:{generations}:{url}"
+
+
+def lookup(key):
+    if key is None:
+        return None
+    cache = get_cache()
+    entry = cache.get(key)
+    record_lookup(cache, hit=entry is not None)
+    return entry
+
+
+def store(key, entry):
+    if key is not None:
+        get_cache().set(key, entry, timeout=get_setting('TIMEOUT'))
+
+
+def record_lookup(cache, hit):
+    stat_key = 'listcache:stats:hits' if hit else 'listcache:stats:misses'
+    if not cache.add(stat_key, 1, timeout=None):
+        try:
+            cache.incr(stat_key)
+        except ValueError:
+            cache.set(stat_key, 1, timeout=None)
+
+
+def stats():
+    cache = get_cache()
+    hits = cache.get('listcache:stats:hits', 0)
+    misses = cache.get('listcache:stats:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import archive
+
+
+class Command(BaseCommand):
+    help = "Move resolved tickets older than the archive age, with their tasks, out of the hot tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help="Days since the ticket was last updated.")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        total = 0
+        for moved in archive.archive(archive.cutoff(options['older_than']), options['batch_size']):
+            total += moved
+            self.stdout.write(f"Archived {total} ticket(s)...")
+        self.stdout.write(f"Done: {total} ticket(s) archived.")
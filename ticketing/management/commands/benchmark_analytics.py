@@ -0,0 +1,139 @@
+import datetime
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ticketing import analytics
+from ticketing import models
+
+
+def python_report(created, resolved, assignees, done, task_created, task_updated, edges, start, end):
+    # The same figures computed row by row, as a view looping over querysets would
+    hours = sorted((r - c) / 3600 for c, r in zip(created, resolved) if r == r and start <= r < end)
+    cuts = statistics.quantiles(hours, n=100, method='inclusive')
+    percentiles = {f"p{p}": cuts[p - 1] for p in analytics.PERCENTILES}
+
+    step = edges[1] - edges[0]
+    buckets = len(edges) - 1
+    opened, closed = [0] * (buckets + 1), [0] * (buckets + 1)
+    for c, r in zip(created, resolved):
+        opened[min(max(int((c - start) // step) + 1, 0), buckets)] += 1
+        if r == r:
+            closed[min(max(int((r - start) // step) + 1, 0), buckets)] += 1
+
+    per_agent = {}
+    for agent_id, is_done, c, u in zip(assignees, done, task_created, task_updated):
+        row = per_agent.setdefault(agent_id, [0, 0, 0.0])
+        if is_done and start <= u < end:
+            row[0] += 1
+            row[2] += (u - c) / 3600
+        if not is_done or u >= end:
+            row[1] += 1
+    return percentiles, opened, closed, per_agent
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed tickets and tasks, time analytics.report() and its queries, and compare the NumPy "
+        "figures with a row-by-row Python version. Everything runs in one transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=100000)
+        parser.add_argument('--agents', type=int, default=200)
+        parser.add_argument('--history', type=int, default=730, help="Days of tickets to seed before the window ends.")
+        parser.add_argument('--days', type=int, default=90, help="Days in the reported window.")
+        parser.add_argument('--no-compare', action='store_true', help="Skip the row-by-row Python version.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def timed(self, label, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f"{label}: {(time.perf_counter() - started) * 1000:.0f} ms")
+        return result
+
+    def seed(self, rng, count, agent_count, first, last):
+        # Tickets spread over the history, most resolved after a log-normal number of
+        # hours; created_at is auto_now_add, so the times are set with bulk_update
+        end_user, *agents = models.CustomUser.objects.bulk_create([
+            models.CustomUser(
+                username=f'benchmark-{n}', email=f'benchmark-{n}@example.com',
+                user_type='it_personnel' if n else 'end_user',
+            )
+            for n in range(agent_count + 1)
+        ])
+        created = rng.uniform(first, last, count)
+        resolved = created + rng.lognormal(mean=3, sigma=1.2, size=count) * 3600
+        resolved[(rng.random(count) > 0.85) | (resolved >= last)] = np.nan
+        assignees = rng.choice([agent.pk for agent in agents], count)
+
+        def moment(value):
+            return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+
+        batch_size = analytics.get_setting('BATCH_SIZE')
+        for offset in range(0, count, batch_size):
+            rows = range(offset, min(offset + batch_size, count))
+            tickets = models.Ticket.objects.bulk_create([
+                models.Ticket(
+                    user=end_user, subject=f'Benchmark ticket {n}', description='Seeded.',
+                    status='new' if np.isnan(resolved[n]) else 'resolved',
+                )
+                for n in rows
+            ])
+            tasks = models.Task.objects.bulk_create([
+                models.Task(
+                    ticket=ticket, assigned_to_id=int(assignees[n]),
+                    status='pending' if np.isnan(resolved[n]) else 'done',
+                )
+                for n, ticket in zip(rows, tickets)
+            ])
+            for n, instance in zip(list(rows) * 2, tickets + tasks):
+                instance.created_at = moment(created[n])
+                instance.updated_at = moment(created[n] if np.isnan(resolved[n]) else resolved[n])
+            models.Ticket.objects.bulk_update(tickets, ['created_at', 'updated_at'])
+            models.Task.objects.bulk_update(tasks, ['created_at', 'updated_at'])
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        end = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        start = end - datetime.timedelta(days=options['days'])
+        edges = analytics.bucket_edges(start, end, 'day')
+        epoch_edges = np.array([edge.timestamp() for edge in edges])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            first = (end - datetime.timedelta(days=options['history'])).timestamp()
+            self.seed(rng, options['tickets'], options['agents'], first, end.timestamp())
+            self.stdout.write(
+                f"Seeded {options['tickets']} ticket(s) and task(s) over {options['history']} day(s) "
+                f"in {time.perf_counter() - started:.1f} s; reporting {len(edges) - 1} day bucket(s)."
+            )
+
+            created, resolved, carried = self.timed("Load tickets", analytics.load_tickets, edges[0], edges[-1])
+            tasks = self.timed("Load tasks", analytics.load_tasks, edges[0], edges[-1])
+            self.stdout.write(f"Loaded {created.size} ticket(s), {carried} carried over open, {tasks[0].size} task(s).")
+
+            started = time.perf_counter()
+            self.timed(
+                "Resolution percentiles and histogram", analytics.resolution_stats,
+                created, resolved, epoch_edges[0], epoch_edges[-1],
+            )
+            self.timed("Backlog curve", analytics.backlog_curve, created, resolved, epoch_edges, carried)
+            self.timed("Agent throughput", analytics.agent_throughput, *tasks, epoch_edges[0], epoch_edges[-1])
+            numpy_total = time.perf_counter() - started
+            self.stdout.write(f"NumPy total: {numpy_total * 1000:.0f} ms")
+
+            if not options['no_compare']:
+                columns = [column.tolist() for column in [created, resolved, *tasks]]
+                started = time.perf_counter()
+                python_report(*columns, epoch_edges.tolist(), epoch_edges[0], epoch_edges[-1])
+                python_total = time.perf_counter() - started
+                self.stdout.write(
+                    f"Row-by-row Python: {python_total * 1000:.0f} ms ({python_total / numpy_total:.0f}x slower)"
+                )
+
+            self.timed("analytics.report()", analytics.report, edges[0], edges[-1])
+            transaction.set_rollback(True)
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ticketing import assignment
+
+
+def naive_pick(agents, loads, attrs):
+    # What a per-request query would do: scan every agent of the narrowest matching pool
+    for key in reversed(assignment.pools_for(attrs)):
+        eligible = [agent_id for agent_id, agent_attrs in agents if agent_attrs[:len(key)] == key]
+        if eligible:
+            return min(eligible, key=lambda agent_id: loads[agent_id])
+    return None
+
+
+class Command(BaseCommand):
+    help = "Simulate auto-assignment of many tickets across many agents, in memory, and report pick cost and balance."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=5000)
+        parser.add_argument('--tickets', type=int, default=50000)
+        parser.add_argument('--branches', type=int, default=5)
+        parser.add_argument('--locations', type=int, default=4)
+        parser.add_argument('--departments', type=int, default=6)
+        parser.add_argument('--close-rate', type=float, default=0.3, help="Chance an open task is closed after each pick.")
+        parser.add_argument('--compare', type=int, default=2000, help="Tickets to also run through a linear scan (0 to skip).")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def random_attrs():
+            attrs = (
+                f"branch-{rng.randrange(options['branches'])}",
+                f"location-{rng.randrange(options['locations'])}",
+                f"department-{rng.randrange(options['departments'])}",
+            )
+            # Some users leave the department blank
+            return attrs if rng.random() > 0.1 else attrs[:2] + ('',)
+
+        agents = [(agent_id, random_attrs()) for agent_id in range(1, options['agents'] + 1)]
+        owners = [random_attrs() for _ in range(options['tickets'])]
+
+        index = assignment.LoadIndex()
+        started = time.perf_counter()
+        index.load(agents, {})
+        self.stdout.write(f"Indexed {len(agents)} agent(s) in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+        timings = []
+        open_tasks = []
+        for attrs in owners:
+            started = time.perf_counter()
+            agent_id = index.pick(attrs, reserve=True)
+            timings.append(time.perf_counter() - started)
+            open_tasks.append(agent_id)
+            while open_tasks and rng.random() < options['close_rate']:
+                position = rng.randrange(len(open_tasks))
+                open_tasks[position], open_tasks[-1] = open_tasks[-1], open_tasks[position]
+                index.adjust(open_tasks.pop(), -1)
+
+        timings.sort()
+        total = sum(timings)
+        self.stdout.write(
+            f"Heap index: {len(owners)} pick(s) in {total:.3f} s, "
+            f"mean {total / len(timings) * 1e6:.1f} us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us."
+        )
+
+        pools = {}
+        for agent_id, attrs in agents:
+            pools.setdefault(attrs, []).append(index.load_of(agent_id))
+        spread = max((max(loads) - min(loads) for loads in pools.values() if len(loads) > 1), default=0)
+        loads = [index.load_of(agent_id) for agent_id, _ in agents]
+        self.stdout.write(
+            f"Open tasks: {len(open_tasks)}; per agent mean {statistics.mean(loads):.2f}, max {max(loads)}; "
+            f"widest spread inside one team: {spread}."
+        )
+
+        if options['compare']:
+            loads = {agent_id: 0 for agent_id, _ in agents}
+            sample = owners[:options['compare']]
+            started = time.perf_counter()
+            for attrs in sample:
+                loads[naive_pick(agents, loads, attrs)] += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Linear scan: {len(sample)} pick(s) in {elapsed:.3f} s, mean {elapsed / len(sample) * 1e6:.1f} us."
+            )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ticketing import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued WebSocket notifications from the outbox to the channel layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit.")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        while True:
+            sent = outbox.drain(options['batch_size'])
+            if options['once']:
+                self.stdout.write(f"Dispatched {sent} notification(s).")
+                return
+            close_old_connections()
+            time.sleep(outbox.get_setting('POLL_INTERVAL'))
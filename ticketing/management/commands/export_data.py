@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from ticketing import export
+
+
+class Command(BaseCommand):
+    help = "Stream tickets, tasks or audit logs to a file as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(export.EXPORTS))
+        parser.add_argument('--output-format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--created-after', help="ISO date or datetime (inclusive).")
+        parser.add_argument('--created-before', help="ISO date or datetime (exclusive).")
+        parser.add_argument('--output', '-o', help="File to write; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        params = {
+            'created_after': options['created_after'],
+            'created_before': options['created_before'],
+        }
+        try:
+            chunks = export.stream(options['resource'], options['output_format'], params, compress=options['gzip'])
+            if options['output']:
+                with open(options['output'], 'wb') as output:
+                    for chunk in chunks:
+                        output.write(chunk)
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
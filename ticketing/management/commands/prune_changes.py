@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import changefeed
+
+
+class Command(BaseCommand):
+    help = "Delete change feed entries older than the retention window."
+
+    def handle(self, *args, **options):
+        deleted = changefeed.prune()
+        self.stdout.write(f"Deleted {deleted} change(s).")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import notifications
+from ticketing import outbox
+
+
+class Command(BaseCommand):
+    help = "Delete stored notifications older than the replay retention window, and outbox rows that ran out of attempts."
+
+    def handle(self, *args, **options):
+        deleted = notifications.prune()
+        self.stdout.write(f"Deleted {deleted} notification(s).")
+        deleted = outbox.prune()
+        self.stdout.write(f"Deleted {deleted} undeliverable outbox row(s).")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import attachments
+
+
+class Command(BaseCommand):
+    help = "Delete attachment uploads that were abandoned before completing."
+
+    def handle(self, *args, **options):
+        deleted = attachments.prune_uploads()
+        self.stdout.write(f"Deleted {deleted} abandoned upload(s).")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import similarity
+
+
+class Command(BaseCommand):
+    help = "Recompute the near-duplicate signatures of all open tickets in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        for count, last_id in similarity.rebuild(options['batch_size']):
+            total += count
+            self.stdout.write(f"Signed {total} ticket(s), up to id {last_id}.")
+        self.stdout.write(f"Done: {total} open ticket(s) signed.")
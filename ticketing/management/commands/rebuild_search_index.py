@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ticketing import search
+
+
+class Command(BaseCommand):
+    help = "Backfill the ticket full-text search index in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE)
+        parser.add_argument('--start-after', type=int, default=0, help="Resume after this ticket id.")
+        parser.add_argument('--clear', action='store_true', help="Empty the index before rebuilding.")
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stdout.write("This database has no full-text index; search falls back to substring matching.")
+            return
+
+        if options['clear']:
+            search.clear()
+
+        total = 0
+        for count, last_id in search.rebuild(options['batch_size'], options['start_after']):
+            total += count
+            self.stdout.write(f"Indexed {total} ticket(s), up to id {last_id}.")
+        self.stdout.write(f"Done: {total} ticket(s) indexed.")
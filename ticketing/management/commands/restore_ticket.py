@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ticketing import archive
+from ticketing import models
+
+
+class Command(BaseCommand):
+    help = "Move archived tickets and their tasks back into the hot tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ticket_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        for ticket_id in options['ticket_ids']:
+            try:
+                ticket, task_count = archive.restore(ticket_id)
+            except models.ArchivedTicket.DoesNotExist:
+                raise CommandError(f"Ticket {ticket_id} is not archived.")
+            self.stdout.write(f"Restored ticket {ticket.pk} with {task_count} task(s).")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ticketing import deadlines
+
+
+class Command(BaseCommand):
+    help = "Send WebSocket notices for tasks whose deadline has passed, as the deadlines come."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Notify what is overdue now and exit.")
+
+    def handle(self, *args, **options):
+        scheduler = deadlines.DeadlineScheduler()
+        while True:
+            scheduler.sync()
+            notified = scheduler.fire()
+            if options['once']:
+                self.stdout.write(f"Notified {notified} overdue task(s).")
+                return
+            close_old_connections()
+
+            wait = deadlines.get_setting('POLL_INTERVAL')
+            next_due = scheduler.next_due()
+            if next_due is not None:
+                wait = min(wait, max(0, (next_due - timezone.now()).total_seconds()))
+            time.sleep(wait)
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:20
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+OPEN_STATUSES = ['new', 'assigned', 'in_progress']
+
+
+def merge_open_duplicates(apps, schema_editor):
+    # Races on the old check-then-insert left some users with several open tickets
+    # under one subject. The oldest of each group takes over the others' tasks and
+    # the rest are resolved, so the constraint below can be added.
+    Ticket = apps.get_model('ticketing', 'Ticket')
+    Task = apps.get_model('ticketing', 'Task')
+
+    open_tickets = Ticket.objects.filter(status__in=OPEN_STATUSES).annotate(subject_key=Lower('subject'))
+    groups = list(
+        open_tickets.values('user_id', 'subject_key').annotate(copies=Count('id')).filter(copies__gt=1)
+    )
+    for group in groups:
+        ids = list(
+            open_tickets.filter(user_id=group['user_id'], subject_key=group['subject_key'])
+            .order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        Task.objects.filter(ticket_id__in=ids[1:]).update(ticket_id=ids[0])
+        Ticket.objects.filter(pk__in=ids[1:]).update(status='resolved')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0002_ticket_task_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'created_at', 'id'], name='task_assignee_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='ticket_user_created_idx'),
+        ),
+        migrations.RunPython(merge_open_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.text.Lower('subject'), condition=models.Q(('status__in', ['new', 'assigned', 'in_progress'])), name='ticket_open_subject_uniq', violation_error_message='You already have an open ticket with this subject.'),
+        ),
+    ]
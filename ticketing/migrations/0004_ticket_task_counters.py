@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_ticket_tasks(apps, schema_editor):
+    Task = apps.get_model('ticketing', 'Task')
+    Ticket = apps.get_model('ticketing', 'Ticket')
+    fields = {'pending': 'pending_tasks', 'in_progress': 'in_progress_tasks', 'done': 'done_tasks'}
+
+    counts = {}
+    rows = Task.objects.filter(ticket__isnull=False).values('ticket_id', 'status').annotate(total=Count('id'))
+    for row in rows.iterator():
+        counts.setdefault(row['ticket_id'], {})[fields[row['status']]] = row['total']
+
+    for ticket_id, values in counts.items():
+        Ticket.objects.filter(pk=ticket_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='done_tasks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='in_progress_tasks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='pending_tasks',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_ticket_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:05
+
+from django.db import migrations
+
+# The index tables live outside the ORM; ticketing.search maintains them.
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ticketing_ticket_fts USING fts5("
+        "subject, description, tokenize='porter unicode61', prefix='2 3')",
+        "INSERT INTO ticketing_ticket_fts (rowid, subject, description) "
+        "SELECT id, subject, description FROM ticketing_ticket",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS ticketing_ticket_search ("
+        "ticket_id bigint PRIMARY KEY REFERENCES ticketing_ticket (id) ON DELETE CASCADE, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ticketing_ticket_search_gin ON ticketing_ticket_search USING gin (document)",
+        "INSERT INTO ticketing_ticket_search (ticket_id, document) "
+        "SELECT id, setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B') FROM ticketing_ticket",
+    ],
+}
+DROP_SQL = {
+    'sqlite': ["DROP TABLE IF EXISTS ticketing_ticket_fts"],
+    'postgresql': ["DROP TABLE IF EXISTS ticketing_ticket_search"],
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0006_notification_replay'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:36
+
+import datetime
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import DateField
+from django.db.models.functions import TruncMonth
+
+
+def set_months(apps, schema_editor):
+    AuditLog = apps.get_model('ticketing', 'AuditLog')
+    AuditLog.objects.update(
+        month=TruncMonth('timestamp', output_field=DateField(), tzinfo=datetime.timezone.utc),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0008_ticket_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='month',
+            field=models.DateField(db_index=True, default=datetime.date(2000, 1, 1), editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_months, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor', 'timestamp', 'id'], name='auditlog_actor_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='auditlog_ts_id_idx'),
+        ),
+    ]
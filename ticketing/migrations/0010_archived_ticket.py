@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:38
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0009_auditlog_month_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('tasks', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='archived_user_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:58
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def skip_past_deadlines(apps, schema_editor):
+    # Tasks already overdue before the scheduler existed are not announced all at once
+    Task = apps.get_model('ticketing', 'Task')
+    Task.objects.filter(deadline__lt=timezone.localdate()).update(overdue_notified=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0011_attachments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='overdue_notified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(skip_past_deadlines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['updated_at'], name='task_updated_idx'),
+        ),
+    ]
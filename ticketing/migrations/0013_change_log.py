@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:01
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0012_task_deadline_scheduling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('ticket', 'Ticket'), ('task', 'Task')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=10)),
+                ('owner_id', models.BigIntegerField(null=True)),
+                ('previous_owner_id', models.BigIntegerField(null=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner_id', 'id'], name='changelog_owner_idx'), models.Index(fields=['previous_owner_id', 'id'], name='changelog_prev_owner_idx')],
+            },
+        ),
+    ]
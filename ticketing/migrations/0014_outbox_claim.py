@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0013_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='claimed_by',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
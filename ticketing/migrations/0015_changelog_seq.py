@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:56
+
+from django.db import migrations, models
+from django.db.models import F, Max, Min
+
+
+def number_existing_changes(apps, schema_editor):
+    # Cursors handed out so far are ids: keep them valid by numbering existing rows
+    # with their id, and continue above the highest
+    ChangeLog = apps.get_model('ticketing', 'ChangeLog')
+    ChangeFeedState = apps.get_model('ticketing', 'ChangeFeedState')
+
+    ChangeLog.objects.update(seq=F('id'))
+    bounds = ChangeLog.objects.aggregate(first=Min('id'), last=Max('id'))
+    ChangeFeedState.objects.create(
+        pk=1, last_seq=bounds['last'] or 0, pruned_seq=bounds['first'] - 1 if bounds['first'] else 0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0014_outbox_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('pruned_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='changelog_owner_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='changelog_prev_owner_idx',
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='seq',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['owner_id', 'seq'], name='changelog_owner_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['previous_owner_id', 'seq'], name='changelog_prev_owner_seq_idx'),
+        ),
+    ]
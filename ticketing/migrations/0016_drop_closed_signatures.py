@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def drop_closed_signatures(apps, schema_editor):
+    # Closed tickets used to keep an empty signature; now they have no row at all
+    TicketSignature = apps.get_model('ticketing', 'TicketSignature')
+    TicketSignature.objects.filter(signature=b'').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0015_changelog_seq'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_closed_signatures, migrations.RunPython.noop),
+    ]
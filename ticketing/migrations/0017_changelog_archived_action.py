@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0016_drop_closed_signatures'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='action',
+            field=models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete'), ('archived', 'Archived')], max_length=10),
+        ),
+    ]
@@ -1,9 +1,17 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 import re 
+import datetime
+import uuid
 from django.utils import timezone
+from ticketing import listcache
 
 # Create your models here.
 
@@ -101,6 +109,39 @@ class CustomUser(AbstractUser):
         self.full_clean()
         super().save(*args, **kwargs)
 
+OPEN_TICKET_STATUSES = ['new', 'assigned', 'in_progress']
+DUPLICATE_SUBJECT_MESSAGE = "You already have an open ticket with this subject."
+# Ticket column counting the ticket's tasks in each task status
+TASK_STATUS_COUNTERS = {
+    'pending': 'pending_tasks',
+    'in_progress': 'in_progress_tasks',
+    'done': 'done_tasks',
+}
+
+class TicketQuerySet(models.QuerySet):
+    def for_list(self):
+        # TicketSerializer renders the owner through CustomUser.__str__
+        return self.select_related('user')
+
+    def rollup_status(self, ticket_id):
+        # Must run inside the transaction that wrote the task so the counters and
+        # the derived status are read and written under the same row lock.
+        ticket = self.select_for_update().get(pk=ticket_id)
+        new_status = ticket.status_from_task_counts()
+        if new_status == ticket.status:
+            return ticket, False
+
+        ticket.status = new_status
+        ticket.updated_at = timezone.now()
+        self.filter(pk=ticket_id).update(status=ticket.status, updated_at=ticket.updated_at)
+        listcache.bump_on_commit('ticket')  # update() sends no post_save
+        from ticketing import changefeed
+        from ticketing import similarity
+        changefeed.record('ticket', ticket)
+        if new_status not in OPEN_TICKET_STATUSES:
+            similarity.forget(ticket_id)
+        return ticket, True
+
 class Ticket(models.Model):    
     STATUS_CHOICES = [
         ('new', 'New'),
@@ -113,21 +154,80 @@ class Ticket(models.Model):
     subject = models.CharField(max_length=200)
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
+    pending_tasks = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_tasks = models.PositiveIntegerField(default=0, editable=False)
+    done_tasks = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TicketQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ticket_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='ticket_user_created_idx'),
+        ]
+        constraints = [
+            # One open ticket per (user, case-insensitive subject), enforced by the database
+            models.UniqueConstraint(
+                F('user'), Lower('subject'),
+                condition=Q(status__in=OPEN_TICKET_STATUSES),
+                name='ticket_open_subject_uniq',
+                violation_error_message=DUPLICATE_SUBJECT_MESSAGE,
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # The owner as loaded, so the change feed can tell the old owner it lost the ticket
+        ticket._loaded_user_id = ticket.__dict__.get('user_id')
+        # What the duplicate index last signed, so unrelated saves skip rehashing
+        if 'subject' in ticket.__dict__ and 'description' in ticket.__dict__ and 'status' in ticket.__dict__:
+            ticket._loaded_text = (ticket.subject, ticket.description)
+            ticket._loaded_open = ticket.status in OPEN_TICKET_STATUSES
+        return ticket
+
     def clean(self):
         self.subject = self.subject.strip()
 
-        if Ticket.objects.exclude(pk=self.pk).filter(user=self.user, subject__iexact=self.subject, status__in=['new', 'assigned', 'in_progress']).exists():
-            raise ValidationError("You already have an open ticket with this subject.")
-
     def save(self, *args, **kwargs):
-        self.full_clean()  # triggers `clean()`
-        super().save(*args, **kwargs)
+        self.full_clean(validate_constraints=False)  # triggers `clean()`; the DB checks the constraint
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Task counters are maintained with F() updates; never write back a stale copy
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in TASK_STATUS_COUNTERS.values()
+            ]
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as exc:
+            if 'ticket_open_subject_uniq' in str(exc):
+                raise ValidationError(DUPLICATE_SUBJECT_MESSAGE)
+            raise
+
+    def status_from_task_counts(self):
+        total = self.pending_tasks + self.in_progress_tasks + self.done_tasks
+
+        if total and self.done_tasks == total:
+            if self.status not in ['resolved', 'closed']:
+                return 'resolved'
+        elif self.in_progress_tasks:
+            if self.status not in ['in_progress', 'resolved', 'closed']:
+                return 'in_progress'
+        elif self.pending_tasks:
+            if self.status == 'new':
+                return 'assigned'
+        return self.status
 
     def __str__(self):
-        return f"{self.subject} ({self.get_priority_display()}) - {self.status.capitalize()}"
+        return f"{self.subject} - {self.get_status_display()}"
+
+class TaskQuerySet(models.QuerySet):
+    def for_list(self):
+        # TaskSerializer renders the ticket and both users through their __str__
+        return self.select_related('ticket', 'assigned_by', 'assigned_to')
 
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -141,28 +241,274 @@ class Task(models.Model):
     assigned_to = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='tasks')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     deadline = models.DateField(null=True, blank=True)
+    # Set by the deadline scheduler once it has sent the overdue notice; cleared when the deadline moves
+    overdue_notified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='task_created_id_idx'),
+            models.Index(fields=['assigned_to', 'created_at', 'id'], name='task_assignee_created_idx'),
+            # Deadline scheduler: open tasks by deadline, and tasks changed since its last poll
+            models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+        ]
+
     def clean(self):
 
-        if self.deadline and self.deadline < timezone.now().date():
+        if self.deadline and self.deadline < timezone.now().date() and self.deadline_changed():
             raise ValidationError("Deadline cannot be in the past.")
 
         if self.assigned_by and self.assigned_to == self.assigned_by:
             raise ValidationError("You cannot assign a task to yourself.")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        task = super().from_db(db, field_names, values)
+        # The deadline as loaded, so clean() can tell whether it is being changed
+        task._loaded_deadline = task.__dict__.get('deadline')
+        return task
+
     def save(self, *args, **kwargs):
-        self.full_clean()  
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                # Lock the row so concurrent updates of this task count each transition once
+                previous = Task.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'ticket_id', 'status', 'assigned_to_id', 'deadline',
+                ).first()
+                if previous:
+                    # clean() compares against the row as locked, not as this instance was loaded
+                    self._loaded_deadline = previous[3]
+            self.full_clean()
+            if previous and previous[3] != self.deadline:
+                self.overdue_notified = False
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'overdue_notified'}
+            # Read by the post_save receivers (assignment load, change feed), which run inside super().save()
+            self._previous_state = previous
+            super().save(*args, **kwargs)
+            self._loaded_deadline = self.deadline
+            if previous is None or previous[:2] != (self.ticket_id, self.status):
+                if previous:
+                    self.count_on_ticket(*previous[:2], -1)
+                self.count_on_ticket(self.ticket_id, self.status, 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._counted_state = Task.objects.select_for_update().filter(pk=self.pk).values_list(
+                'ticket_id', 'status', 'assigned_to_id',
+            ).first()
+            return super().delete(*args, **kwargs)
+
+    def deadline_changed(self):
+        # Tasks that went overdue can still be edited as long as the deadline is left alone
+        return self._state.adding or getattr(self, '_loaded_deadline', None) != self.deadline
+
+    @classmethod
+    def count_on_ticket(cls, ticket_id, status, delta):
+        if ticket_id is None or status is None:
+            return
+        field = TASK_STATUS_COUNTERS[status]
+        Ticket.objects.filter(pk=ticket_id).update(**{field: F(field) + delta})
 
     def __str__(self):
-        return f"{self.title} ({self.status.capitalize()})"
+        return f"Task #{self.pk} ({self.get_status_display()})"
+
+@receiver(post_delete, sender=Task)
+def uncount_deleted_task(sender, instance, **kwargs):
+    # Also runs for cascades (ticket or assignee deletion), unlike an overridden delete()
+    if hasattr(instance, '_counted_state'):
+        counted = instance._counted_state
+    else:
+        counted = (instance.ticket_id, instance.status)
+    if counted:
+        Task.count_on_ticket(*counted[:2], -1)
+
+def month_of(timestamp):
+    return timezone.localtime(timestamp, datetime.timezone.utc).date().replace(day=1)
 
 class AuditLog(models.Model):
     actor = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     event = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # When the event happened, not when the buffered writer flushed it
+    timestamp = models.DateTimeField(default=timezone.now)
+    # First day of the (UTC) month: retention and archiving work a month at a time
+    month = models.DateField(editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actor', 'timestamp', 'id'], name='auditlog_actor_ts_idx'),
+            models.Index(fields=['timestamp', 'id'], name='auditlog_ts_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.month = month_of(self.timestamp)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.actor.username} - {self.event} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+class NotificationOutbox(models.Model):
+    group = models.CharField(max_length=100)
+    payload = models.JSONField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Dispatcher that has the row leased until available_at (see outbox.claim)
+    claimed_by = models.UUIDField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.group} - {self.payload.get('type')} (attempt {self.attempts})"
+
+class NotificationSequence(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='notification_sequence')
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.last_seq}"
+
+class UserNotification(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    seq = models.PositiveBigIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'seq'], name='user_notification_seq_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} #{self.seq} - {self.payload.get('type')}"
+
+class TicketSignature(models.Model):
+    # MinHash signature of an open ticket, so duplicate indexes load without rehashing text
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Signature for ticket #{self.ticket_id}"
+
+class ArchivedTicket(models.Model):
+    # A resolved ticket moved out of the hot table, with its tasks, as stored row values
+    id = models.BigIntegerField(primary_key=True)  # the original Ticket id
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_tickets')
+    subject = models.CharField(max_length=200)
+    created_at = models.DateTimeField()
+    resolved_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    ticket = models.JSONField(encoder=DjangoJSONEncoder)
+    tasks = models.JSONField(encoder=DjangoJSONEncoder, default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='archived_user_created_idx'),
+        ]
+
+    def as_ticket(self):
+        # Unsaved Ticket with the archived values, for serializers and restores
+        ticket = Ticket(**{
+            field.attname: field.to_python(self.ticket[field.attname])
+            for field in Ticket._meta.concrete_fields if field.attname in self.ticket
+        })
+        if 'user' in self._state.fields_cache:
+            ticket.user = self.user
+        return ticket
+
+    def as_tasks(self):
+        return [
+            Task(**{
+                field.attname: field.to_python(row[field.attname])
+                for field in Task._meta.concrete_fields if field.attname in row
+            })
+            for row in self.tasks
+        ]
+
+    def __str__(self):
+        return f"{self.subject} (archived)"
+
+class AttachmentBlob(models.Model):
+    # One stored file per distinct content; attachments with the same bytes share it
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    name = models.CharField(max_length=255)  # path in the "attachments" storage
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+class Attachment(models.Model):
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='attachments')
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, related_name='attachments')
+    filename = models.CharField(max_length=255)
+    uploaded_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='attachments')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename} on ticket #{self.ticket_id}"
+
+class AttachmentUpload(models.Model):
+    # A resumable upload in progress; the bytes received so far sit in a staging file
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='uploads')
+    uploaded_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+class ChangeLog(models.Model):
+    # Append-only feed of ticket and task writes; `seq` is the sync cursor
+    RESOURCE_CHOICES = [
+        ('ticket', 'Ticket'),
+        ('task', 'Task'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+        ('archived', 'Archived'),  # moved out of the hot tables; still readable by id
+    ]
+
+    resource = models.CharField(max_length=10, choices=RESOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Who sees the change: the ticket's owner or the task's assignee. The one it was
+    # taken from, if any, sees it as a delete. Plain ids, so deleting users keeps history.
+    owner_id = models.BigIntegerField(null=True)
+    previous_owner_id = models.BigIntegerField(null=True)
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)  # the row after the change
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Numbered after the writing transaction commits (changefeed.sequence), so unlike
+    # the id it follows commit order; NULL until then
+    seq = models.BigIntegerField(null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner_id', 'seq'], name='changelog_owner_seq_idx'),
+            models.Index(fields=['previous_owner_id', 'seq'], name='changelog_prev_owner_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.resource} {self.object_id} {self.action}"
+
+class ChangeFeedState(models.Model):
+    # Single row, locked while changes are numbered
+    last_seq = models.BigIntegerField(default=0)
+    pruned_seq = models.BigIntegerField(default=0)  # cursors below this must resync
 
     def __str__(self):
-        return f"{self.actor.username} - {self.event} at {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
\ No newline at end of file
+        return f"Change feed at {self.last_seq}"
@@ -0,0 +1,60 @@
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ticketing import models
+
+DEFAULTS = {
+    'RETENTION': 7 * 24 * 60 * 60,  # seconds a notification stays available for replay
+    'MAX_REPLAY': 500,  # larger gaps ask the client to resync instead of streaming them
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_REPLAY', {}).get(name, DEFAULTS[name])
+
+
+def next_seq(user_id):
+    # The sequence row stays locked by the UPDATE until the caller's transaction
+    # commits, so per-user sequence numbers are gap-free and strictly increasing.
+    with transaction.atomic():
+        sequence = models.NotificationSequence.objects.filter(user_id=user_id)
+        if not sequence.update(last_seq=F('last_seq') + 1):
+            try:
+                with transaction.atomic():
+                    models.NotificationSequence.objects.create(user_id=user_id, last_seq=1)
+                return 1
+            except IntegrityError:
+                sequence.update(last_seq=F('last_seq') + 1)
+        return sequence.values_list('last_seq', flat=True).get()
+
+
+def record(user_id, content):
+    seq = next_seq(user_id)
+    content = {**content, "seq": seq}
+    models.UserNotification.objects.create(user_id=user_id, seq=seq, payload=content)
+    return content
+
+
+def missed_since(user_id, last_seq):
+    limit = get_setting('MAX_REPLAY')
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_setting('RETENTION'))
+    missed = list(
+        models.UserNotification.objects
+        .filter(user_id=user_id, seq__gt=last_seq, created_at__gte=cutoff)
+        .order_by('seq')
+        .values_list('seq', 'payload')[:limit + 1]
+    )
+
+    # The gap can only be replayed if it has not been pruned and is not too large
+    complete = len(missed) <= limit and (not missed or missed[0][0] == last_seq + 1)
+    return [payload for _, payload in missed], complete
+
+
+def prune():
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_setting('RETENTION'))
+    deleted, _ = models.UserNotification.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
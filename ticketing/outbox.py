@@ -0,0 +1,187 @@
+import asyncio
+import datetime
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ticketing import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 10,
+    'RETRY_DELAY': 2,  # seconds, doubled on every failed attempt
+    'CLAIM_TIMEOUT': 60,  # seconds a claimed batch is hidden from other dispatchers while it is sent
+    'DEAD_RETENTION': 7 * 24 * 60 * 60,  # seconds rows that ran out of attempts are kept for inspection
+    'POLL_INTERVAL': 5,  # seconds between sweeps for retries and rows written by other processes
+    'COALESCE_WINDOW': 0.25,  # seconds to let a burst accumulate before it is merged and sent
+    'DISPATCH_IN_PROCESS': True,  # False when `manage.py dispatch_notifications` runs separately
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+def enqueue(group, content):
+    # Written in the caller's transaction: rolled back together with the change it announces.
+    message = models.NotificationOutbox.objects.create(group=group, payload=content)
+    if get_setting('DISPATCH_IN_PROCESS'):
+        transaction.on_commit(dispatcher.wake)
+    return message
+
+
+def coalesce_key(message):
+    ticket_id = (message.payload.get("data") or {}).get("ticket_id")
+    if ticket_id is None:
+        return message.pk
+    return (message.payload.get("type"), ticket_id)
+
+
+def coalesce(messages):
+    # One frame per group: repeated events for the same ticket keep only the
+    # latest, and several remaining events travel as a single batch envelope.
+    by_group = {}
+    for message in messages:
+        by_group.setdefault(message.group, []).append(message)
+
+    frames = []
+    for group, rows in by_group.items():
+        latest = {}
+        for message in rows:
+            latest[coalesce_key(message)] = message
+        kept = sorted(latest.values(), key=lambda message: message.pk)
+
+        # The group lets consumers re-check the subscriber's permission on delivery
+        if len(kept) == 1:
+            event = {"type": "notify", "group": group, "content": kept[0].payload}
+        else:
+            event = {"type": "notify", "group": group, "events": [message.payload for message in kept]}
+        frames.append((group, event, rows))
+    return frames
+
+
+async def _group_send_all(channel_layer, frames):
+    sends = [channel_layer.group_send(group, event) for group, event, _ in frames]
+    return await asyncio.gather(*sends, return_exceptions=True)
+
+
+def claim(batch_size):
+    # Leases due rows to this dispatcher by pushing available_at past the send. The
+    # UPDATE re-checks available_at, so of two dispatchers that read the same rows
+    # (no skip_locked on SQLite) only one claims each; rows of a dispatcher that dies
+    # mid-send become due again when the lease runs out.
+    now = timezone.now()
+    token = uuid.uuid4()
+    with transaction.atomic():
+        pending = models.NotificationOutbox.objects.filter(
+            available_at__lte=now,
+            attempts__lt=get_setting('MAX_ATTEMPTS'),
+        ).order_by('available_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        models.NotificationOutbox.objects.filter(pk__in=ids, available_at__lte=now).update(
+            available_at=now + datetime.timedelta(seconds=get_setting('CLAIM_TIMEOUT')), claimed_by=token,
+        )
+    return list(models.NotificationOutbox.objects.filter(claimed_by=token).order_by('id'))
+
+
+def record_failure(rows, error):
+    now = timezone.now()
+    for message in rows:
+        message.attempts += 1
+        delay = get_setting('RETRY_DELAY') * 2 ** (message.attempts - 1)
+        message.available_at = now + datetime.timedelta(seconds=delay)
+        message.last_error = repr(error)
+        message.claimed_by = None
+    models.NotificationOutbox.objects.bulk_update(rows, ['attempts', 'available_at', 'last_error', 'claimed_by'])
+
+    dead = [message.pk for message in rows if message.attempts >= get_setting('MAX_ATTEMPTS')]
+    if dead:
+        logger.error("Giving up on notifications %s after %s attempts: %r", dead, get_setting('MAX_ATTEMPTS'), error)
+
+
+def dispatch_batch(batch_size=None):
+    messages = claim(batch_size or get_setting('BATCH_SIZE'))
+    if not messages:
+        return 0
+
+    # Sent with no transaction open and no row locked: a slow channel layer holds up
+    # only this dispatcher, never the writers enqueueing behind it
+    frames = coalesce(messages)
+    results = async_to_sync(_group_send_all)(get_channel_layer(), frames)
+
+    sent = []
+    with transaction.atomic():
+        for (group, _, rows), result in zip(frames, results):
+            if not isinstance(result, Exception):
+                sent.extend(message.pk for message in rows)
+                continue
+            record_failure(rows, result)
+            logger.warning("Notifications to %s failed (%s rows): %r", group, len(rows), result)
+
+        # Delivery is at-least-once: a crash between the send and this delete resends the batch
+        # once the claim runs out.
+        token = messages[0].claimed_by
+        models.NotificationOutbox.objects.filter(pk__in=sent, claimed_by=token).delete()
+    return len(messages)
+
+
+def prune():
+    # Rows that ran out of attempts stay for inspection (last_error) until DEAD_RETENTION has passed
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_setting('DEAD_RETENTION'))
+    deleted, _ = models.NotificationOutbox.objects.filter(
+        attempts__gte=get_setting('MAX_ATTEMPTS'), created_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def drain(batch_size=None):
+    total = 0
+    while True:
+        count = dispatch_batch(batch_size)
+        total += count
+        if not count:
+            return total
+
+
+class OutboxDispatcher:
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        self._wakeup.set()
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self.run, name='notification-outbox', daemon=True)
+                    self._thread.start()
+
+    def run(self):
+        while True:
+            if self._wakeup.wait(get_setting('POLL_INTERVAL')):
+                time.sleep(get_setting('COALESCE_WINDOW'))
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                drain()
+            except Exception:
+                logger.exception("Notification outbox dispatch failed")
+            finally:
+                close_old_connections()
+
+
+dispatcher = OutboxDispatcher()
@@ -0,0 +1,154 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Pages are ordered newest first on (ordering_field, id) and addressed by the
+    # key of the boundary row, so fetching a page deep in the history costs the
+    # same as fetching the first one (no OFFSET scan).
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        page = list(self.get_page_queryset(queryset))
+        self.has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if self.cursor and self.cursor['r']:
+            page.reverse()
+
+        self.page = page
+        return page
+
+    def get_page_queryset(self, queryset):
+        field = self.ordering_field
+        reverse = bool(self.cursor and self.cursor['r'])
+
+        if self.cursor:
+            value, pk = self.cursor['p']
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+            )
+
+        if reverse:
+            queryset = queryset.order_by(field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        return queryset[:self.page_size + 1]
+
+    def get_page_size(self, request):
+        default = self.default_page_size
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            page_size = default
+        if page_size <= 0:
+            page_size = default
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            value, pk = cursor['p']
+            position = parse_datetime(value)
+            if position is None:
+                raise ValueError(value)
+            return {'p': (position, int(pk)), 'r': bool(cursor.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.ordering_field)
+        cursor = {'p': [value.isoformat(), obj.pk], 'r': int(reverse)}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii').rstrip('='))
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        reverse = bool(self.cursor and self.cursor['r'])
+        # Coming back from an older page means there is always something older.
+        if self.has_more or reverse:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.cursor:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        if self.has_more or not self.cursor['r']:
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class RankedPagination(KeysetPagination):
+    # Relevance-ordered results have no stable key to seek from, so pages are plain
+    # offsets; max_offset keeps deep pages from turning into long scans.
+    offset_query_param = 'offset'
+    default_page_size = 20
+    max_page_size = 100
+    max_offset = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = max(int(request.query_params.get(self.offset_query_param, 0)), 0)
+        except ValueError:
+            self.offset = 0
+        if self.offset > self.max_offset:
+            raise NotFound('Offset too large; refine the search instead')
+
+        page = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_more = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_more:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.page_size)
+
+    def get_previous_link(self):
+        if not self.offset:
+            return None
+        url = self.request.build_absolute_uri()
+        offset = max(self.offset - self.page_size, 0)
+        if not offset:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, offset)
+
+
+class AuditLogPagination(KeysetPagination):
+    ordering_field = 'timestamp'
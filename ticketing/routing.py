@@ -2,5 +2,6 @@ from django.urls import re_path
 from ticketing import consumers
 
 websocket_urlpatterns = [
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
     re_path(r'ws/notifications/(?P<user_id>\d+)/$', consumers.NotificationConsumer.as_asgi()),
-]
\ No newline at end of file
+]
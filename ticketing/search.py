@@ -0,0 +1,130 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ticketing import models
+
+# SQLite: FTS5 table keyed by the ticket id (rowid). Postgres: weighted tsvector per
+# ticket with a GIN index. Other backends fall back to icontains.
+SQLITE_TABLE = 'ticketing_ticket_fts'
+POSTGRES_TABLE = 'ticketing_ticket_search'
+POSTGRES_CONFIG = 'english'
+BATCH_SIZE = 1000
+
+# Subject matches weigh more than description matches
+POSTGRES_DOCUMENT = (
+    f"setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(%s, '')), 'A') || "
+    f"setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(%s, '')), 'B')"
+)
+
+TERM_RE = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+
+def backend(vendor=None):
+    vendor = vendor or connection.vendor
+    return vendor if vendor in ['sqlite', 'postgresql'] else None
+
+
+def parse_query(text):
+    # Plain words are ANDed; a trailing * makes a word a prefix match ("print*").
+    # Everything else is dropped, so user input can never be read as query syntax.
+    terms = [(word, bool(star)) for word, star in TERM_RE.findall(text or '')]
+    vendor = backend()
+    if vendor == 'sqlite':
+        return ' '.join(f'"{word}"' + ('*' if prefix else '') for word, prefix in terms)
+    if vendor == 'postgresql':
+        return ' & '.join(word + (':*' if prefix else '') for word, prefix in terms)
+    return [word for word, _ in terms]
+
+
+def index_ticket(ticket):
+    index_range(ticket.pk, ticket.pk)
+
+
+def unindex_ticket(ticket_id):
+    vendor = backend()
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [ticket_id])
+        elif vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE ticket_id = %s", [ticket_id])
+
+
+def index_range(first_id, last_id):
+    # Re-indexes tickets with first_id <= id <= last_id straight from the ticket table
+    vendor = backend()
+    if vendor is None:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid BETWEEN %s AND %s", [first_id, last_id])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, subject, description) "
+                f"SELECT id, subject, description FROM ticketing_ticket WHERE id BETWEEN %s AND %s",
+                [first_id, last_id],
+            )
+        else:
+            document = POSTGRES_DOCUMENT % ('subject', 'description')
+            cursor.execute(
+                f"INSERT INTO {POSTGRES_TABLE} (ticket_id, document) "
+                f"SELECT id, {document} FROM ticketing_ticket WHERE id BETWEEN %s AND %s "
+                f"ON CONFLICT (ticket_id) DO UPDATE SET document = EXCLUDED.document",
+                [first_id, last_id],
+            )
+
+
+def rebuild(batch_size=BATCH_SIZE, start_after=0):
+    # Walks ticket ids in keyset batches, one short transaction each, so a large table
+    # never holds a long lock and an interrupted run can resume from the last id.
+    last_id = start_after
+    while True:
+        ids = list(
+            models.Ticket.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        index_range(ids[0], ids[-1])
+        last_id = ids[-1]
+        yield len(ids), last_id
+
+
+def clear():
+    vendor = backend()
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+        elif vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE}")
+
+
+def search(queryset, text):
+    # Narrows queryset to matching tickets and orders them best match first
+    query = parse_query(text)
+    if not query:
+        return queryset.none()
+
+    vendor = backend()
+    if vendor == 'sqlite':
+        matches = RawSQL(f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [query])
+        # bm25() is lower for better matches; weight subject hits 4x
+        rank = RawSQL(
+            f"SELECT -bm25({SQLITE_TABLE}, 4.0, 1.0) FROM {SQLITE_TABLE} "
+            f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = ticketing_ticket.id",
+            [query],
+        )
+    elif vendor == 'postgresql':
+        tsquery = f"to_tsquery('{POSTGRES_CONFIG}', %s)"
+        matches = RawSQL(f"SELECT ticket_id FROM {POSTGRES_TABLE} WHERE document @@ {tsquery}", [query])
+        rank = RawSQL(
+            f"SELECT ts_rank_cd(document, {tsquery}) FROM {POSTGRES_TABLE} "
+            f"WHERE ticket_id = ticketing_ticket.id",
+            [query],
+        )
+    else:
+        for word in query:
+            queryset = queryset.filter(Q(subject__icontains=word) | Q(description__icontains=word))
+        return queryset.order_by('-created_at', '-id')
+
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank', '-created_at', '-id')
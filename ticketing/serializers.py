@@ -1,5 +1,9 @@
+from types import SimpleNamespace
+
 from rest_framework import serializers
 from ticketing import models
+from ticketing import authentication
+from ticketing import thumbnails
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
@@ -64,6 +68,8 @@ class LoginSerializer(serializers.Serializer):
         user = authenticate(request, username=username, password=password)        
         if not user:
             raise AuthenticationFailed("Invalid credentials, try again")
+        if not user.is_active:
+            raise AuthenticationFailed("This account has been deactivated.")
 
         return {
             'user': user,
@@ -71,12 +77,13 @@ class LoginSerializer(serializers.Serializer):
     
     def tokens(self, user):
         refresh = RefreshToken.for_user(user)
+        access = authentication.add_user_claims(refresh.access_token, user)
         return {
             "refresh": str(refresh),
-            "access": str(refresh.access_token),
+            "access": str(access),
             "user": user.username,
-            'department': user.department.name if user.department else None,
-            'position': user.position.name if user.position else None,
+            'department': user.department,
+            'position': user.position,
             'user_type': user.get_user_type_display(),
             'is_email_verified': user.is_email_verified,
             'is_password_changed': user.is_password_changed
@@ -131,15 +138,12 @@ class TicketSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Description must be at least 10 characters long.")
         return value
 
-    def validate(self, attrs):
-        subject = attrs.get("subject", "").strip()
-        user = attrs.get("user") or self.instance.user if self.instance else None
-
-        if user and models.Ticket.objects.exclude(pk=self.instance.pk if self.instance else None)\
-            .filter(user=user, subject__iexact=subject, status__in=['new', 'assigned', 'in_progress'])\
-            .exists():
-            raise serializers.ValidationError("You already have an open ticket with this subject.")
-        return attrs
+    def save(self, **kwargs):
+        # Open-subject duplicates are rejected by the ticket_open_subject_uniq constraint on write
+        try:
+            return super().save(**kwargs)
+        except ValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
     
 class TaskSerializer(serializers.ModelSerializer):
     ticket_id = serializers.PrimaryKeyRelatedField(
@@ -152,8 +156,9 @@ class TaskSerializer(serializers.ModelSerializer):
     )
     assigned_by = serializers.StringRelatedField(read_only=True)
 
+    # Left out on create to let ticketing.assignment pick the least-loaded IT person
     assigned_to_id = serializers.PrimaryKeyRelatedField(
-        queryset= models.CustomUser.objects.all(), source='assigned_to', write_only=True
+        queryset= models.CustomUser.objects.all(), source='assigned_to', write_only=True, required=False
     )
     assigned_to = serializers.StringRelatedField(read_only=True)
 
@@ -171,7 +176,7 @@ class TaskSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def validate_deadline(self, value):
-        if value and value < timezone.now().date():
+        if value and value < timezone.now().date() and not (self.instance and value == self.instance.deadline):
             raise serializers.ValidationError("Deadline cannot be in the past.")
         return value
 
@@ -203,5 +208,43 @@ class AuditLogSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         request = self.context.get("request")
         if request and hasattr(request, "user") and request.user.is_authenticated:
-            validated_data["actor"] = request.user
-        return super().create(validated_data)    
\ No newline at end of file
+            validated_data["actor"] = authentication.resolve_user(request.user)
+        return super().create(validated_data)
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.AttachmentUpload
+        fields = ['id', 'ticket', 'filename', 'size', 'offset', 'created_at']
+        read_only_fields = ['id', 'ticket', 'offset', 'created_at']
+
+    def validate(self, attrs):
+        # The model validators expect an uploaded file; only its name and size matter here
+        declared = SimpleNamespace(name=attrs['filename'], size=attrs['size'])
+        try:
+            models.validate_file_extension(declared)
+            models.validate_file_size(declared)
+        except ValidationError as exc:
+            raise serializers.ValidationError({"filename": exc.messages})
+        return attrs
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    uploaded_by = serializers.StringRelatedField(read_only=True)
+    sha256 = serializers.CharField(source='blob_id', read_only=True)
+    size = serializers.IntegerField(source='blob.size', read_only=True)
+
+    thumbnails = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Attachment
+        fields = ['id', 'ticket', 'filename', 'sha256', 'size', 'uploaded_by', 'thumbnails', 'created_at']
+        read_only_fields = fields
+
+    def get_thumbnails(self, attachment):
+        if thumbnails.source_format(attachment.filename) is None:
+            return {}
+        return {
+            size: f"/api/attachments/{attachment.id}/thumbnails/{size}/"
+            for size in thumbnails.get_setting('SIZES')
+        }
@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ticketing import assignment
+from ticketing import authentication
+from ticketing import changefeed
+from ticketing import listcache
+from ticketing import models
+from ticketing import search
+from ticketing import similarity
+
+CACHED_MODELS = {
+    models.Ticket: 'ticket',
+    models.Task: 'task',
+    models.CustomUser: 'user',
+}
+
+
+@receiver(post_save, sender=models.Ticket)
+@receiver(post_delete, sender=models.Ticket)
+@receiver(post_save, sender=models.Task)
+@receiver(post_delete, sender=models.Task)
+@receiver(post_save, sender=models.CustomUser)
+@receiver(post_delete, sender=models.CustomUser)
+def invalidate_list_cache(sender, **kwargs):
+    listcache.bump_on_commit(CACHED_MODELS[sender])
+
+
+@receiver(post_save, sender=models.Ticket)
+def index_ticket(sender, instance, update_fields=None, **kwargs):
+    # Counter and status updates leave the indexed text alone
+    if update_fields is not None and not {'subject', 'description'} & set(update_fields):
+        return
+    search.index_ticket(instance)
+
+
+@receiver(post_delete, sender=models.Ticket)
+def unindex_ticket(sender, instance, **kwargs):
+    search.unindex_ticket(instance.pk)
+
+
+@receiver(post_save, sender=models.Ticket)
+def update_duplicate_index(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is not None and not {'subject', 'description', 'status'} & set(update_fields):
+        return
+    similarity.record(instance, created)
+
+
+@receiver(post_delete, sender=models.Ticket)
+def remove_from_duplicate_index(sender, instance, **kwargs):
+    similarity.forget(instance.pk)
+
+
+@receiver(post_save, sender=models.Task)
+def update_assignment_load(sender, instance, created=False, **kwargs):
+    previous = None if created else getattr(instance, '_previous_state', None)
+    before = (previous[2], previous[1]) if previous else None
+    assignment.task_changed(before, (instance.assigned_to_id, instance.status))
+
+
+@receiver(post_delete, sender=models.Task)
+def release_assignment_load(sender, instance, **kwargs):
+    # A stale instance may be deleted: prefer the row as locked by Task.delete()
+    counted = getattr(instance, '_counted_state', None)
+    assigned_to_id, status = (counted[2], counted[1]) if counted else (instance.assigned_to_id, instance.status)
+    assignment.task_changed((assigned_to_id, status), None)
+
+
+@receiver(post_save, sender=models.CustomUser)
+@receiver(post_delete, sender=models.CustomUser)
+def expire_token_claims(sender, instance, **kwargs):
+    authentication.mark_user_changed(instance.pk)
+
+
+@receiver(post_save, sender=models.CustomUser)
+def update_assignable_agent(sender, instance, **kwargs):
+    assignment.agent_changed(instance)
+
+
+@receiver(post_delete, sender=models.CustomUser)
+def remove_assignable_agent(sender, instance, **kwargs):
+    assignment.agent_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=models.Ticket)
+def record_ticket_change(sender, instance, update_fields=None, **kwargs):
+    changefeed.record('ticket', instance, getattr(instance, '_loaded_user_id', None), update_fields)
+    instance._loaded_user_id = instance.user_id
+
+
+@receiver(post_save, sender=models.Task)
+def record_task_change(sender, instance, created=False, update_fields=None, **kwargs):
+    previous = None if created else getattr(instance, '_previous_state', None)
+    changefeed.record('task', instance, previous[2] if previous else None, update_fields)
+
+
+@receiver(post_delete, sender=models.Ticket)
+def record_ticket_delete(sender, instance, **kwargs):
+    changefeed.record_delete('ticket', instance)
+
+
+@receiver(post_delete, sender=models.Task)
+def record_task_delete(sender, instance, **kwargs):
+    counted = getattr(instance, '_counted_state', None)
+    if counted:
+        instance.assigned_to_id = counted[2]
+    changefeed.record_delete('task', instance)
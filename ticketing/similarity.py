@@ -0,0 +1,266 @@
+import array
+import datetime
+import hashlib
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from ticketing import models
+
+DEFAULTS = {
+    'THRESHOLD': 0.35,  # estimated Jaccard similarity of the two tickets' word sets
+    'LIMIT': 5,
+    'REJECT': False,  # reject likely duplicates instead of only reporting them
+    'SYNC_INTERVAL': 2,  # seconds between polls for signatures written by other workers
+}
+
+# 20 bands of 3 rows: pairs at 0.5 similarity become candidates ~93% of the time,
+# pairs at 0.2 under 15%, so few candidates need an exact signature comparison.
+BANDS = 20
+ROWS = 3
+NUM_PERM = BANDS * ROWS
+PRIME = (1 << 61) - 1
+# Transactions can commit out of updated_at order; polls re-read this far back
+SYNC_OVERLAP = datetime.timedelta(seconds=30)
+
+# Fixed seed: every worker must hash the same text to the same signature
+_random = random.Random(1009)
+PERMUTATIONS = [(_random.randrange(1, PRIME), _random.randrange(0, PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have', 'i', 'in',
+    'is', 'it', 'its', 'me', 'my', 'no', 'not', 'of', 'on', 'or', 'our', 'so', 'that', 'the', 'this',
+    'to', 'was', 'we', 'with',
+}
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def get_setting(name):
+    return getattr(settings, 'DUPLICATE_DETECTION', {}).get(name, DEFAULTS[name])
+
+
+def shingles(subject, description):
+    words = WORD_RE.findall(f"{subject} {description}".lower())
+    # Crude plural folding so "printer"/"printers" match
+    return {word[:-1] if len(word) > 3 and word.endswith('s') else word for word in words if word not in STOPWORDS}
+
+
+def token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little')
+
+
+def signature(subject, description):
+    tokens = shingles(subject, description)
+    if not tokens:
+        return None
+    hashes = [token_hash(token) for token in tokens]
+    return tuple(min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS)
+
+
+def similarity(first, second):
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def encode(sig):
+    return array.array('Q', sig).tobytes()
+
+
+def decode(data):
+    values = array.array('Q')
+    values.frombytes(bytes(data))
+    return tuple(values)
+
+
+def band_keys(sig):
+    return [(band, sig[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class SimilarityIndex:
+    # In-process MinHash/LSH index over open tickets. Signatures are persisted in
+    # TicketSignature, one row per open ticket, so a worker loads them with one query
+    # instead of rehashing text, then picks up other workers' writes by polling
+    # updated_at. Closed tickets lose their row; see poll().
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Held while querying, never together with a lookup: one poll per process at a time
+        self.sync_lock = threading.Lock()
+        self.signatures = {}
+        self.buckets = {}
+        self.loaded_at = None
+        self.synced_at = 0
+        self.watermark = None
+
+    def add(self, ticket_id, sig):
+        with self.lock:
+            self.remove(ticket_id)
+            self.signatures[ticket_id] = sig
+            for key in band_keys(sig):
+                self.buckets.setdefault(key, set()).add(ticket_id)
+
+    def remove(self, ticket_id):
+        with self.lock:
+            sig = self.signatures.pop(ticket_id, None)
+            if sig is None:
+                return
+            for key in band_keys(sig):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(ticket_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def load(self, rows):
+        with self.lock:
+            for ticket_id, data, updated_at in rows:
+                self.add(ticket_id, decode(data))
+                if self.watermark is None or updated_at > self.watermark:
+                    self.watermark = updated_at
+
+    def sync(self):
+        if self.loaded_at is None:
+            # Nothing to answer from yet, so wait for whichever thread is loading
+            with self.sync_lock:
+                if self.loaded_at is None:
+                    self.reload()
+            return
+
+        if time.monotonic() - self.synced_at <= get_setting('SYNC_INTERVAL'):
+            return
+        if not self.sync_lock.acquire(blocking=False):
+            return  # another thread is polling; answer from the index as it is
+        try:
+            self.poll()
+        finally:
+            self.sync_lock.release()
+
+    def reload(self):
+        # Built off to the side and swapped in; writes committed meanwhile come in on the next poll
+        started = time.monotonic()
+        fresh = SimilarityIndex()
+        fresh.load(models.TicketSignature.objects.values_list('ticket_id', 'signature', 'updated_at').iterator())
+        with self.lock:
+            self.signatures, self.buckets, self.watermark = fresh.signatures, fresh.buckets, fresh.watermark
+            self.loaded_at = self.synced_at = started
+
+    def poll(self):
+        started = time.monotonic()
+        queryset = models.TicketSignature.objects.all()
+        if self.watermark:
+            queryset = queryset.filter(updated_at__gte=self.watermark - SYNC_OVERLAP)
+        rows = list(queryset.values_list('ticket_id', 'signature', 'updated_at'))
+        self.load(rows)
+        # Tickets closed or deleted by other workers leave no row to poll. Lookups drop
+        # them when matched; once this index holds more tickets than the table, rebuild it.
+        if len(self.signatures) > models.TicketSignature.objects.count():
+            self.reload()
+        self.synced_at = started
+
+    def candidates(self, sig, threshold):
+        with self.lock:
+            found = set()
+            for key in band_keys(sig):
+                found.update(self.buckets.get(key, ()))
+            scored = [(ticket_id, similarity(sig, self.signatures[ticket_id])) for ticket_id in found]
+        return sorted(
+            [(ticket_id, score) for ticket_id, score in scored if score >= threshold],
+            key=lambda item: (-item[1], -item[0]),
+        )
+
+
+index = SimilarityIndex()
+
+
+def find_duplicates(subject, description, threshold=None, limit=None):
+    # Open tickets that look like the given text, most similar first, as (ticket, score)
+    sig = signature(subject, description)
+    if sig is None:
+        return []
+
+    index.sync()
+    threshold = get_setting('THRESHOLD') if threshold is None else threshold
+    limit = limit or get_setting('LIMIT')
+    scored = index.candidates(sig, threshold)
+    if not scored:
+        return []
+
+    # Tickets closed through other paths (or other workers) may still be indexed
+    ids = [ticket_id for ticket_id, _ in scored[:limit * 2]]
+    tickets = models.Ticket.objects.filter(pk__in=ids, status__in=models.OPEN_TICKET_STATUSES).in_bulk()
+    # Deleted tickets leave no row for polls to see, so drop them here
+    for ticket_id in ids:
+        if ticket_id not in tickets:
+            index.remove(ticket_id)
+    return [(tickets[ticket_id], score) for ticket_id, score in scored if ticket_id in tickets][:limit]
+
+
+def record(ticket, created=False):
+    # Called on save: persist the signature now, update this worker's index on commit.
+    # The signature depends only on the text, so saves that keep the subject, the
+    # description and whether the ticket is open (rollups, reassignments) skip it.
+    text, is_open = (ticket.subject, ticket.description), ticket.status in models.OPEN_TICKET_STATUSES
+    loaded_text, was_open = getattr(ticket, '_loaded_text', None), getattr(ticket, '_loaded_open', None)
+    ticket._loaded_text, ticket._loaded_open = text, is_open
+
+    if not is_open:
+        if not created and was_open is not False:
+            forget(ticket.pk)
+        return
+    if not created and was_open and text == loaded_text:
+        return
+
+    sig = signature(ticket.subject, ticket.description)
+    if sig is None:
+        forget(ticket.pk)
+        return
+
+    models.TicketSignature.objects.update_or_create(ticket_id=ticket.pk, defaults={'signature': encode(sig)})
+    transaction.on_commit(lambda: index.add(ticket.pk, sig))
+
+
+def record_many(tickets):
+    # For freshly bulk-created open tickets, which have no signature row yet
+    signatures = {}
+    for ticket in tickets:
+        sig = signature(ticket.subject, ticket.description)
+        if sig is not None:
+            signatures[ticket.pk] = sig
+    models.TicketSignature.objects.bulk_create([
+        models.TicketSignature(ticket_id=ticket_id, signature=encode(sig)) for ticket_id, sig in signatures.items()
+    ])
+
+    def add_all():
+        for ticket_id, sig in signatures.items():
+            index.add(ticket_id, sig)
+    transaction.on_commit(add_all)
+
+
+def forget(ticket_id):
+    # For tickets that closed, lost their text or were deleted
+    models.TicketSignature.objects.filter(ticket_id=ticket_id).delete()
+    transaction.on_commit(lambda: index.remove(ticket_id))
+
+
+def rebuild(batch_size=1000):
+    # Recomputes signatures for every open ticket in keyset batches
+    last_id = 0
+    while True:
+        tickets = list(
+            models.Ticket.objects.filter(pk__gt=last_id, status__in=models.OPEN_TICKET_STATUSES)
+            .order_by('pk').only('pk', 'subject', 'description')[:batch_size]
+        )
+        if not tickets:
+            return
+        with transaction.atomic():
+            rows = []
+            for ticket in tickets:
+                sig = signature(ticket.subject, ticket.description)
+                if sig is not None:
+                    rows.append(models.TicketSignature(ticket_id=ticket.pk, signature=encode(sig)))
+            models.TicketSignature.objects.filter(ticket_id__in=[ticket.pk for ticket in tickets]).delete()
+            models.TicketSignature.objects.bulk_create(rows)
+        last_id = tickets[-1].pk
+        yield len(tickets), last_id
@@ -1,3 +1,1778 @@
-from django.test import TestCase
+import concurrent.futures
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from helpdesk.asgi import application
+
+from ticketing import analytics
+from ticketing import archive
+from ticketing import assignment
+from ticketing import attachments
+from ticketing import audit
+from ticketing import authentication
+from ticketing import bulk
+from ticketing import changefeed
+from ticketing import deadlines
+from ticketing import export
+from ticketing import listcache
+from ticketing import models
+from ticketing import notifications
+from ticketing import outbox
+from ticketing import search
+from ticketing import serializers
+from ticketing import similarity
+from ticketing import thumbnails
+from ticketing import throttling
+from ticketing import topics
+from ticketing import utils
+
+USER_NAMES = {
+    'super_admin': ('Ada', 'Admin'),
+    'it_personnel': ('Ian', 'Agent'),
+    'end_user': ('Eve', 'User'),
+}
+
+
+class HelpdeskTestCase(TestCase):
+    # The admin, IT agent and end user most tests act as, created once per class
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls.create_user('admin', user_type='super_admin')
+        cls.agent = cls.create_user('agent', user_type='it_personnel')
+        cls.end_user = cls.create_user('enduser')
+
+    @staticmethod
+    def create_user(username, user_type='end_user', **extra):
+        first_name, last_name = USER_NAMES[user_type]
+        extra.setdefault('first_name', first_name)
+        extra.setdefault('last_name', last_name)
+        return models.CustomUser.objects.create_user(
+            username, f'{username}@example.com', 'password123', user_type=user_type, **extra,
+        )
+
+
+class ListQueryCountTests(HelpdeskTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def create_rows(self, count):
+        # Run on-commit hooks so the list cache sees the new rows
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                ticket = models.Ticket.objects.create(
+                    user=self.end_user,
+                    subject=f'Printer issue number {models.Ticket.objects.count()}',
+                    description='The printer on the second floor is jammed.',
+                )
+                models.Task.objects.create(ticket=ticket, assigned_by=self.admin, assigned_to=self.agent)
+
+    def count_queries(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assert_constant_queries(self, user, url, expected):
+        self.create_rows(2)
+        small, response = self.count_queries(user, url)
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.create_rows(20)
+        large, response = self.count_queries(user, url)
+        self.assertEqual(len(response.data['results']), 22)
+
+        self.assertEqual(small, expected)
+        self.assertEqual(large, expected)
+        return response
+
+    def test_ticket_list_admin(self):
+        response = self.assert_constant_queries(self.admin, '/api/tickets/', 1)
+        self.assertEqual(response.data['results'][0]['user'], str(self.end_user))
+
+    def test_ticket_list_end_user(self):
+        self.assert_constant_queries(self.end_user, '/api/tickets/', 1)
+
+    def test_task_list_admin(self):
+        response = self.assert_constant_queries(self.admin, '/api/tasks/', 1)
+        row = response.data['results'][0]
+        self.assertEqual(row['assigned_to'], str(self.agent))
+        self.assertEqual(row['assigned_by'], str(self.admin))
+        self.assertIn('Printer issue', row['ticket'])
+
+    def test_task_list_it_personnel(self):
+        self.assert_constant_queries(self.agent, '/api/tasks/', 1)
+
+
+class KeysetPaginationTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tickets = [
+            models.Ticket.objects.create(
+                user=cls.end_user, subject=f'Broken monitor {i}', description='The screen flickers.',
+            )
+            for i in range(5)
+        ]
+        # Two rows share a timestamp, so the id has to break the tie
+        models.Ticket.objects.filter(pk=cls.tickets[2].pk).update(created_at=cls.tickets[1].created_at)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages_walk_forward_and_back(self):
+        expected = [ticket.id for ticket in models.Ticket.objects.order_by('-created_at', '-id')]
+        forward = self.walk('/api/tickets/?page_size=2', 'next')
+        self.assertEqual([len(page) for page in forward], [2, 2, 1])
+        self.assertEqual(sum(forward, []), expected)
+
+        last = self.client.get('/api/tickets/?page_size=2').data['next']
+        last = self.client.get(last).data['next']
+        backward = self.walk(self.client.get(last).data['previous'], 'previous')
+        self.assertEqual(backward, [forward[1], forward[0]])
+
+    def test_filters_combine_with_pages(self):
+        models.Ticket.objects.filter(pk=self.tickets[0].pk).update(status='resolved')
+        response = self.client.get('/api/tickets/?status=new,resolved&page_size=1')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get('/api/tickets/?status=resolved')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.tickets[0].id])
+
+        response = self.client.get('/api/tickets/?status=lost')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_cursor_is_not_found(self):
+        for cursor in ['garbage', 'eyJwIjpbIm5vdCBhIGRhdGUiLDFdfQ']:
+            response = self.client.get(f'/api/tickets/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+
+class HotQueryIndexTests(HelpdeskTestCase):
+    def assert_uses_index(self, queryset, index_name):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertRegex(plan, rf'USING (COVERING )?INDEX {index_name}\b')
+        else:
+            self.assertIn(index_name, plan)
+
+    def test_daily_ticket_count_uses_user_created_index(self):
+        # Ticket creation no longer counts (the rate limiter does), but a per-user day
+        # range must still be answered from the (user, created_at) index
+        start = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+        queryset = models.Ticket.objects.filter(
+            user_id=self.end_user.id, created_at__gte=start, created_at__lt=start + datetime.timedelta(days=1),
+        )
+        self.assert_uses_index(queryset.values('id'), 'ticket_user_created_idx')
+
+    def test_user_ticket_page_uses_user_created_index(self):
+        queryset = models.Ticket.objects.filter(user=self.end_user).order_by('-created_at', '-id')[:51]
+        self.assert_uses_index(queryset, 'ticket_user_created_idx')
+
+    def test_assignee_task_page_uses_assignee_created_index(self):
+        queryset = models.Task.objects.filter(assigned_to=self.agent).order_by('-created_at', '-id')[:51]
+        self.assert_uses_index(queryset, 'task_assignee_created_idx')
+
+    def test_open_subject_duplicate_is_rejected_by_constraint(self):
+        models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot reach the VPN.')
+
+        with self.assertRaisesMessage(ValidationError, 'You already have an open ticket with this subject.'):
+            models.Ticket.objects.create(user=self.end_user, subject='vpn DOWN', description='Cannot reach the VPN.')
+
+    def test_resolved_subject_can_be_reused(self):
+        models.Ticket.objects.create(
+            user=self.end_user, subject='VPN down', description='Cannot reach the VPN.', status='resolved',
+        )
+        models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot reach the VPN.')
+        self.assertEqual(models.Ticket.objects.filter(subject__iexact='vpn down').count(), 2)
+
+
+class OpenSubjectMigrationTests(TransactionTestCase):
+    before = [('ticketing', '0002_ticket_task_keyset_indexes')]
+    after = [('ticketing', '0003_hot_query_indexes')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_open_duplicates_are_merged_into_the_oldest(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('ticketing', 'CustomUser')
+        Ticket = apps.get_model('ticketing', 'Ticket')
+        Task = apps.get_model('ticketing', 'Task')
+
+        owner = User.objects.create(username='enduser', email='enduser@example.com')
+        agent = User.objects.create(username='agent', email='agent@example.com', user_type='it_personnel')
+        oldest, copy, other_copy = [
+            Ticket.objects.create(user=owner, subject=subject, description='Cannot reach the VPN.')
+            for subject in ['VPN down', 'vpn DOWN', 'VPN Down']
+        ]
+        closed = Ticket.objects.create(user=owner, subject='VPN down', description='Old one.', status='resolved')
+        unrelated = Ticket.objects.create(user=owner, subject='Printer jammed', description='Paper everywhere.')
+        task = Task.objects.create(ticket=copy, assigned_by=agent, assigned_to=agent, status='in_progress')
+
+        apps = self.migrate(self.after)
+        Ticket = apps.get_model('ticketing', 'Ticket')
+        Task = apps.get_model('ticketing', 'Task')
+        statuses = dict(Ticket.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {
+            oldest.pk: 'new', copy.pk: 'resolved', other_copy.pk: 'resolved',
+            closed.pk: 'resolved', unrelated.pk: 'new',
+        })
+        self.assertEqual(Task.objects.get(pk=task.pk).ticket_id, oldest.pk)
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False})
+class TaskCounterTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(audit.buffer.events.clear)
+        self.ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='Laptop broken', description='The screen stays black.',
+        )
+        self.tasks = [
+            models.Task.objects.create(ticket=self.ticket, assigned_by=self.admin, assigned_to=self.agent)
+            for _ in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def counters(self):
+        ticket = models.Ticket.objects.get(pk=self.ticket.pk)
+        return ticket.pending_tasks, ticket.in_progress_tasks, ticket.done_tasks
+
+    def patch_status(self, task, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/tasks/{task.pk}/', {'status': value}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return models.Ticket.objects.get(pk=self.ticket.pk).status
+
+    def test_counters_drive_the_ticket_status(self):
+        self.assertEqual(self.counters(), (2, 0, 0))
+        self.assertEqual(self.patch_status(self.tasks[0], 'in_progress'), 'in_progress')
+        self.assertEqual(self.counters(), (1, 1, 0))
+        self.assertEqual(self.patch_status(self.tasks[0], 'done'), 'in_progress')
+        self.assertEqual(self.patch_status(self.tasks[1], 'done'), 'resolved')
+        self.assertEqual(self.counters(), (0, 0, 2))
+
+        self.tasks[0].delete()
+        self.assertEqual(self.counters(), (0, 0, 1))
+
+    def test_stale_copies_count_each_transition_once(self):
+        # Two requests that loaded the task before either saved it
+        first = models.Task.objects.get(pk=self.tasks[0].pk)
+        second = models.Task.objects.get(pk=self.tasks[0].pk)
+        first.status = 'in_progress'
+        first.save()
+        second.status = 'done'
+        second.save()
+        self.assertEqual(self.counters(), (1, 0, 1))
+
+        # Deleting a stale copy uncounts the status the row actually has
+        self.tasks[0].delete()
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+    def test_saving_a_stale_ticket_keeps_the_counters(self):
+        stale = models.Ticket.objects.get(pk=self.ticket.pk)
+        self.tasks[0].status = 'in_progress'
+        self.tasks[0].save()
+        stale.description = 'The screen stays black after a restart.'
+        stale.save()
+        self.assertEqual(self.counters(), (1, 1, 0))
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+class FailingLayer:
+    async def group_send(self, group, message):
+        raise ConnectionError("channel layer unavailable")
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False, "MAX_ATTEMPTS": 3, "DEAD_RETENTION": 0})
+class NotificationOutboxTests(HelpdeskTestCase):
+    def dispatch(self, layer):
+        with mock.patch.object(outbox, 'get_channel_layer', return_value=layer):
+            return outbox.dispatch_batch()
+
+    def test_rolled_back_change_drops_its_notification(self):
+        utils.send_ws_notification(self.end_user.id, "ticket_created", {"ticket_id": 1})
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                utils.send_ws_notification(self.end_user.id, "ticket_created", {"ticket_id": 2})
+                raise RuntimeError("request failed")
+
+        rows = models.NotificationOutbox.objects.all()
+        self.assertEqual([row.payload["data"]["ticket_id"] for row in rows], [1])
+
+        layer = RecordingLayer()
+        self.assertEqual(self.dispatch(layer), 1)
+        self.assertEqual(layer.sent[0][0], topics.user_group(self.end_user.id))
+        self.assertFalse(models.NotificationOutbox.objects.exists())
+
+    def test_failed_sends_back_off_until_attempts_run_out(self):
+        utils.send_ws_notification(self.end_user.id, "ticket_created", {"ticket_id": 1})
+        row = models.NotificationOutbox.objects.get()
+
+        for attempt in range(1, 4):
+            started = timezone.now()
+            with self.assertLogs('ticketing.outbox', 'WARNING'):
+                self.assertEqual(self.dispatch(FailingLayer()), 1)
+            row.refresh_from_db()
+            self.assertEqual(row.attempts, attempt)
+            self.assertIn('channel layer unavailable', row.last_error)
+            delay = (row.available_at - started).total_seconds()
+            self.assertAlmostEqual(delay, 2 * 2 ** (attempt - 1), delta=1)
+            # Not due again before the backoff has passed
+            self.assertEqual(self.dispatch(FailingLayer()), 0)
+            models.NotificationOutbox.objects.update(available_at=timezone.now())
+
+        # Out of attempts: never picked again, and pruned once the retention has passed
+        self.assertEqual(self.dispatch(RecordingLayer()), 0)
+        self.assertEqual(outbox.prune(), 1)
+
+    def test_claimed_rows_are_not_sent_by_a_second_dispatcher(self):
+        utils.send_ws_notification(self.end_user.id, "ticket_created", {"ticket_id": 1})
+        claimed = outbox.claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(outbox.claim(10), [])
+
+        # A dispatcher that died mid-send leaves the row to be claimed again once the lease runs out
+        models.NotificationOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(self.dispatch(RecordingLayer()), 1)
+        self.assertFalse(models.NotificationOutbox.objects.exists())
+
+    def test_bursts_are_coalesced_into_one_frame_per_group(self):
+        for status in ['assigned', 'in_progress', 'resolved']:
+            utils.send_ws_notification(self.end_user.id, "ticket_status_changed", {"ticket_id": 1, "status": status})
+        utils.send_ws_notification(self.end_user.id, "ticket_created", {"ticket_id": 2})
+        utils.send_role_notification("it_personnel", "ticket_created", {"ticket_id": 2})
+
+        layer = RecordingLayer()
+        self.assertEqual(self.dispatch(layer), 5)
+        frames = dict(layer.sent)
+        self.assertEqual(len(layer.sent), 2)
+
+        # Only the latest status of ticket 1 survives, batched with the other ticket's event
+        events = frames[topics.user_group(self.end_user.id)]["events"]
+        self.assertEqual([(event["type"], event["data"]["ticket_id"]) for event in events], [
+            ("ticket_status_changed", 1), ("ticket_created", 2),
+        ])
+        self.assertEqual(events[0]["data"]["status"], 'resolved')
+        self.assertEqual(events[0]["seq"], 3)
+
+        # A lone event is sent as is
+        role_frame = frames[topics.role_group("it_personnel")]
+        self.assertEqual(role_frame["content"]["type"], "ticket_created")
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, NOTIFICATION_REPLAY={"MAX_REPLAY": 3})
+class NotificationReplayTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users = [cls.create_user(f'user{n}') for n in range(2)]
+
+    def notify(self, user, count):
+        for n in range(count):
+            utils.send_ws_notification(user.id, "ticket_created", {"ticket_id": n})
+
+    def test_sequences_are_per_user_and_gap_free(self):
+        self.notify(self.users[0], 2)
+        self.notify(self.users[1], 1)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.notify(self.users[0], 1)
+                raise RuntimeError("request failed")
+        self.notify(self.users[0], 1)
+
+        seqs = list(models.UserNotification.objects.filter(user=self.users[0]).values_list('seq', flat=True))
+        self.assertEqual(seqs, [1, 2, 3])
+        sent = models.NotificationOutbox.objects.filter(group=topics.user_group(self.users[0].id))
+        self.assertEqual([row.payload["seq"] for row in sent], [1, 2, 3])
+
+    def test_missed_notifications_are_replayed_in_order(self):
+        self.notify(self.users[0], 3)
+        missed, complete = notifications.missed_since(self.users[0].id, 1)
+        self.assertTrue(complete)
+        self.assertEqual([content["seq"] for content in missed], [2, 3])
+        self.assertEqual(notifications.missed_since(self.users[0].id, 3), ([], True))
+
+    def test_pruned_or_oversized_gaps_need_a_resync(self):
+        self.notify(self.users[0], 5)
+        # More than MAX_REPLAY missed
+        self.assertFalse(notifications.missed_since(self.users[0].id, 0)[1])
+
+        # The start of the gap has been pruned
+        models.UserNotification.objects.filter(user=self.users[0], seq=3).update(
+            created_at=timezone.now() - datetime.timedelta(days=30),
+        )
+        self.assertEqual(notifications.prune(), 1)
+        self.assertFalse(notifications.missed_since(self.users[0].id, 2)[1])
+        self.assertTrue(notifications.missed_since(self.users[0].id, 3)[1])
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False})
+class NotificationConsumerTests(HelpdeskTestCase):
+    def setUp(self):
+        self.own_ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='VPN down', description='Cannot reach the VPN.',
+        )
+        other_user = self.create_user('otheruser', first_name='Olga')
+        self.other_ticket = models.Ticket.objects.create(
+            user=other_user, subject='Printer jammed', description='Paper everywhere.',
+        )
+        self.sockets = []
+
+    def token_for(self, user):
+        return serializers.LoginSerializer().tokens(user)["access"]
+
+    async def connect(self, path='/ws/notifications/', **kwargs):
+        communicator = WebsocketCommunicator(application, path, **kwargs)
+        connected, detail = await communicator.connect()
+        if connected:
+            self.sockets.append(communicator)
+        return communicator, connected, detail
+
+    async def disconnect_all(self):
+        for communicator in self.sockets:
+            await communicator.disconnect()
+
+    async def test_token_in_query_or_subprotocol_is_accepted(self):
+        await sync_to_async(utils.send_ws_notification)(self.end_user.id, "ticket_created", {"ticket_id": 1})
+        token = await sync_to_async(self.token_for)(self.end_user)
+
+        communicator, connected, _ = await self.connect(f'/ws/notifications/?token={token}&last_seq=0')
+        self.assertTrue(connected)
+        # The missed notification is replayed
+        self.assertEqual((await communicator.receive_json_from())["seq"], 1)
+
+        communicator, connected, subprotocol = await self.connect(subprotocols=['bearer', token])
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'bearer')
+        await self.disconnect_all()
+
+    async def test_missing_or_bad_token_is_rejected(self):
+        token = await sync_to_async(self.token_for)(self.end_user)
+        for path in ['/ws/notifications/', '/ws/notifications/?token=garbage', f'/ws/notifications/?token={token[:-2]}']:
+            _, connected, code = await self.connect(path)
+            self.assertFalse(connected)
+            self.assertEqual(code, 4401)
+
+        # The legacy route may only name the token's own user
+        _, connected, code = await self.connect(f'/ws/notifications/{self.agent.id}/?token={token}')
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+    async def test_subscriptions_are_checked(self):
+        token = await sync_to_async(self.token_for)(self.end_user)
+        communicator, _, _ = await self.connect(f'/ws/notifications/?token={token}')
+        await communicator.send_json_to({"action": "subscribe", "topics": [
+            f"ticket:{self.own_ticket.id}", f"ticket:{self.other_ticket.id}", "role:it_personnel", "role:end_user",
+        ]})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["data"], {
+            "topics": [f"ticket:{self.own_ticket.id}", "role:end_user"],
+            "denied": [f"ticket:{self.other_ticket.id}", "role:it_personnel"],
+        })
+
+        group = topics.ticket_group(self.own_ticket.id)
+        event = {"type": "notify", "group": group, "content": {"type": "ticket_status_changed"}}
+        await get_channel_layer().group_send(group, event)
+        self.assertEqual((await communicator.receive_json_from())["type"], "ticket_status_changed")
+        await self.disconnect_all()
+
+    async def test_permissions_are_rechecked_on_delivery(self):
+        token = await sync_to_async(self.token_for)(self.end_user)
+        communicator, _, _ = await self.connect(f'/ws/notifications/?token={token}')
+        await communicator.send_json_to({"action": "subscribe", "topics": [f"ticket:{self.own_ticket.id}", "role:end_user"]})
+        await communicator.receive_json_from()
+
+        # The ticket moves to another user and the user is promoted after subscribing
+        await sync_to_async(models.Ticket.objects.filter(pk=self.own_ticket.pk).update)(user=self.other_ticket.user_id)
+        await sync_to_async(models.CustomUser.objects.filter(pk=self.end_user.pk).update)(user_type='it_personnel')
+
+        layer = get_channel_layer()
+        with mock.patch.object(topics, 'RECHECK_INTERVAL', 0):
+            for group, topic in [(topics.ticket_group(self.own_ticket.id), f"ticket:{self.own_ticket.id}"),
+                                 (topics.role_group('end_user'), "role:end_user")]:
+                await layer.group_send(group, {"type": "notify", "group": group, "content": {"type": "secret"}})
+                response = await communicator.receive_json_from()
+                self.assertEqual(response, {"type": "unsubscribed", "data": {"topics": [topic], "revoked": True}})
+            self.assertTrue(await communicator.receive_nothing())
+
+            # A deactivated account loses the socket on its next notification
+            await sync_to_async(models.CustomUser.objects.filter(pk=self.end_user.pk).update)(is_active=False)
+            group = topics.user_group(self.end_user.id)
+            await layer.group_send(group, {"type": "notify", "group": group, "content": {"type": "secret"}})
+            self.assertEqual(await communicator.receive_output(), {"type": "websocket.close", "code": 4401})
+
+
+class ClaimsAuthenticationTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()  # as if the account had been created long before the login
+        self.tokens = serializers.LoginSerializer().tokens(self.end_user)
+
+    def authenticate(self, token=None):
+        request = APIRequestFactory().get('/api/tickets/', HTTP_AUTHORIZATION=f"Bearer {token or self.tokens['access']}")
+        user, _ = authentication.ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def test_claims_are_read_without_a_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual((user.id, user.user_type, user.is_staff), (self.end_user.id, 'end_user', False))
+
+    def test_role_claims_stay_out_of_refresh_tokens(self):
+        refresh = RefreshToken(self.tokens['refresh'])
+        access = AccessToken(self.tokens['access'])
+        for claim in authentication.USER_CLAIMS:
+            self.assertNotIn(claim, refresh.payload)
+            self.assertIn(claim, access.payload)
+
+    def test_role_change_applies_to_issued_tokens(self):
+        self.end_user.user_type = 'it_personnel'
+        self.end_user.save()
+        self.assertEqual(self.authenticate().user_type, 'it_personnel')
+
+    def test_only_claims_are_exposed(self):
+        user = self.authenticate()
+        with self.assertNumQueries(0), self.assertRaises(AttributeError):
+            user.email
+
+        self.end_user.save()
+        user = self.authenticate()
+        self.assertEqual(user.username, 'enduser')
+        self.assertEqual(
+            cache.get(authentication.user_cache_key(self.end_user.id)),
+            {'is_active': True, 'username': 'enduser', 'user_type': 'end_user', 'is_staff': False, 'is_superuser': False},
+        )
+        with self.assertRaises(AttributeError):
+            user.password
+
+    def test_deactivated_user_is_rejected(self):
+        self.end_user.is_active = False
+        self.end_user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        self.assertEqual(client.get('/api/tickets/').status_code, 401)
+        response = client.post('/api/auth/', {'action': 'login', 'username': 'enduser', 'password': 'password123'})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False},
+    RATE_LIMITS={"tickets.create": {"default": "3/day"}, "auth.login": "2/min"},
+)
+class RateLimitTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+
+    def create_ticket(self, subject, user=None):
+        self.client.force_authenticate(user or self.agent)
+        data = {'user_id': self.end_user.id, 'subject': subject, 'description': 'The screen stays black.'}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/tickets/', data, format='json')
+
+    def test_only_created_tickets_count_against_the_limit(self):
+        self.assertEqual(self.create_ticket('').status_code, 400)
+        self.assertEqual(self.create_ticket('Laptop broken', user=self.end_user).status_code, 403)
+        # The requester owns the ticket, and agents cannot own one
+        for n in range(3):
+            self.assertEqual(self.create_ticket(f'Laptop {n} broken').status_code, 400)
+
+        # None of those counted: the budget is still whole
+        limiter = throttling.SlidingWindowLimiter()
+        for _ in range(3):
+            self.assertTrue(limiter.hit(f"tickets.create:user:{self.agent.id}", 3, 24 * 60 * 60)[0])
+        response = self.create_ticket('Laptop 3 broken')
+        self.assertEqual(response.status_code, 429)
+        retry_after = int(response['Retry-After'])
+        self.assertTrue(0 < retry_after <= 2 * 24 * 60 * 60)
+
+    def test_failed_logins_still_count(self):
+        for _ in range(2):
+            response = self.client.post('/api/auth/', {'action': 'login', 'username': 'nobody', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/auth/', {'action': 'login', 'username': 'nobody', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_sliding_window_weights_the_previous_window(self):
+        limiter = throttling.SlidingWindowLimiter()
+        hits = [limiter.hit('test', 10, 100, now=50) for _ in range(11)]
+        self.assertEqual([allowed for allowed, _ in hits], [True] * 10 + [False])
+        # The full current window must become the previous one and decay to 9
+        self.assertEqual(hits[-1][1], 60)
+
+        # Half way through the next window the previous ten weigh five
+        hits = [limiter.hit('test', 10, 100, now=150) for _ in range(6)]
+        self.assertEqual([allowed for allowed, _ in hits], [True] * 5 + [False])
+        self.assertEqual(hits[-1][1], 10)
+        self.assertTrue(limiter.hit('test', 10, 100, now=160)[0])
+
+        # A released hit makes room again
+        self.assertFalse(limiter.hit('test', 10, 100, now=160)[0])
+        limiter.release('test', 100, 160)
+        self.assertTrue(limiter.hit('test', 10, 100, now=160)[0])
+
+
+class ConditionalGetTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='Printer jam', description='Paper stuck in tray 2.',
+        )
+        self.task = models.Task.objects.create(ticket=self.ticket, assigned_by=self.admin, assigned_to=self.agent)
+        self.client = APIClient()
+        self.client.force_authenticate(self.end_user)
+
+    def test_ticket_detail_answers_304_on_etag_and_date(self):
+        url = f'/api/tickets/{self.ticket.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Authorization', response['Vary'])
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        models.Ticket.objects.filter(pk=self.ticket.pk).update(updated_at=timezone.now() + datetime.timedelta(hours=1))
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+    def test_ticket_detail_changes_with_the_rendered_user(self):
+        url = f'/api/tickets/{self.ticket.pk}/'
+        etag = self.client.get(url)['ETag']
+        models.CustomUser.objects.filter(pk=self.end_user.pk).update(updated_at=timezone.now() + datetime.timedelta(hours=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_answers_304_until_a_row_changes(self):
+        etag = self.client.get('/api/tickets/')['ETag']
+        self.assertEqual(self.client.get('/api/tickets/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        models.Ticket.objects.create(user=self.end_user, subject='Scanner offline', description='No power.')
+        self.assertEqual(self.client.get('/api/tickets/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_task_detail_answers_304(self):
+        self.client.force_authenticate(self.agent)
+        url = f'/api/tasks/{self.task.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # The task renders its ticket, so a ticket update changes the task's validators
+        models.Ticket.objects.filter(pk=self.ticket.pk).update(updated_at=timezone.now() + datetime.timedelta(hours=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ListCacheTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket = models.Ticket.objects.create(
+                user=self.end_user, subject='VPN down', description='Cannot reach the VPN.',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_repeated_admin_list_is_served_from_cache(self):
+        first = self.client.get('/api/tickets/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/tickets/')
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(listcache.stats()['hits'], 1)
+
+    def test_ticket_save_invalidates_cached_lists(self):
+        self.client.get('/api/tickets/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.subject = 'VPN still down'
+            self.ticket.save()
+
+        response = self.client.get('/api/tickets/')
+        self.assertEqual(response.data['results'][0]['subject'], 'VPN still down')
+
+    def test_user_save_invalidates_cached_lists(self):
+        self.client.get('/api/tickets/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.end_user.first_name = 'Evelyn'
+            self.end_user.save()
+
+        response = self.client.get('/api/tickets/')
+        self.assertIn('Evelyn', response.data['results'][0]['user'])
+
+
+class ExportTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tickets = [
+            models.Ticket.objects.create(
+                user=cls.end_user, subject=f'Desk phone {i}', description='No dial tone, "again", since Monday.',
+            )
+            for i in range(3)
+        ]
+        models.Ticket.objects.filter(pk=cls.tickets[0].pk).update(
+            created_at=timezone.make_aware(datetime.datetime(2024, 1, 15)),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/export/tickets/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header('Content-Length'))
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_streams_one_object_per_row(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tickets.ndjson"')
+
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [ticket.pk for ticket in self.tickets])
+        self.assertEqual(rows[0]['user_username'], 'enduser')
+        self.assertEqual(rows[0]['description'], 'No dial tone, "again", since Monday.')
+
+    def test_csv_has_a_header_and_quotes_fields(self):
+        response, body = self.export('?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0][:3], ['id', 'user_id', 'user_username'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][4], 'No dial tone, "again", since Monday.')
+
+    def test_gzip_wraps_the_same_rows(self):
+        _, plain = self.export('?output=csv')
+        response, body = self.export('?output=csv&gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tickets.csv.gz"')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_large_exports_are_sent_in_several_chunks(self):
+        with mock.patch.object(export, 'FLUSH_BYTES', 100):
+            response = self.client.get('/api/export/tickets/')
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+
+    def test_date_range_filters_rows(self):
+        _, body = self.export('?created_after=2025-01-01')
+        self.assertEqual(len(body.decode().splitlines()), 2)
+        _, body = self.export('?created_before=2025-01-01')
+        self.assertEqual(json.loads(body)['id'], self.tickets[0].pk)
+
+    def test_archived_tickets_follow_the_hot_rows(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='Old laptop', description='Battery dead.')
+        resolved_at = timezone.now() - datetime.timedelta(days=120)
+        models.Ticket.objects.filter(pk=ticket.pk).update(status='resolved', updated_at=resolved_at)
+        list(archive.archive(archive.cutoff(90)))
+
+        _, body = self.export()
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([(row['id'], row['archived']) for row in rows], [
+            *[(hot.pk, False) for hot in self.tickets], (ticket.pk, True),
+        ])
+        self.assertEqual(
+            (rows[-1]['user_username'], rows[-1]['description'], rows[-1]['status']), ('enduser', 'Battery dead.', 'resolved'),
+        )
+        self.assertEqual(rows[-1]['updated_at'], str(resolved_at))
+
+        _, body = self.export('?created_before=2025-01-01')
+        self.assertEqual(json.loads(body)['id'], self.tickets[0].pk)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/export/tickets/?created_after=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/tickets/?output=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/passwords/').status_code, 404)
+
+        self.client.force_authenticate(self.end_user)
+        self.assertEqual(self.client.get('/api/export/tickets/').status_code, 403)
+
+
+class TicketSearchTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.printer = models.Ticket.objects.create(
+            user=cls.end_user, subject='Printer jammed', description='The office printer eats paper.',
+        )
+        cls.vpn = models.Ticket.objects.create(
+            user=cls.end_user, subject='VPN down', description='Cannot print from home over the VPN.',
+        )
+
+    def search(self, params):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/tickets/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_subject_match_ranks_first(self):
+        self.assertEqual(self.search({'q': 'print*'}), [self.printer.id, self.vpn.id])
+
+    def test_search_combines_with_status_filter(self):
+        models.Ticket.objects.filter(pk=self.printer.pk).update(status='resolved')
+        self.assertEqual(self.search({'q': 'print*', 'status': 'new'}), [self.vpn.id])
+
+    def test_index_follows_save_and_delete(self):
+        self.vpn.subject = 'Wifi down'
+        self.vpn.save()
+        self.assertEqual(self.search({'q': 'wifi'}), [self.vpn.id])
+
+        self.vpn.delete()
+        self.assertEqual(self.search({'q': 'wifi'}), [])
+
+    def test_rebuild_backfills_in_batches(self):
+        search.clear()
+        batches = list(search.rebuild(batch_size=1))
+        self.assertEqual([count for count, _ in batches], [1, 1])
+        self.assertEqual(self.search({'q': 'jammed'}), [self.printer.id])
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False})
+class DuplicateDetectionTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        similarity.index = similarity.SimilarityIndex()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket = models.Ticket.objects.create(
+                user=self.end_user, subject='VPN down', description='Cannot reach the VPN from home.',
+            )
+
+    def create(self, subject, description, url='/api/tickets/'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                url, {'user_id': self.end_user.id, 'subject': subject, 'description': description}, format='json',
+            )
+
+    def test_similar_ticket_is_reported(self):
+        duplicates = similarity.find_duplicates('VPN is down again', 'The VPN does not connect from home.')
+        self.assertEqual([ticket.id for ticket, _ in duplicates], [self.ticket.id])
+        self.assertEqual(similarity.find_duplicates('Printer jammed', 'The office printer eats paper.'), [])
+
+    def test_duplicate_can_be_rejected(self):
+        response = self.create(
+            'VPN is down again', 'The VPN does not connect from home.', url='/api/tickets/?reject_duplicates=1',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(models.Ticket.objects.filter(subject='VPN is down again').exists())
+
+    def test_closed_ticket_leaves_index(self):
+        self.ticket.status = 'resolved'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.save()
+
+        self.assertFalse(models.TicketSignature.objects.exists())
+        self.assertEqual(similarity.find_duplicates('VPN is down again', 'The VPN does not connect from home.'), [])
+
+    def test_other_workers_drop_closed_tickets_on_their_next_poll(self):
+        other = similarity.SimilarityIndex()
+        other.sync()
+        self.assertIn(self.ticket.pk, other.signatures)
+
+        # Resolved through its last task, which saves the ticket with update()
+        task = models.Task.objects.create(ticket=self.ticket, assigned_by=self.admin, assigned_to=self.agent)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tasks/{task.pk}/', {'status': 'done'}, format='json')
+        self.assertEqual(models.Ticket.objects.get(pk=self.ticket.pk).status, 'resolved')
+
+        other.synced_at = 0
+        other.sync()
+        self.assertNotIn(self.ticket.pk, other.signatures)
+        self.assertNotIn(self.ticket.pk, similarity.index.signatures)
+
+    def test_saves_that_keep_the_text_skip_the_signature(self):
+        stamp = timezone.now() - datetime.timedelta(days=1)
+        models.TicketSignature.objects.update(updated_at=stamp)
+        ticket = models.Ticket.objects.get(pk=self.ticket.pk)
+        ticket.status = 'assigned'
+        ticket.save()
+        self.assertEqual(models.TicketSignature.objects.get().updated_at, stamp)
+
+        ticket.description = 'Cannot reach the VPN from the office either.'
+        ticket.save()
+        self.assertGreater(models.TicketSignature.objects.get().updated_at, stamp)
+
+    def test_lookups_do_not_wait_for_a_running_poll(self):
+        similarity.index.sync()
+        similarity.index.synced_at = 0
+        with similarity.index.sync_lock, self.assertNumQueries(0):
+            similarity.index.sync()
+            found = similarity.index.candidates(similarity.signature('VPN down', 'Cannot reach the VPN from home.'), 0.9)
+        self.assertEqual([ticket_id for ticket_id, _ in found], [self.ticket.pk])
+
+    def test_deleted_tickets_are_dropped_when_matched(self):
+        other = similarity.SimilarityIndex()
+        other.sync()
+        models.Ticket.objects.filter(pk=self.ticket.pk).delete()
+        with mock.patch.object(similarity, 'index', other):
+            self.assertEqual(similarity.find_duplicates('VPN is down again', 'The VPN does not connect from home.'), [])
+        self.assertNotIn(self.ticket.pk, other.signatures)
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False})
+class BulkOperationTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.agents = [cls.create_user(f'agent{n}', user_type='it_personnel') for n in range(2)]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, url, items, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'items': items, **extra}, format='json')
+
+    def user_messages(self, user):
+        return models.NotificationOutbox.objects.filter(group=topics.user_group(user.id))
+
+    def test_bulk_ticket_create_reports_each_item(self):
+        models.Ticket.objects.create(user=self.end_user, subject='Printer jammed', description='Paper stuck in tray two.')
+        models.NotificationSequence.objects.create(user=self.end_user)  # both runs update it
+
+        # Set-based: nothing runs per item. SQLite caps a statement at 999 parameters, so
+        # 198 tickets and their change rows take two INSERTs each
+        for size, queries in [(5, 21), (200, 23)]:
+            audit.buffer.events.clear()
+            items = [
+                {'user_id': self.end_user.id, 'subject': f'Laptop {size}-{n} broken', 'description': 'The screen stays black.'}
+                for n in range(size - 2)
+            ]
+            items.append({'user_id': self.end_user.id, 'subject': 'printer jammed', 'description': 'Paper stuck again.'})
+            items.append({'user_id': self.agents[0].id, 'subject': 'Bad', 'description': 'short'})
+            with self.assertNumQueries(queries):
+                response = self.post('/api/tickets/bulk/', items)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual((response.data['succeeded'], response.data['failed']), (size - 2, 2))
+            self.assertEqual(response.data['results'][-2]['errors'], {'subject': [models.DUPLICATE_SUBJECT_MESSAGE]})
+            self.assertEqual(set(response.data['results'][-1]['errors']), {'user_id', 'subject', 'description'})
+        self.assertEqual(models.Ticket.objects.filter(subject__startswith='Laptop 5-').count(), 3)
+
+        # One coalesced message for the owner per request, searchable and duplicate-indexed like single creates
+        messages = self.user_messages(self.end_user).order_by('pk')
+        self.assertEqual([len(message.payload['data']['tickets']) for message in messages], [3, 198])
+        self.assertEqual(search.search(models.Ticket.objects.all(), 'laptop').count(), 201)
+        self.assertEqual(models.TicketSignature.objects.filter(ticket__subject__startswith='Laptop').count(), 201)
+
+    def test_row_by_row_fallback_only_reports_duplicates(self):
+        items = [
+            {'user_id': self.end_user.id, 'subject': f'Laptop {n} broken', 'description': 'The screen stays black.'}
+            for n in range(2)
+        ]
+        # bulk_create failing sends the batch through Ticket.save() one row at a time
+        with mock.patch.object(models.Ticket.objects, 'bulk_create', side_effect=IntegrityError('ticket_open_subject_uniq')):
+            with self.captureOnCommitCallbacks(execute=True):
+                result = bulk.create_tickets(items, self.admin.id)
+            self.assertEqual(result.as_data()['succeeded'], 2)
+
+            items = [{'user_id': self.end_user.id, 'subject': 'Monitor flickers', 'description': 'Every few seconds.'}]
+            with mock.patch.object(models.Ticket, 'save', side_effect=OperationalError('database is locked')):
+                with self.assertRaises(OperationalError):
+                    bulk.create_tickets(items, self.admin.id)
+        self.assertFalse(models.Ticket.objects.filter(subject='Monitor flickers').exists())
+
+    def test_reassignment_checks_against_the_task_assigner(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='Laptop broken', description='The screen stays black.')
+        task = models.Task.objects.create(ticket=ticket, assigned_by=self.agents[0], assigned_to=self.agents[1])
+
+        response = self.post('/api/tasks/bulk/assign/', [{'task_id': task.id, 'assigned_to_id': self.agents[0].id}])
+        self.assertEqual(response.data['results'][0]['errors'], {'assigned_to_id': ["You cannot assign a task to yourself."]})
+        self.assertEqual(models.Task.objects.get(pk=task.pk).assigned_to_id, self.agents[1].id)
+
+    def test_all_or_nothing_writes_nothing_on_error(self):
+        items = [
+            {'user_id': self.end_user.id, 'subject': 'Laptop broken', 'description': 'The screen stays black.'},
+            {'user_id': self.end_user.id, 'subject': 'Laptop broken', 'description': 'The screen stays black.'},
+        ]
+        response = self.post('/api/tickets/bulk/', items, all_or_nothing=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Ticket.objects.exists())
+
+    def test_bulk_assign_and_status_keep_counters(self):
+        tickets = [
+            models.Ticket.objects.create(user=self.end_user, subject=f'Laptop {n} broken', description='The screen stays black.')
+            for n in range(3)
+        ]
+        items = [{'ticket_id': ticket.id, 'assigned_to_id': self.agents[0].id} for ticket in tickets]
+        items.append({'ticket_id': 0, 'assigned_to_id': self.end_user.id})
+        response = self.post('/api/tasks/bulk/assign/', items)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (3, 1))
+        task_ids = [row['id'] for row in response.data['results'][:3]]
+        self.assertEqual(self.user_messages(self.agents[0]).count(), 1)
+        self.assertEqual(models.Ticket.objects.get(pk=tickets[0].pk).status, 'assigned')
+
+        response = self.post('/api/tasks/bulk/assign/', [{'task_id': pk, 'assigned_to_id': self.agents[1].id} for pk in task_ids])
+        self.assertEqual(response.data['succeeded'], 3)
+        self.assertEqual(self.user_messages(self.agents[1]).count(), 1)
+        self.assertEqual(self.user_messages(self.agents[0]).count(), 2)  # one assigned, one unassigned
+
+        response = self.post('/api/tasks/bulk/status/', [{'task_id': pk, 'status': 'done'} for pk in task_ids])
+        self.assertEqual(response.data['succeeded'], 3)
+        for ticket in models.Ticket.objects.filter(pk__in=[ticket.pk for ticket in tickets]):
+            self.assertEqual((ticket.pending_tasks, ticket.done_tasks, ticket.status), (0, 1, 'resolved'))
+        # Both bulk requests moved all three tickets: one message each for their owner
+        messages = self.user_messages(self.end_user).filter(payload__type='tickets_status_changed').order_by('pk')
+        self.assertEqual(
+            [[row['status'] for row in message.payload['data']['tickets']] for message in messages],
+            [['assigned'] * 3, ['resolved'] * 3],
+        )
+
+        response = self.post('/api/tasks/bulk/assign/', [{'task_id': task_ids[0], 'assigned_to_id': self.agents[0].id}])
+        self.assertEqual(response.data['results'][0]['errors']['task_id'], ["You cannot reassign a task that is already marked as done."])
+
+    def test_end_users_cannot_bulk_update(self):
+        self.client.force_authenticate(self.end_user)
+        response = self.post('/api/tasks/bulk/status/', [{'task_id': 1, 'status': 'done'}])
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False},
+    AUTO_ASSIGNMENT={"ENABLED": True, "RELOAD_INTERVAL": 0},
+)
+class AutoAssignmentTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.agents = [
+            cls.create_user(f'agent{n}', user_type='it_personnel', branch=branch, department='IT')
+            for n, branch in enumerate(['North', 'North', 'South'])
+        ]
+        cls.end_user.branch, cls.end_user.department = 'north', 'Finance'
+        cls.end_user.save(update_fields=['branch', 'department'])
+
+    def setUp(self):
+        cache.clear()
+        assignment.index = assignment.LoadIndex()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_index_picks_least_loaded_in_narrowest_pool(self):
+        index = assignment.LoadIndex()
+        index.load([(1, ('hq', 'it')), (2, ('hq', 'it')), (3, ('hq', '')), (4, ('branch', 'it'))], {1: 2, 2: 1, 3: 0})
+        self.assertEqual(index.pick(('hq', 'it')), 2)
+        index.adjust(2, 2)
+        self.assertEqual(index.pick(('hq', 'it')), 1)
+        self.assertEqual(index.pick(('hq', 'it'), exclude={1, 2}), 3)  # falls back to the branch
+        self.assertEqual(index.pick(('elsewhere', 'it')), 3)  # and to everyone
+        self.assertEqual(index.pick(('branch', 'it'), reserve=True), 4)
+        self.assertEqual(index.load_of(4), 1)
+
+    def test_loads_are_scanned_once_and_reloads_keep_reservations(self):
+        assignment.sync()
+        with self.assertNumQueries(0):
+            assignment.choose(self.end_user)
+
+        with assignment.reservations() as reserved:
+            agent_id = assignment.choose(self.end_user, reserve=reserved)
+            assignment.reload()
+            self.assertEqual(assignment.index.load_of(agent_id), 1)
+        self.assertEqual(assignment.index.load_of(agent_id), 0)
+
+    def test_new_tickets_spread_over_matching_agents(self):
+        for subject in ['Laptop broken', 'Printer jammed']:
+            ticket = models.Ticket.objects.create(user=self.end_user, subject=subject, description='Something is broken.')
+            with self.captureOnCommitCallbacks(execute=True):
+                _, ticket = assignment.auto_assign(ticket, assigned_by_id=self.admin.id)
+            self.assertEqual(ticket.status, 'assigned')
+        assignees = set(models.Task.objects.values_list('assigned_to_id', flat=True))
+        self.assertEqual(assignees, {self.agents[0].id, self.agents[1].id})
+
+        models.Task.objects.filter(assigned_to=self.agents[0]).get().delete()
+        self.assertEqual(assignment.index.load_of(self.agents[0].id), 1)  # released on commit only
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Task.objects.filter(assigned_to=self.agents[1]).get().delete()
+        self.assertEqual(assignment.index.load_of(self.agents[1].id), 0)
+
+    def test_bulk_created_tickets_are_balanced(self):
+        items = [
+            {'user_id': self.end_user.id, 'subject': f'Laptop {n} broken', 'description': 'The screen stays black.'}
+            for n in range(4)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tickets/bulk/', {'items': items}, format='json')
+        self.assertEqual(response.data['succeeded'], 4)
+        loads = [models.Task.objects.filter(assigned_to=agent).count() for agent in self.agents]
+        self.assertEqual(loads, [2, 2, 0])
+        self.assertEqual([assignment.index.load_of(agent.id) for agent in self.agents], loads)
+        self.assertEqual(set(models.Ticket.objects.values_list('status', flat=True)), {'assigned'})
+
+    def test_reservations_are_released_when_a_batch_fails(self):
+        tickets = [
+            models.Ticket.objects.create(user=self.end_user, subject=f'Laptop {n} broken', description='Black screen.')
+            for n in range(2)
+        ]
+        items = [{'ticket_id': ticket.id} for ticket in tickets]
+
+        def loads():
+            return [assignment.index.load_of(agent.id) for agent in self.agents]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/tasks/bulk/assign/', {'items': items + [{'ticket_id': 0}], 'all_or_nothing': True}, format='json',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(loads(), [0, 0, 0])
+
+        with mock.patch.object(changefeed, 'record_many', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                bulk.assign_tasks(items, self.admin)
+        self.assertEqual(loads(), [0, 0, 0])
+
+        # Tasks that are saved count once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.assign_tasks(items, self.admin)
+        self.assertEqual(loads(), [1, 1, 0])
+
+    def test_reassigned_task_moves_its_load(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        assignment.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            task = models.Task.objects.create(ticket=ticket, assigned_by=self.admin, assigned_to=self.agents[0])
+        for field, value in [('status', 'in_progress'), ('assigned_to', self.agents[1]), ('status', 'done')]:
+            setattr(task, field, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                task.save()
+        self.assertEqual([assignment.index.load_of(agent.id) for agent in self.agents[:2]], [0, 0])
+
+    @override_settings(AUTO_ASSIGNMENT={"ENABLED": False})
+    def test_assignee_is_required_when_auto_assignment_is_off(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        self.client.force_authenticate(self.agents[0])
+        response = self.client.post('/api/tasks/', {'ticket_id': ticket.id, 'assigned_by_id': self.agents[0].id}, format='json')
+        self.assertEqual((response.status_code, response.data), (400, {"assigned_to_id": ["This field is required."]}))
+
+        response = self.client.post('/api/tasks/bulk/assign/', {'items': [{'ticket_id': ticket.id}]}, format='json')
+        self.assertEqual(response.data['results'][0]['errors'], {'assigned_to_id': ["Only IT Personnel can be assigned tasks."]})
+        self.assertFalse(models.Task.objects.exists())
+
+    def test_task_without_assignee_is_auto_assigned(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        self.client.force_authenticate(self.agents[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/tasks/', {'ticket_id': ticket.id, 'assigned_by_id': self.agents[0].id}, format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.Task.objects.get().assigned_to_id, self.agents[1].id)
+
+
+@override_settings(NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False})
+class DeadlineSchedulerTests(HelpdeskTestCase):
+    def setUp(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        self.today = timezone.localdate()
+        self.tasks = [
+            models.Task.objects.create(
+                ticket=ticket, assigned_by=self.admin, assigned_to=self.agent, deadline=self.today + datetime.timedelta(days=days),
+            )
+            for days in [0, 0, 30]
+        ]
+        self.tomorrow = deadlines.due_at(self.today)
+
+    def overdue_messages(self, user):
+        return models.NotificationOutbox.objects.filter(group=topics.user_group(user.id), payload__type='tasks_overdue')
+
+    def test_passed_deadlines_are_notified_once(self):
+        scheduler = deadlines.DeadlineScheduler()
+        scheduler.sync()
+        self.assertEqual(set(scheduler.deadlines), {self.tasks[0].pk, self.tasks[1].pk})  # beyond the horizon: not loaded
+        self.assertEqual(scheduler.fire(), 0)
+
+        self.tasks[1].status = 'done'
+        self.tasks[1].save()
+        scheduler.sync()
+        self.assertEqual(scheduler.fire(now=self.tomorrow), 1)
+        self.assertEqual(scheduler.fire(now=self.tomorrow), 0)
+
+        message = self.overdue_messages(self.agent).get()
+        self.assertEqual([row['task_id'] for row in message.payload['data']['tasks']], [self.tasks[0].pk])
+        self.assertEqual(self.overdue_messages(self.admin).count(), 1)
+        self.assertTrue(models.Task.objects.get(pk=self.tasks[0].pk).overdue_notified)
+
+    def test_overdue_task_can_still_be_updated(self):
+        models.Task.objects.filter(pk=self.tasks[0].pk).update(deadline=self.today - datetime.timedelta(days=1))
+        task = models.Task.objects.get(pk=self.tasks[0].pk)
+        task.status = 'in_progress'
+        task.save()
+
+        task.deadline = self.today - datetime.timedelta(days=2)
+        with self.assertRaises(ValidationError):
+            task.save()
+
+    def test_moved_deadline_resets_the_notice(self):
+        models.Task.objects.filter(pk=self.tasks[0].pk).update(overdue_notified=True)
+        task = models.Task.objects.get(pk=self.tasks[0].pk)
+        task.deadline = self.today + datetime.timedelta(days=5)
+        with CaptureQueriesContext(connection) as queries:
+            task.save(update_fields=['deadline'])
+        # Only the locking read: clean() compares against it instead of reading the row again
+        reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and '"ticketing_task"' in query['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertFalse(models.Task.objects.get(pk=task.pk).overdue_notified)
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX={"DISPATCH_IN_PROCESS": False}, AUDIT_LOG={"FLUSH_IN_PROCESS": False},
+)
+class ChangeFeedTests(HelpdeskTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.agents = [cls.create_user(f'agent{n}', user_type='it_personnel') for n in range(2)]
+        cls.other_user = cls.create_user('otheruser')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+
+    def changes(self, user, since):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return [(row['resource'], row['id'], row['action']) for row in response.data['changes']], response.data
+
+    def test_feed_is_compacted_and_scoped(self):
+        self.client.force_authenticate(self.end_user)
+        cursor = self.client.get('/api/changes/').data['cursor']
+
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        for subject in ['VPN still down', 'VPN down for everyone']:
+            response = self.client.patch(f'/api/tickets/{ticket.pk}/', {'subject': subject}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+        changes, data = self.changes(self.end_user, cursor)
+        self.assertEqual(changes, [('ticket', ticket.pk, 'upsert')])
+        self.assertEqual(data['changes'][0]['data']['subject'], 'VPN down for everyone')
+        self.assertNotIn('pending_tasks', data['changes'][0]['data'])
+        self.assertEqual(self.changes(self.other_user, cursor)[0], [])
+
+        # Nothing new after the returned cursor
+        self.assertEqual(self.changes(self.end_user, data['cursor'])[0], [])
+
+    def test_reassignment_and_deletes_are_sent(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        task = models.Task.objects.create(ticket=ticket, assigned_by=self.admin, assigned_to=self.agents[0])
+        cursor = changefeed.latest_seq()
+
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/tasks/{task.pk}/', {'assigned_to_id': self.agents[1].id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.changes(self.agents[0], cursor)[0], [('task', task.pk, 'delete')])
+        self.assertEqual(self.changes(self.agents[1], cursor)[0], [('task', task.pk, 'upsert')])
+
+        task_id = task.pk
+        task.delete()  # a stale copy: still names the first agent
+        self.assertEqual(self.changes(self.agents[1], cursor)[0], [('task', task_id, 'delete')])
+
+        other = models.Ticket.objects.create(user=self.end_user, subject='Printer jammed', description='Paper stuck.')
+        self.client.force_authenticate(self.end_user)
+        self.assertEqual(self.client.delete(f'/api/tickets/{other.pk}/').status_code, 204)
+        changes, _ = self.changes(self.end_user, cursor)
+        self.assertEqual(changes, [('ticket', ticket.pk, 'upsert'), ('ticket', other.pk, 'delete')])
+
+    def test_late_commit_is_not_skipped(self):
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        # An id taken by a transaction that has not committed yet
+        pending = changefeed.entry('ticket', ticket)
+        pending.save()
+        late_id = pending.pk
+        pending.delete()
+
+        models.Ticket.objects.create(user=self.end_user, subject='Printer jammed', description='Paper stuck.')
+        _, data = self.changes(self.end_user, 0)
+        self.assertEqual(self.changes(self.end_user, data['cursor'])[0], [])
+
+        # It commits after the reader has moved past every higher id
+        pending.pk = late_id
+        pending.save(force_insert=True)
+        changes, data = self.changes(self.end_user, data['cursor'])
+        self.assertEqual(changes, [('ticket', ticket.pk, 'upsert')])
+        self.assertEqual(self.changes(self.end_user, data['cursor'])[0], [])
+
+    def test_pruned_cursor_requires_resync(self):
+        models.Ticket.objects.create(user=self.end_user, subject='VPN down', description='Cannot connect.')
+        models.Ticket.objects.create(user=self.end_user, subject='Printer jammed', description='Paper stuck.')
+        first = models.ChangeLog.objects.order_by('pk').first()
+        models.ChangeLog.objects.filter(pk=first.pk).update(created_at=timezone.now() - datetime.timedelta(days=60))
+        self.assertEqual(changefeed.prune(), 1)
+
+        self.client.force_authenticate(self.end_user)
+        self.assertEqual(self.client.get('/api/changes/', {'since': 0}).status_code, 410)
+        response = self.client.get('/api/changes/', {'since': models.ChangeLog.objects.get().seq - 1})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ANALYTICS={"BATCH_SIZE": 2})
+class AnalyticsTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.start = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+        # Opened on days 0, 0, 1 and 2; resolved after 2, 10 and 24 hours, the last one still open
+        for n, (day, hours) in enumerate([(0, 2), (0, 10), (1, 24), (2, None)]):
+            ticket = models.Ticket.objects.create(user=self.end_user, subject=f'Laptop {n} broken', description='Screen black.')
+            task = models.Task.objects.create(ticket=ticket, assigned_by=self.admin, assigned_to=self.agent)
+            created = self.start + datetime.timedelta(days=day)
+            resolved = created + datetime.timedelta(hours=hours) if hours else created
+            models.Ticket.objects.filter(pk=ticket.pk).update(
+                created_at=created, updated_at=resolved, status='resolved' if hours else 'assigned',
+            )
+            models.Task.objects.filter(pk=task.pk).update(
+                created_at=created, updated_at=resolved, status='done' if hours else 'pending',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_report(self):
+        params = {'start': '2026-03-01', 'end': '2026-03-04', 'bucket': 'day'}
+        response = self.client.get('/api/analytics/', params)
+        self.assertEqual(response.status_code, 200)
+
+        resolution = response.data['resolution']
+        self.assertEqual((resolution['count'], resolution['mean_hours']), (3, 12.0))
+        self.assertEqual(resolution['percentiles_hours']['p50'], 10.0)
+        self.assertEqual(resolution['histogram']['counts'][:5], [0, 1, 0, 1, 1])
+
+        backlog = response.data['backlog']
+        self.assertEqual(len(backlog['buckets']), 3)
+        self.assertEqual(backlog['created'], [2, 1, 1])
+        self.assertEqual(backlog['resolved'], [2, 0, 1])
+        self.assertEqual(backlog['open'], [0, 1, 1])
+
+        [agent] = response.data['agents']
+        self.assertEqual((agent['agent_id'], agent['done'], agent['open'], agent['mean_hours_to_done']), (self.agent.id, 3, 1, 12.0))
+
+        # Served from the cache for the same window
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/analytics/', params).data, response.data)
+
+    def test_older_tickets_are_only_counted(self):
+        # Opened before the window and open through it: one still in the hot table, one
+        # archived after being resolved later
+        before = self.start - datetime.timedelta(days=20)
+        ticket = models.Ticket.objects.create(user=self.end_user, subject='Old printer', description='Jammed.')
+        models.Ticket.objects.filter(pk=ticket.pk).update(created_at=before, updated_at=before)
+        models.ArchivedTicket.objects.create(
+            id=ticket.pk + 1, user=self.end_user, subject='Old monitor', created_at=before,
+            resolved_at=self.start + datetime.timedelta(days=10), ticket={},
+        )
+
+        start, end = self.start + datetime.timedelta(days=1), self.start + datetime.timedelta(days=3)
+        created, resolved, carried = analytics.load_tickets(start, end)
+        # The two tickets resolved on the first day are left out
+        self.assertEqual((created.size, carried), (2, 2))
+
+        response = self.client.get('/api/analytics/', {'start': '2026-03-02', 'end': '2026-03-04', 'bucket': 'day'})
+        backlog = response.data['backlog']
+        self.assertEqual(backlog['created'], [1, 1])
+        self.assertEqual(backlog['resolved'], [0, 1])
+        self.assertEqual(backlog['open'], [3, 3])
+
+    def test_only_tasks_finished_in_or_after_the_window_are_loaded(self):
+        start, end = self.start + datetime.timedelta(days=1), self.start + datetime.timedelta(days=2)
+        assignees, done, created, updated = analytics.load_tasks(start, end)
+        # Finished on the first day, or created after the window: left in the database
+        self.assertEqual(assignees.tolist(), [self.agent.id])
+
+        # Finished exactly at the window's end, so still open through it
+        [agent] = analytics.agent_throughput(assignees, done, created, updated, start.timestamp(), end.timestamp())
+        self.assertEqual((agent['done'], agent['open']), (0, 1))
+
+    def test_bucket_limits(self):
+        self.assertEqual(len(analytics.bucket_edges(self.start, self.start + datetime.timedelta(days=70), 'month')), 4)
+        response = self.client.get('/api/analytics/', {'start': '2000-01-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.client.get('/api/analytics/').status_code, 403)
+
+
+@override_settings(AUDIT_LOG={"FLUSH_IN_PROCESS": False, "BATCH_SIZE": 100})
+class AuditLogTests(HelpdeskTestCase):
+    def setUp(self):
+        audit.buffer.events.clear()
+        self.addCleanup(audit.buffer.events.clear)
+        self.client = APIClient()
+
+    def test_mutations_are_buffered_then_bulk_written(self):
+        ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='VPN down', description='Cannot reach the VPN.',
+        )
+        self.client.force_authenticate(self.end_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/tickets/{ticket.id}/', {'subject': 'VPN still down'}, format='json')
+            self.client.get(f'/api/tickets/{ticket.id}/')
+
+        self.assertFalse(models.AuditLog.objects.exists())
+        self.assertEqual(audit.flush(), 1)
+
+        log = models.AuditLog.objects.get()
+        self.assertEqual((log.actor_id, log.event), (self.end_user.id, f"ticket.update #{ticket.id}"))
+        self.assertEqual(log.month, log.timestamp.date().replace(day=1))
+
+    def test_audit_api_pages_newest_first(self):
+        for number in range(3):
+            audit.buffer.add(self.end_user.id, f"ticket.update #{number}", timezone.now())
+        audit.buffer.add(self.admin.id, "user.delete #9", timezone.now())
+        audit.flush()
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/audit-logs/', {'actor': self.end_user.id, 'page_size': 2})
+        self.assertEqual([row['event'] for row in response.data['results']], ['ticket.update #2', 'ticket.update #1'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['event'] for row in response.data['results']], ['ticket.update #0'])
+
+
+class TicketArchiveTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='VPN down', description='Cannot reach the VPN.',
+        )
+        self.task = models.Task.objects.create(
+            ticket=self.ticket, assigned_by=self.admin, assigned_to=self.agent, status='done',
+        )
+        self.created_at = self.ticket.created_at
+        models.Ticket.objects.filter(pk=self.ticket.pk).update(
+            status='resolved', updated_at=timezone.now() - datetime.timedelta(days=120),
+        )
+
+    def test_old_resolved_tickets_move_with_their_tasks(self):
+        models.Ticket.objects.create(user=self.end_user, subject='Printer jammed', description='It eats paper.')
+
+        self.assertEqual(list(archive.archive(archive.cutoff(90))), [1])
+        self.assertFalse(models.Ticket.objects.filter(pk=self.ticket.pk).exists())
+        self.assertFalse(models.Task.objects.filter(pk=self.task.pk).exists())
+        self.assertEqual(models.Ticket.objects.count(), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.end_user)
+        response = client.get(f'/api/tickets/{self.ticket.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['subject'], response.data['archived']), ('VPN down', True))
+
+    def test_archive_moves_are_not_deletes_in_the_change_feed(self):
+        client = APIClient()
+        client.force_authenticate(self.end_user)
+        cursor = client.get('/api/changes/').data['cursor']
+        list(archive.archive(archive.cutoff(90)))
+
+        [change] = client.get('/api/changes/', {'since': cursor}).data['changes']
+        self.assertEqual((change['resource'], change['id'], change['action']), ('ticket', self.ticket.pk, 'archived'))
+        self.assertEqual((change['data']['subject'], change['data']['status']), ('VPN down', 'resolved'))
+        self.assertEqual(client.get(f"/api/tickets/{change['id']}/").status_code, 200)
+
+        client.force_authenticate(self.agent)
+        [change] = client.get('/api/changes/', {'since': cursor}).data['changes']
+        self.assertEqual((change['resource'], change['id'], change['action']), ('task', self.task.pk, 'archived'))
+        self.assertFalse(models.ChangeLog.objects.filter(action='delete').exists())
+
+    def test_restore_brings_back_ticket_and_tasks(self):
+        list(archive.archive(archive.cutoff(90)))
+        ticket, task_count = archive.restore(self.ticket.pk)
+
+        self.assertEqual(task_count, 1)
+        ticket = models.Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual((ticket.status, ticket.done_tasks, ticket.created_at), ('resolved', 1, self.created_at))
+        self.assertEqual(models.Task.objects.get(pk=self.task.pk).assigned_to, self.agent)
+        self.assertFalse(models.ArchivedTicket.objects.exists())
+
+
+class AttachmentUploadTests(HelpdeskTestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "attachments": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": f"{root}/attachments"},
+                },
+            },
+            ATTACHMENT_UPLOADS={"UPLOAD_DIR": f"{root}/uploads", "MAX_CHUNK_SIZE": 1024},
+            THUMBNAILS={"WAIT": 30},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(thumbnails.wait_all, 30)  # background renders write to this test's storage
+
+        self.ticket = models.Ticket.objects.create(
+            user=self.end_user, subject='VPN down', description='Cannot reach the VPN.',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.end_user)
+
+    def start(self, content, filename='screenshot.png'):
+        response = self.client.post(
+            f'/api/tickets/{self.ticket.pk}/attachments/', {'filename': filename, 'size': len(content)}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return f"/api/attachments/uploads/{response.data['id']}/"
+
+    def send(self, url, offset, chunk):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_resumes_and_is_content_addressed(self):
+        content = bytes(range(256)) * 6
+        url = self.start(content)
+
+        self.assertEqual(self.send(url, 0, content[:1000]).data['offset'], 1000)
+        response = self.send(url, 0, content[1000:])
+        self.assertEqual((response.status_code, response.data['offset']), (409, 1000))
+
+        attachments._hashers.clear()  # resuming on a worker that never saw the first chunk
+        response = self.send(url, 1000, content[1000:])
+        self.assertEqual(response.status_code, 201)
+
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(response.data['sha256'], digest)
+        with attachments.get_storage().open(attachments.blob_name(digest)) as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertFalse(models.AttachmentUpload.objects.exists())
+
+    def test_client_is_read_before_the_upload_row_is_locked(self):
+        content = b'a' * 500 + b'b' * 100
+        upload_id = self.start(content).split('/')[-2]
+
+        class RacingStream(io.BytesIO):
+            # A retry of the same chunk finishes while this request is still receiving
+            def read(stream, size=-1):
+                if not stream.tell():
+                    attachments.append_chunk(upload_id, 0, io.BytesIO(content[:500]), 500)
+                return super().read(size)
+
+        with self.assertRaises(attachments.OffsetMismatch) as raised:
+            attachments.append_chunk(upload_id, 0, RacingStream(b'c' * 500), 500)
+        self.assertEqual(raised.exception.offset, 500)
+
+        upload = models.AttachmentUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.offset, 500)
+        # The losing chunk's bytes are dropped, never appended
+        self.assertEqual(os.listdir(attachments.get_setting('UPLOAD_DIR')), [f'{upload_id}.part'])
+        with open(attachments.staging_path(upload), 'rb') as staged:
+            self.assertEqual(staged.read(), content[:500])
+
+        _, attachment = attachments.append_chunk(upload_id, 500, io.BytesIO(content[500:]), 100)
+        self.assertEqual(attachment.blob.sha256, hashlib.sha256(content).hexdigest())
+
+    def test_blob_is_stored_before_the_upload_is_locked(self):
+        content = b'final screenshot bytes'
+        url = self.start(content)
+        storage = attachments.get_storage()
+        depth = len(connection.atomic_blocks)
+        save = storage.save
+
+        def save_while_aborted(name, file):
+            self.assertEqual(len(connection.atomic_blocks), depth)  # no transaction, no row lock
+            models.AttachmentUpload.objects.filter(pk=url.split('/')[-2]).delete()
+            return save(name, file)
+
+        with mock.patch.object(storage, 'save', side_effect=save_while_aborted):
+            self.assertEqual(self.send(url, 0, content).status_code, 404)
+        # The object saved for the aborted upload is removed again
+        self.assertFalse(storage.exists(attachments.blob_name(hashlib.sha256(content).hexdigest())))
+        self.assertFalse(models.AttachmentBlob.objects.exists())
+
+    def test_identical_files_share_one_blob(self):
+        content = b'identical screenshot bytes'
+        for filename in ['first.png', 'second.png']:
+            self.send(self.start(content, filename), 0, content)
+
+        self.assertEqual(models.Attachment.objects.filter(ticket=self.ticket).count(), 2)
+        self.assertEqual(models.AttachmentBlob.objects.count(), 1)
+
+    def test_download_supports_ranges_and_etags(self):
+        content = b'0123456789' * 50
+        attachment_id = self.send(self.start(content, 'log.pdf'), 0, content).data['id']
+        url = f'/api/attachments/{attachment_id}/download/'
+
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(content).hexdigest()}"')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 10-19/500'))
+        self.assertEqual(b''.join(response.streaming_content), content[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), content[-5:])
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=900-').status_code, 416)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with override_settings(ATTACHMENT_DOWNLOADS={"OFFLOAD": "x-accel-redirect"}):
+            response = self.client.get(url)
+        self.assertTrue(response['X-Accel-Redirect'].endswith(hashlib.sha256(content).hexdigest()))
+
+        with override_settings(ATTACHMENT_DOWNLOADS={"OFFLOAD": "x-sendfile"}):
+            response = self.client.get(url)
+        self.assertTrue(os.path.isfile(response['X-Sendfile']))
+
+    def test_sendfile_streams_from_storages_without_local_paths(self):
+        content = b'stored remotely' * 20
+        attachment_id = self.send(self.start(content, 'log.pdf'), 0, content).data['id']
+
+        # Like S3Storage, which has no path()
+        remote = mock.Mock(wraps=attachments.get_storage())
+        remote.path.side_effect = NotImplementedError("This backend doesn't support absolute paths.")
+        with mock.patch.object(attachments, 'get_storage', return_value=remote), \
+                override_settings(ATTACHMENT_DOWNLOADS={"OFFLOAD": "x-sendfile"}):
+            response = self.client.get(f'/api/attachments/{attachment_id}/download/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Sendfile'))
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_thumbnails_render_in_the_pool(self):
+        png = io.BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(png, 'PNG')
+        content = png.getvalue()
+        url = self.start(content, 'screen.png')
+        for offset in range(0, len(content), 1024):
+            response = self.send(url, offset, content[offset:offset + 1024])
+        attachment = response.data
+        self.assertIn('thumb', attachment['thumbnails'])
+
+        response = self.client.get(attachment['thumbnails']['thumb'])
+        self.assertEqual(response.status_code, 200)
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as thumbnail:
+            self.assertEqual(thumbnail.size, (128, 64))
+
+        response = self.client.get(attachment['thumbnails']['preview'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as preview:
+            self.assertEqual(preview.size, (800, 400))  # never upscaled
+
+        etag = f'"{attachment["sha256"]}-thumb"'
+        response = self.client.get(attachment['thumbnails']['thumb'], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_failed_save_releases_the_render(self):
+        png = io.BytesIO()
+        Image.new('RGB', (300, 200), 'blue').save(png, 'PNG')
+        content = png.getvalue()
+
+        with mock.patch.object(thumbnails, 'store', side_effect=OSError("No space left on device")):
+            attachment = models.Attachment.objects.get(pk=self.send(self.start(content, 'chart.png'), 0, content).data['id'])
+            with self.assertRaises(thumbnails.ThumbnailError):
+                thumbnails.get_thumbnail(attachment, 'thumb')
+            thumbnails.wait_all(30)
+
+        self.assertEqual(thumbnails._inflight, {})
+        self.assertIsNone(cache.get(thumbnails.lock_key(attachment.blob, 'thumb')))
+        self.assertEqual(thumbnails.get_thumbnail(attachment, 'thumb'), thumbnails.thumbnail_name(attachment.blob, 'thumb', 'png'))
+
+    def test_request_thread_neither_reads_the_original_nor_waits(self):
+        png = io.BytesIO()
+        Image.new('RGB', (300, 200), 'green').save(png, 'PNG')
+        content = png.getvalue()
+        with mock.patch.object(thumbnails, 'schedule'):
+            attachment = models.Attachment.objects.get(pk=self.send(self.start(content, 'map.png'), 0, content).data['id'])
+
+        # The worker gets the path and the request answers without waiting for it
+        storage = attachments.get_storage()
+        rendering = concurrent.futures.Future()
+        pool = mock.Mock(**{'submit.return_value': rendering})
+        with (
+            mock.patch.object(thumbnails, 'get_pool', return_value=pool),
+            mock.patch.object(storage, 'open', side_effect=AssertionError),
+        ):
+            self.assertIsNone(thumbnails.get_thumbnail(attachment, 'thumb'))
+        function, source, edge, image_format = pool.submit.call_args.args
+        self.assertEqual(source, attachments.local_path(attachment.blob))
+        rendering.set_result(function(source, edge, image_format))
+        thumbnails.wait_all(30)
+        self.assertEqual(thumbnails.get_thumbnail(attachment, 'thumb'), thumbnails.thumbnail_name(attachment.blob, 'thumb', 'png'))
+
+        # Storages without local paths are read on a reader thread instead
+        readers = []
+        open_original = storage.open
+
+        def open_and_record(name, mode='rb'):
+            readers.append(threading.current_thread().name)
+            return open_original(name, mode)
+
+        with (
+            mock.patch.object(attachments, 'local_path', return_value=None),
+            mock.patch.object(storage, 'open', side_effect=open_and_record),
+        ):
+            self.assertIsNotNone(thumbnails.get_thumbnail(attachment, 'small'))
+        self.assertTrue(readers and all(name.startswith('thumbnail-reader') for name in readers))
+
+    def test_disallowed_extension_is_rejected(self):
+        response = self.client.post(
+            f'/api/tickets/{self.ticket.pk}/attachments/', {'filename': 'run.exe', 'size': 10}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
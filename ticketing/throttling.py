@@ -0,0 +1,114 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    # "10/day", "5/min", "100/h" -> (10, 86400)
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def get_rate(rule, role):
+    policy = getattr(settings, 'RATE_LIMITS', {}).get(rule)
+    if isinstance(policy, dict):
+        return parse_rate(policy.get(role, policy.get('default')))
+    return parse_rate(policy)
+
+
+class SlidingWindowLimiter:
+    # Sliding-window counter: one cache counter per fixed window, with the previous
+    # window weighted by how much of it still overlaps the sliding window. Counters
+    # are bumped with cache.incr, which is atomic on Redis and local memory, so the
+    # limit holds across workers that share the cache.
+    def __init__(self, cache_alias=None):
+        self.cache = caches[cache_alias or getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        elapsed = now - bucket * window
+        current_key = f"ratelimit:{key}:{bucket}"
+
+        self.cache.add(current_key, 0, timeout=window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, timeout=window * 2)
+            current = 1
+        previous = self.cache.get(f"ratelimit:{key}:{bucket - 1}", 0)
+
+        weight = 1 - elapsed / window
+        if previous * weight + current <= limit:
+            return True, 0
+
+        self.cache.decr(current_key)
+        return False, self.retry_after(limit, window, elapsed, previous, current - 1)
+
+    def release(self, key, window, now):
+        # Gives back a hit counted at `now`, for requests that turned out not to use the budget
+        try:
+            self.cache.decr(f"ratelimit:{key}:{int(now // window)}")
+        except ValueError:
+            pass  # the window's counter has expired or been evicted
+
+    @staticmethod
+    def retry_after(limit, window, elapsed, previous, current):
+        # Time until previous * overlap + current + 1 fits under the limit again
+        if current < limit:
+            # Wait for the previous window's share to decay
+            wait = window * (1 - (limit - current - 1) / previous) - elapsed
+        else:
+            # The current window alone is full: wait for it to become the previous one and decay
+            wait = (window - elapsed) + window * (1 - (limit - 1) / current)
+        return max(1, math.ceil(wait))
+
+
+class RoleRateThrottle(BaseThrottle):
+    # Views name the rule for a request via get_throttle_rule(request); the rate
+    # for that rule and the user's role comes from settings.RATE_LIMITS.
+    limiter_class = SlidingWindowLimiter
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rule = view.get_throttle_rule(request)
+        if rule is None:
+            return True
+
+        user = request.user
+        if user and user.is_authenticated:
+            role, ident = user.user_type, f"user:{user.id}"
+        else:
+            role, ident = 'anonymous', f"ip:{self.get_ident(request)}"
+
+        rate = get_rate(rule, role)
+        if rate is None:
+            return True
+
+        limit, window = rate
+        limiter, key, now = self.limiter_class(), f"{rule}:{ident}", time.time()
+        allowed, self.wait_seconds = limiter.hit(key, limit, window, now)
+        if allowed:
+            # Kept on the request so the view can hand the hit back; see refund()
+            request.rate_limit_hits = getattr(request, 'rate_limit_hits', []) + [(limiter, key, window, now)]
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def refund(request):
+    # For rules that should only count requests that did something (a ticket actually
+    # created): the budget is taken before the view runs, so concurrent requests cannot
+    # overshoot it, and handed back here when the view rejected the request
+    for limiter, key, window, now in getattr(request, 'rate_limit_hits', []):
+        limiter.release(key, window, now)
+    request.rate_limit_hits = []
@@ -0,0 +1,171 @@
+import atexit
+import concurrent.futures
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from ticketing import attachments
+from ticketing import imaging
+
+DEFAULTS = {
+    'SIZES': {'thumb': 128, 'small': 320, 'preview': 1024},  # longest edge in pixels
+    'WORKERS': 2,  # 0 renders inline, for development and tests
+    'WAIT': 0.25,  # seconds a request waits for a render before answering 202; it holds a worker meanwhile
+    'LOCK_TIMEOUT': 60,  # seconds another process's render is trusted to finish
+}
+
+# extension -> (Pillow format, stored extension)
+FORMATS = {
+    'jpg': ('JPEG', 'jpg'),
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+}
+
+_pool = None
+_reader = None
+_pool_lock = threading.Lock()
+# (sha256, size) -> Future resolving to the stored name, shared by every caller in this process
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'THUMBNAILS', {}).get(name, DEFAULTS[name])
+
+
+def source_format(filename):
+    return FORMATS.get(filename.rsplit('.', 1)[-1].lower())
+
+
+def thumbnail_name(blob, size, extension):
+    # Content-addressed next to the originals: same bytes, same thumbnails
+    digest = blob.sha256
+    return f"thumbnails/{digest[:2]}/{digest[2:4]}/{digest}-{size}.{extension}"
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Created lazily, so each server worker process gets its own after forking
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=get_setting('WORKERS'))
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
+
+
+def get_reader():
+    # Threads that fetch originals from storages without local paths, off the request thread
+    global _reader
+    with _pool_lock:
+        if _reader is None:
+            _reader = concurrent.futures.ThreadPoolExecutor(
+                max_workers=get_setting('WORKERS'), thread_name_prefix='thumbnail-reader',
+            )
+        return _reader
+
+
+def read_and_render(name, edge, image_format):
+    with attachments.get_storage().open(name, 'rb') as original:
+        source = original.read()  # attachments are capped at 10MB
+    if get_setting('WORKERS'):
+        return get_pool().submit(imaging.render_thumbnail, source, edge, image_format).result()
+    return imaging.render_thumbnail(source, edge, image_format)
+
+
+def lock_key(blob, size):
+    return f"thumbnail-render:{blob.sha256}:{size}"
+
+
+def store(name, rendered):
+    storage = attachments.get_storage()
+    if not storage.exists(name):
+        storage.save(name, ContentFile(rendered))
+    return name
+
+
+def render(blob, size, filename):
+    # Single flight: concurrent callers in this process share one Future, and the
+    # cache lock keeps other processes from rendering the same image meanwhile.
+    # Returns None while another process holds the lock.
+    image_format, extension = source_format(filename)
+    name = thumbnail_name(blob, size, extension)
+    key = (blob.sha256, size)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        if not cache.add(lock_key(blob, size), 1, timeout=get_setting('LOCK_TIMEOUT')):
+            return None
+        future = concurrent.futures.Future()
+        _inflight[key] = future
+
+    def finish(rendering):
+        # Whatever the render or the save raises ends up on the future, and the
+        # key is always freed, so later callers can try again
+        try:
+            future.set_result(store(name, rendering.result()))
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            cache.delete(lock_key(blob, size))
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    edge = get_setting('SIZES')[size]
+    rendering = concurrent.futures.Future()
+    try:
+        path = attachments.local_path(blob) if get_setting('WORKERS') else None
+        if not get_setting('WORKERS'):
+            rendering.set_result(read_and_render(blob.name, edge, image_format))
+        elif path is not None:
+            # The worker process reads the original itself
+            rendering = get_pool().submit(imaging.render_thumbnail, path, edge, image_format)
+        else:
+            rendering = get_reader().submit(read_and_render, blob.name, edge, image_format)
+    except Exception as exc:
+        rendering.set_exception(exc)
+    # Runs on the pool's result thread, which would only log an exception
+    rendering.add_done_callback(finish)
+    return future
+
+
+def wait_all(timeout=None):
+    # Blocks until every render started by this process has been stored
+    with _inflight_lock:
+        futures = list(_inflight.values())
+    concurrent.futures.wait(futures, timeout=timeout)
+
+
+def schedule(attachment):
+    # Renders every size in the background, e.g. right after an upload completes
+    if source_format(attachment.filename) is None:
+        return
+    for size in get_setting('SIZES'):
+        name = thumbnail_name(attachment.blob, size, source_format(attachment.filename)[1])
+        if not attachments.get_storage().exists(name):
+            render(attachment.blob, size, attachment.filename)
+
+
+def get_thumbnail(attachment, size):
+    # The stored name, rendering on first use; None if still being rendered after WAIT
+    name = thumbnail_name(attachment.blob, size, source_format(attachment.filename)[1])
+    if attachments.get_storage().exists(name):
+        return name
+
+    future = render(attachment.blob, size, attachment.filename)
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=get_setting('WAIT'))
+    except concurrent.futures.TimeoutError:
+        return None
+    except Exception as exc:
+        # Corrupt or hostile images fail inside Pillow with a variety of errors
+        raise ThumbnailError(f"Could not render {attachment.filename}") from exc
@@ -0,0 +1,110 @@
+import threading
+
+from django.db.models import Q
+
+from ticketing import models
+
+# Topics are what clients subscribe to ("user:5", "role:it_personnel", "ticket:12");
+# groups are the matching channel-layer group names ("user_5", ...).
+TOPIC_KINDS = ('user', 'role', 'ticket')
+# Seconds a socket keeps delivering a topic before its permission is checked again
+RECHECK_INTERVAL = 30
+ROLES = [choice for choice, _ in models.CustomUser.USER_TYPE_CHOICES]
+
+
+def parse_topic(topic):
+    kind, _, value = str(topic).partition(':')
+    if kind not in TOPIC_KINDS or not value:
+        raise ValueError(f"Unknown topic: {topic}")
+    if kind == 'role':
+        if value not in ROLES:
+            raise ValueError(f"Unknown role: {value}")
+        return kind, value
+    if not value.isdigit():
+        raise ValueError(f"Invalid id in topic: {topic}")
+    return kind, int(value)
+
+
+def group_name(kind, value):
+    return f"{kind}_{value}"
+
+
+def user_group(user_id):
+    return group_name('user', user_id)
+
+
+def role_group(role):
+    return group_name('role', role)
+
+
+def ticket_group(ticket_id):
+    return group_name('ticket', ticket_id)
+
+
+def can_subscribe(user, kind, value):
+    if user.user_type == 'super_admin':
+        return kind != 'ticket' or models.Ticket.objects.filter(pk=value).exists()
+    if kind == 'user':
+        return value == user.id
+    if kind == 'role':
+        return value == user.user_type
+    return (
+        models.Ticket.objects.filter(pk=value, user_id=user.id).exists()
+        or models.Task.objects.filter(Q(assigned_to_id=user.id) | Q(assigned_by_id=user.id), ticket_id=value).exists()
+    )
+
+
+def can_receive(user_id, kind, value):
+    # Re-run against the current user row while subscribed: roles change, accounts are
+    # deactivated and tickets move to other users after the socket subscribed
+    user = models.CustomUser.objects.filter(pk=user_id, is_active=True).first()
+    return user is not None and can_subscribe(user, kind, value)
+
+
+class SubscriptionRegistry:
+    # Which channels of this process are subscribed to which groups. The channel
+    # layer holds the real membership; this lets a consumer clean up on disconnect
+    # and lets operators see per-topic fan-out.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._channels = {}
+
+    def add(self, channel_name, group):
+        with self._lock:
+            self._groups.setdefault(group, set()).add(channel_name)
+            self._channels.setdefault(channel_name, set()).add(group)
+
+    def discard(self, channel_name, group):
+        with self._lock:
+            self._discard(channel_name, group)
+
+    def discard_all(self, channel_name):
+        with self._lock:
+            groups = self._channels.get(channel_name, set()).copy()
+            for group in groups:
+                self._discard(channel_name, group)
+            return groups
+
+    def _discard(self, channel_name, group):
+        channels = self._groups.get(group)
+        if channels is not None:
+            channels.discard(channel_name)
+            if not channels:
+                del self._groups[group]
+        groups = self._channels.get(channel_name)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._channels[channel_name]
+
+    def groups_for(self, channel_name):
+        with self._lock:
+            return set(self._channels.get(channel_name, ()))
+
+    def subscriber_counts(self):
+        with self._lock:
+            return {group: len(channels) for group, channels in self._groups.items()}
+
+
+registry = SubscriptionRegistry()
@@ -7,7 +7,20 @@ urlpatterns = [
 
     path('tickets/', viewsApi.TicketAPIView.as_view()),
     path('tickets/<int:pk>/', viewsApi.TicketAPIView.as_view()),
+    path('tickets/bulk/', viewsApi.TicketBulkAPIView.as_view()),
+    path('tickets/search/', viewsApi.TicketSearchAPIView.as_view()),
+    path('tickets/<int:ticket_id>/attachments/', viewsApi.TicketAttachmentAPIView.as_view()),
+    path('attachments/uploads/<uuid:pk>/', viewsApi.AttachmentUploadAPIView.as_view()),
+    path('attachments/<int:pk>/download/', viewsApi.AttachmentDownloadAPIView.as_view()),
+    path('attachments/<int:pk>/thumbnails/<str:size>/', viewsApi.AttachmentThumbnailAPIView.as_view()),
     
     path('tasks/', viewsApi.TaskAPIView.as_view()),
     path('tasks/<int:pk>/', viewsApi.TaskAPIView.as_view()),
+    path('tasks/bulk/<str:action>/', viewsApi.TaskBulkAPIView.as_view()),
+
+    path('changes/', viewsApi.ChangeFeedAPIView.as_view()),
+    path('audit-logs/', viewsApi.AuditLogAPIView.as_view()),
+    path('analytics/', viewsApi.AnalyticsAPIView.as_view()),
+
+    path('export/<str:resource>/', viewsApi.ExportAPIView.as_view()),
 ]
\ No newline at end of file
@@ -1,15 +1,25 @@
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from ticketing import notifications
+from ticketing import outbox
+from ticketing import topics
 
 def send_ws_notification(user_id, event_type, data):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{user_id}",
-        {
-            "type": "notify",
-            "content": {
-                "type": event_type,
-                "data": data
-            }
-        }
-    )
\ No newline at end of file
+    # Stored with the user's next sequence number for replay, then queued in the
+    # outbox and sent after commit, never inline in the request
+    content = notifications.record(user_id, {
+        "type": event_type,
+        "data": data
+    })
+    outbox.enqueue(topics.user_group(user_id), content)
+
+def send_role_notification(role, event_type, data):
+    # One group_send reaches every socket subscribed to role:<role>
+    outbox.enqueue(topics.role_group(role), {
+        "type": event_type,
+        "data": data
+    })
+
+def send_ticket_notification(ticket_id, event_type, data):
+    outbox.enqueue(topics.ticket_group(ticket_id), {
+        "type": event_type,
+        "data": data
+    })
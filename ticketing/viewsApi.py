@@ -8,14 +8,59 @@ from django.core.exceptions import ObjectDoesNotExist
 from ticketing import models
 from ticketing import serializers
 from django.shortcuts import get_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+import mimetypes
+from django.db import transaction
 from rest_framework.exceptions import PermissionDenied
-from django.utils.timezone import now
 from ticketing import utils
+from ticketing import authentication
+from ticketing import throttling
+from ticketing import conditional
+from ticketing import listcache
+from ticketing import filters
+from ticketing import pagination
+from ticketing import export
+from ticketing import search
+from ticketing import similarity
+from ticketing import audit
+from ticketing import archive
+from ticketing import attachments
+from ticketing import thumbnails
+from ticketing import bulk
+from ticketing import assignment
+from ticketing import changefeed
+from ticketing import analytics
 
 # Create your views here.
 
-class AuthAPIView(APIView):
+class AuthAPIView(audit.AuditMixin, APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [throttling.RoleRateThrottle]
+    audit_resource = 'user'
+
+    def get_audit_event(self, request, response):
+        if request.method != 'POST':
+            return super().get_audit_event(request, response)
+        if response.status_code >= 400:
+            return None
+
+        action = request.data.get("action") or request.query_params.get("action")
+        if action == "register":
+            user_id = response.data["user"]["id"]
+            return user_id, f"user.register #{user_id}"
+        if action == "confirm_reset":
+            return request.data.get("user_id"), "user.password_reset"
+        if action == "change_password":
+            return request.user.id, "user.password_change"
+        return None
+
+    def get_throttle_rule(self, request):
+        if request.method == 'POST':
+            action = request.data.get("action") or request.query_params.get("action")
+            if action in ['login', 'reset', 'confirm_reset']:
+                return f"auth.{action}"
+        return None
 
     def post(self, request):
         action = request.data.get("action") or request.query_params.get("action")
@@ -67,7 +112,7 @@ class AuthAPIView(APIView):
             serializer = serializers.ChangePasswordSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
 
-            user = request.user
+            user = authentication.resolve_user(request.user)
             old_password = serializer.validated_data['old_password']
 
             if not user.check_password(old_password):
@@ -82,29 +127,37 @@ class AuthAPIView(APIView):
         return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
 
     def get(self, request, pk=None):
+        many = not pk and (request.user.is_staff or request.user.is_superuser)
         if pk:
-            user = get_object_or_404(models.CustomUser, pk=pk)
-            serializer = serializers.CustomUserSerializer(user)
-            return Response(serializer.data)
+            users = [get_object_or_404(models.CustomUser, pk=pk)]
+        elif many:
+            users = list(models.CustomUser.objects.all())
+        else:
+            users = [authentication.resolve_user(request.user)]
 
-        if request.user.is_staff or request.user.is_superuser:
-            users = models.CustomUser.objects.all()
-            serializer = serializers.CustomUserSerializer(users, many=True)
-            return Response(serializer.data)
+        etag, last_modified = conditional.validators(users, extra=[many])
+        if many:
+            last_modified = None  # deleted users would not move it
+        not_modified = conditional.not_modified(request, etag, last_modified)
+        if not_modified:
+            return not_modified
 
-        serializer = serializers.CustomUserSerializer(request.user)
-        return Response(serializer.data)
+        if many:
+            serializer = serializers.CustomUserSerializer(users, many=True)
+        else:
+            serializer = serializers.CustomUserSerializer(users[0])
+        return conditional.set_validators(Response(serializer.data), etag, last_modified)
 
     def put(self, request, pk=None):
         if pk:
             user = get_object_or_404(models.CustomUser, pk=pk)
 
-            if request.user != user and not request.user.is_staff and not request.user.is_superuser:
+            if request.user.id != user.id and not request.user.is_staff and not request.user.is_superuser:
                 raise PermissionDenied("You do not have permission to update this user.")
 
             serializer = serializers.CustomUserSerializer(user, data=request.data, partial=True)
         else:
-            serializer = serializers.CustomUserSerializer(request.user, data=request.data, partial=True)
+            serializer = serializers.CustomUserSerializer(authentication.resolve_user(request.user), data=request.data, partial=True)
 
         if serializer.is_valid():
             serializer.save()
@@ -123,55 +176,103 @@ class AuthAPIView(APIView):
         user.delete()
         return Response({"detail": "User deleted successfully."})
         
-class TicketAPIView(APIView):
+class TicketAPIView(audit.AuditMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [throttling.RoleRateThrottle]
+    audit_resource = 'ticket'
+
+    def get_throttle_rule(self, request):
+        return "tickets.create" if request.method == 'POST' else None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Only tickets actually created count against tickets.create; invalid,
+        # forbidden and duplicate posts give their hit back
+        if request.method == 'POST' and not 200 <= response.status_code < 300:
+            throttling.refund(request)
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get(self, request, pk=None):
         if pk:
-            ticket = get_object_or_404(models.Ticket, pk=pk)
+            ticket, archived = archive.get_ticket(pk)
+            if ticket is None:
+                raise Http404
+
+            etag, last_modified = conditional.validators([ticket], related=['user'])
+            not_modified = conditional.not_modified(request, etag, last_modified)
+            if not_modified:
+                return not_modified
+
             serializer = serializers.TicketSerializer(ticket)
-            return Response(serializer.data)
+            data = {**serializer.data, "archived": True} if archived else serializer.data
+            return conditional.set_validators(Response(data), etag, last_modified)
 
         if request.user.user_type == 'super_admin':
-            tickets = models.Ticket.objects.all()
+            tickets = models.Ticket.objects.for_list()
         else:
-            tickets =models.Ticket.objects.filter(user=request.user)
-        serializer = serializers.TicketSerializer(tickets, many=True)
-        return Response(serializer.data)
+            tickets = models.Ticket.objects.for_list().filter(user_id=request.user.id)
+        tickets = filters.filter_tickets(tickets, request.query_params)
+
+        cache_key = listcache.key_for('tickets', request)
+        cached = listcache.lookup(cache_key)
+        if cached:
+            data, etag = cached
+            return conditional.not_modified(request, etag) or conditional.set_validators(Response(data), etag)
+
+        paginator = pagination.KeysetPagination()
+        page = paginator.paginate_queryset(tickets, request, view=self)
+
+        # No Last-Modified on pages: a row dropping out of the page would not move it
+        etag, _ = conditional.validators(page, related=['user'], extra=[paginator.has_more])
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        serializer = serializers.TicketSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        listcache.store(cache_key, (response.data, etag))
+        return conditional.set_validators(response, etag)
 
     def post(self, request):
         if request.user.user_type not in ['super_admin', 'it_personnel']:
             return Response({"detail": "You do not have permission to create a ticket."}, status=403)
 
-        today = now().date()
-        tickets_today = models.Ticket.objects.filter(user=request.user, created_at__date=today).count()
-
-        if tickets_today >= 10:
-            return Response(
-                {"detail": "You have reached the daily limit of 10 tickets."},
-                status=status.HTTP_429_TOO_MANY_REQUESTS
-            )
-
         serializer = serializers.TicketSerializer(data=request.data)
         if serializer.is_valid():
-            ticket = serializer.save(user=request.user)
-            utils.send_ws_notification(
-                user_id=ticket.user.id,
-                event_type="ticket_created",
-                data={
+            duplicates = [
+                {"id": ticket.id, "subject": ticket.subject, "status": ticket.status, "score": round(score, 2)}
+                for ticket, score in similarity.find_duplicates(
+                    serializer.validated_data.get('subject', ''), serializer.validated_data.get('description', ''),
+                )
+            ]
+            reject = similarity.get_setting('REJECT') or request.query_params.get('reject_duplicates') in ['1', 'true']
+            if duplicates and reject:
+                return Response(
+                    {"detail": "This looks like a duplicate of an open ticket.", "possible_duplicates": duplicates},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            with transaction.atomic():
+                ticket = serializer.save(user=authentication.resolve_user(request.user))
+                if assignment.get_setting('ENABLED'):
+                    _, serializer.instance = assignment.auto_assign(ticket, assigned_by_id=request.user.id)
+                    ticket = serializer.instance
+                data = {
                     "ticket_id": ticket.id,
                     "subject": ticket.subject,
                     "status": ticket.status,
                 }
-            )
-            return Response(ticket.data, status=status.HTTP_201_CREATED)
+                utils.send_ws_notification(user_id=ticket.user_id, event_type="ticket_created", data=data)
+                # Triage dashboards subscribed to the role topics
+                utils.send_role_notification("it_personnel", "ticket_created", data)
+                utils.send_role_notification("super_admin", "ticket_created", data)
+            return Response({**serializer.data, "possible_duplicates": duplicates}, status=status.HTTP_201_CREATED)
         
-        return Response(ticket.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk):
         ticket = get_object_or_404(models.Ticket, pk=pk)
 
-        if ticket.user != request.user:
+        if ticket.user_id != request.user.id:
             return Response({"detail": "You do not have permission to fully update this ticket."}, status=403)
 
         if ticket.status in ['in_progress', 'resolved', 'closed']:
@@ -186,7 +287,7 @@ class TicketAPIView(APIView):
     def patch(self, request, pk):
         ticket = get_object_or_404(models.Ticket, pk=pk)
 
-        if ticket.user != request.user and request.user.user_type != 'super_admin':
+        if ticket.user_id != request.user.id and request.user.user_type != 'super_admin':
             return Response({"detail": "You do not have permission to partially update this ticket."}, status=403)
 
         if ticket.status == 'resolved':
@@ -201,7 +302,7 @@ class TicketAPIView(APIView):
     def delete(self, request, pk):
         ticket = get_object_or_404(models.Ticket, pk=pk)
         
-        if ticket.user != request.user:
+        if ticket.user_id != request.user.id:
             return Response({"detail": "You do not have permission to delete this ticket."}, status=403)
         
         if ticket.status in ['assigned', 'in_progress']:
@@ -210,39 +311,252 @@ class TicketAPIView(APIView):
         ticket.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    
-class TaskAPIView(APIView):
+
+# Rows TaskSerializer renders through __str__; their updated_at is part of the task's validators
+TASK_RENDERED_RELATIONS = ['ticket', 'assigned_by', 'assigned_to']
+
+class TicketSearchAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    def get(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"q": ["This query parameter is required."]}, status=400)
+
+        if request.user.user_type == 'super_admin':
+            tickets = models.Ticket.objects.for_list()
+        else:
+            tickets = models.Ticket.objects.for_list().filter(user_id=request.user.id)
+        tickets = search.search(filters.filter_tickets(tickets, request.query_params), text)
+
+        paginator = pagination.RankedPagination()
+        page = paginator.paginate_queryset(tickets, request, view=self)
+        serializer = serializers.TicketSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TicketAttachmentAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, ticket_id):
+        ticket = get_object_or_404(models.Ticket, pk=ticket_id)
+        if not attachments.can_attach(request.user, ticket):
+            return Response({"detail": "You do not have permission to view this ticket's attachments."}, status=403)
+
+        rows = ticket.attachments.select_related('blob', 'uploaded_by').order_by('id')
+        return Response(serializers.AttachmentSerializer(rows, many=True).data)
+
+    def post(self, request, ticket_id):
+        # Starts a resumable upload; the bytes follow as PATCHes to the upload
+        ticket = get_object_or_404(models.Ticket, pk=ticket_id)
+        if not attachments.can_attach(request.user, ticket):
+            return Response({"detail": "You do not have permission to attach files to this ticket."}, status=403)
+
+        serializer = serializers.AttachmentUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(ticket=ticket, uploaded_by_id=request.user.id)
+        return Response(
+            {**serializer.data, "max_chunk_size": attachments.get_setting('MAX_CHUNK_SIZE')},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class AttachmentUploadAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_upload(self, request, pk):
+        upload = get_object_or_404(models.AttachmentUpload, pk=pk)
+        if upload.uploaded_by_id != request.user.id:
+            raise PermissionDenied("This upload belongs to another user.")
+        return upload
+
+    def get(self, request, pk):
+        # Where to resume from
+        upload = self.get_upload(request, pk)
+        response = Response(serializers.AttachmentUploadSerializer(upload).data)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    def patch(self, request, pk):
+        # Raw bytes starting at the Upload-Offset header; read in small pieces, never buffered whole
+        self.get_upload(request, pk)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset and Content-Length headers are required."}, status=400)
+
+        try:
+            upload, attachment = attachments.append_chunk(pk, offset, request.stream, length)
+        except attachments.OffsetMismatch as exc:
+            response = Response({"detail": str(exc), "offset": exc.offset}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = exc.offset
+            return response
+        except attachments.ChunkTooLarge:
+            return Response({"detail": "Chunk is larger than allowed or runs past the declared size."}, status=413)
+        except models.AttachmentUpload.DoesNotExist:
+            raise Http404  # aborted or completed by another request meanwhile
+
+        if attachment is not None:
+            thumbnails.schedule(attachment)
+            data = serializers.AttachmentSerializer(attachment).data
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        response = Response(serializers.AttachmentUploadSerializer(upload).data)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    def delete(self, request, pk):
+        with transaction.atomic():
+            attachments.abort(self.get_upload(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AttachmentDownloadAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        attachment = get_object_or_404(models.Attachment.objects.select_related('ticket', 'blob'), pk=pk)
+        if not attachments.can_attach(request.user, attachment.ticket):
+            return Response({"detail": "You do not have permission to download this attachment."}, status=403)
+
+        blob = attachment.blob
+        etag = f'"{blob.sha256}"'  # content-addressed, so a strong validator
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        content_type = mimetypes.guess_type(attachment.filename)[0] or 'application/octet-stream'
+        offload = attachments.get_download_setting('OFFLOAD')
+        # X-Sendfile needs a local file; remote storages are streamed from here instead
+        sendfile_path = attachments.local_path(blob) if offload == 'x-sendfile' else None
+        if offload == 'x-accel-redirect':
+            # The proxy streams the file (and answers Range itself); the worker is free immediately
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = attachments.get_download_setting('ACCEL_PREFIX') + blob.name
+        elif sendfile_path:
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = sendfile_path
+        else:
+            span = conditional.parse_range(request, blob.size, etag)
+            if span is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{blob.size}"
+                return response
+
+            if span is None:
+                response = FileResponse(attachments.open_blob(blob), content_type=content_type)
+                response['Content-Length'] = blob.size
+            else:
+                start, end = span
+                response = FileResponse(attachments.open_blob(blob, start, end), status=206, content_type=content_type)
+                response['Content-Range'] = f"bytes {start}-{end}/{blob.size}"
+                response['Content-Length'] = end - start + 1
+
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = content_disposition_header(True, attachment.filename)
+        response['Cache-Control'] = 'private, max-age=3600'
+        return conditional.set_validators(response, etag)
+
+
+class AttachmentThumbnailAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, size):
+        attachment = get_object_or_404(models.Attachment.objects.select_related('ticket', 'blob'), pk=pk)
+        if not attachments.can_attach(request.user, attachment.ticket):
+            return Response({"detail": "You do not have permission to view this attachment."}, status=403)
+        if size not in thumbnails.get_setting('SIZES') or thumbnails.source_format(attachment.filename) is None:
+            raise Http404
+
+        etag = f'"{attachment.blob_id}-{size}"'
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        try:
+            name = thumbnails.get_thumbnail(attachment, size)
+        except thumbnails.ThumbnailError as exc:
+            return Response({"detail": str(exc)}, status=422)
+        if name is None:
+            response = Response({"detail": "Thumbnail is being generated."}, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = 1
+            return response
+
+        content_type = mimetypes.guess_type(name)[0]
+        response = FileResponse(attachments.get_storage().open(name, 'rb'), content_type=content_type)
+        response['Cache-Control'] = 'private, max-age=86400'
+        return conditional.set_validators(response, etag)
+
+
+class TaskAPIView(audit.AuditMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    audit_resource = 'task'
+
     def get(self, request, pk=None):
         if pk:
-            task = get_object_or_404(models.Task, pk=pk)
+            task = get_object_or_404(models.Task.objects.for_list(), pk=pk)
             if (
-                request.user != task.assigned_to and
-                request.user != task.assigned_by and
+                request.user.id != task.assigned_to_id and
+                request.user.id != task.assigned_by_id and
                 request.user.user_type != 'super_admin'
             ):
                 return Response({"detail": "You do not have permission to view this task."}, status=403)
+
+            etag, last_modified = conditional.validators([task], related=TASK_RENDERED_RELATIONS)
+            not_modified = conditional.not_modified(request, etag, last_modified)
+            if not_modified:
+                return not_modified
+
             serializer = serializers.TaskSerializer(task)
-            return Response(serializer.data)
+            return conditional.set_validators(Response(serializer.data), etag, last_modified)
 
         if request.user.user_type == 'super_admin':
-            tasks = models.Task.objects.all()
+            tasks = models.Task.objects.for_list()
         else:
-            tasks = models.Task.objects.filter(assigned_to=request.user)
-        serializer = serializers.TaskSerializer(tasks, many=True)
-        return Response(serializer.data)
+            tasks = models.Task.objects.for_list().filter(assigned_to_id=request.user.id)
+        tasks = filters.filter_tasks(tasks, request.query_params)
+
+        cache_key = listcache.key_for('tasks', request)
+        cached = listcache.lookup(cache_key)
+        if cached:
+            data, etag = cached
+            return conditional.not_modified(request, etag) or conditional.set_validators(Response(data), etag)
+
+        paginator = pagination.KeysetPagination()
+        page = paginator.paginate_queryset(tasks, request, view=self)
+
+        # No Last-Modified on pages: a row dropping out of the page would not move it
+        etag, _ = conditional.validators(page, related=TASK_RENDERED_RELATIONS, extra=[paginator.has_more])
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        serializer = serializers.TaskSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        listcache.store(cache_key, (response.data, etag))
+        return conditional.set_validators(response, etag)
 
     def post(self, request):
         serializer = serializers.TaskSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(assigned_by=request.user)
+            assigned_by = authentication.resolve_user(request.user)
+            extra = {}
+            if serializer.validated_data.get('assigned_to') is None:
+                if not assignment.get_setting('ENABLED'):
+                    return Response({"assigned_to_id": ["This field is required."]}, status=400)
+                ticket = serializer.validated_data.get('ticket')
+                agent_id = assignment.choose(ticket.user if ticket else None, exclude=[assigned_by.id])
+                if agent_id is None:
+                    return Response({"assigned_to_id": ["No IT Personnel are available to take this task."]}, status=400)
+                extra['assigned_to_id'] = agent_id
+            serializer.save(assigned_by=assigned_by, **extra)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk):
         task = get_object_or_404(models.Task, pk=pk)
-        if request.user != task.assigned_by and request.user.user_type != 'super_admin':
+        if request.user.id != task.assigned_by_id and request.user.user_type != 'super_admin':
             return Response({"detail": "You do not have permission to update this task."}, status=403)
 
         serializer = serializers.TaskSerializer(task, data=request.data)
@@ -254,7 +568,7 @@ class TaskAPIView(APIView):
     def patch(self, request, pk):
         task = get_object_or_404(models.Task, pk=pk)
 
-        if request.user != task.assigned_by and request.user != task.assigned_to and request.user.user_type != 'super_admin':
+        if request.user.id not in [task.assigned_by_id, task.assigned_to_id] and request.user.user_type != 'super_admin':
             return Response({"detail": "You do not have permission to partially update this task."}, status=403)
 
         if 'assigned_to' in request.data:
@@ -270,45 +584,22 @@ class TaskAPIView(APIView):
 
         serializer = serializers.TaskSerializer(task, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-
-            ticket = task.ticket
-            if ticket:
-                all_tasks = ticket.tasks.all()
-                statuses = set(t.status for t in all_tasks)
-
-                if statuses == {'done'}:
-                    if ticket.status not in ['resolved', 'closed']:
-                        ticket.status = 'resolved'
-                        ticket.save()
-                        utils.send_ws_notification(
-                            user_id=ticket.assigned_to.id,
-                            event_type="task_assigned",
-                            data={
-                                "task_id": ticket.id,
-                                "title": ticket.title,
-                                "status": ticket.status,
-                                "ticket_id": task.ticket.id if task.ticket else None,
-                            }
-                        )
-                elif 'in_progress' in statuses:
-                    if ticket.status not in ['in_progress', 'resolved', 'closed']:
-                        ticket.status = 'in_progress'
-                        ticket.save()
-                elif 'pending' in statuses:
-                    if ticket.status == 'new':
-                        ticket.status = 'assigned'
-                        ticket.save()
-                        utils.send_ws_notification(
-                            user_id=ticket.assigned_to.id,
-                            event_type="task_assigned",
-                            data={
-                                "task_id": ticket.id,
-                                "title": ticket.title,
-                                "status": ticket.status,
-                                "ticket_id": task.ticket.id if task.ticket else None,
-                            }
-                        )
+            with transaction.atomic():
+                serializer.save()
+
+                ticket_changed = False
+                if task.ticket_id:
+                    ticket, ticket_changed = models.Ticket.objects.rollup_status(task.ticket_id)
+
+                if ticket_changed:
+                    data = {
+                        "ticket_id": ticket.id,
+                        "subject": ticket.subject,
+                        "status": ticket.status,
+                        "task_id": task.id,
+                    }
+                    utils.send_ws_notification(user_id=ticket.user_id, event_type="ticket_status_changed", data=data)
+                    utils.send_ticket_notification(ticket.id, "ticket_status_changed", data)
 
             return Response(serializer.data)
         
@@ -324,4 +615,143 @@ class TaskAPIView(APIView):
             return Response({"detail": "You cannot delete a task that is already assigned."}, status=400)
 
         task.delete()
-        return Response({"detail": "Task deleted successfully."}, status=status.HTTP_204_NO_CONTENT)   
\ No newline at end of file
+        return Response({"detail": "Task deleted successfully."}, status=status.HTTP_204_NO_CONTENT)   
+
+def read_bulk_items(request):
+    # Returns (items, all_or_nothing, error response)
+    items = request.data.get("items") if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return None, False, Response({"items": ["Send a non-empty list of objects."]}, status=400)
+    if len(items) > bulk.MAX_ITEMS:
+        return None, False, Response({"items": [f"Send at most {bulk.MAX_ITEMS} items per request."]}, status=400)
+    return items, request.data.get("all_or_nothing") in [True, 'true', '1', 1], None
+
+
+def bulk_response(result, all_or_nothing, success_status=200):
+    # all_or_nothing batches with any invalid item write nothing
+    if result.errors and all_or_nothing:
+        return Response(result.as_data(), status=400)
+    return Response(result.as_data(), status=success_status)
+
+
+class TicketBulkAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.user_type not in ['super_admin', 'it_personnel']:
+            return Response({"detail": "You do not have permission to create tickets in bulk."}, status=403)
+
+        items, all_or_nothing, error = read_bulk_items(request)
+        if error:
+            return error
+        result = bulk.create_tickets(items, request.user.id, all_or_nothing=all_or_nothing)
+        return bulk_response(result, all_or_nothing, success_status=201)
+
+
+class TaskBulkAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    actions = {
+        'assign': bulk.assign_tasks,
+        'status': bulk.update_task_statuses,
+    }
+
+    def post(self, request, action):
+        if action not in self.actions:
+            return Response({"detail": f"Unknown bulk action '{action}'."}, status=404)
+        if request.user.user_type not in ['super_admin', 'it_personnel']:
+            return Response({"detail": "You do not have permission to update tasks in bulk."}, status=403)
+
+        items, all_or_nothing, error = read_bulk_items(request)
+        if error:
+            return error
+        result = self.actions[action](items, request.user, all_or_nothing=all_or_nothing)
+        return bulk_response(result, all_or_nothing)
+
+
+class ChangeFeedAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        # Without ?since= only the current cursor is returned: fetch it, then the full
+        # lists, then poll ?since=<cursor> and apply the changes in order
+        since = request.query_params.get("since")
+        if since is None:
+            return Response({"changes": [], "cursor": changefeed.latest_seq(), "has_more": False})
+
+        try:
+            since = int(since)
+            page_size = int(request.query_params.get("page_size", 0)) or None
+        except ValueError:
+            return Response({"detail": "since and page_size must be integers."}, status=400)
+        if since < 0 or (page_size is not None and page_size < 0):
+            return Response({"detail": "since and page_size cannot be negative."}, status=400)
+
+        try:
+            changes, cursor, has_more = changefeed.changes_since(request.user, since, page_size)
+        except changefeed.ResyncRequired:
+            return Response({"detail": "Changes since this cursor are no longer kept; fetch the full lists again."}, status=410)
+        return Response({"changes": changes, "cursor": cursor, "has_more": has_more})
+
+
+class AnalyticsAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.user_type != 'super_admin':
+            return Response({"detail": "Only super admins can read analytics."}, status=403)
+
+        default_start, default_end = analytics.default_window()
+        start = filters.parse_datetime_param(request.query_params, 'start') or default_start
+        end = filters.parse_datetime_param(request.query_params, 'end') or default_end
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in analytics.BUCKETS:
+            return Response({"bucket": [f"Choose one of: {', '.join(analytics.BUCKETS)}."]}, status=400)
+        if start >= end:
+            return Response({"detail": "start must be before end."}, status=400)
+
+        try:
+            return Response(analytics.cached_report(start, end, bucket))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+
+class AuditLogAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.user_type != 'super_admin':
+            return Response({"detail": "Only super admins can read the audit log."}, status=403)
+
+        logs = filters.filter_audit_logs(models.AuditLog.objects.select_related('actor'), request.query_params)
+        paginator = pagination.AuditLogPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = serializers.AuditLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ExportAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, resource):
+        if request.user.user_type != 'super_admin':
+            return Response({"detail": "Only super admins can export data."}, status=403)
+
+        if resource not in export.EXPORTS:
+            return Response({"detail": f"Unknown export '{resource}'."}, status=404)
+
+        # `format` is taken by DRF's content negotiation
+        output_format = request.query_params.get("output", "ndjson")
+        if output_format not in export.FORMATS:
+            return Response({"detail": "output must be 'ndjson' or 'csv'."}, status=400)
+
+        compress = request.query_params.get("gzip") in ['1', 'true']
+        chunks = export.stream(resource, output_format, request.query_params, compress=compress)
+
+        filename = f"{resource}.{output_format}"
+        if compress:
+            response = StreamingHttpResponse(chunks, content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(chunks, content_type=f"{export.FORMATS[output_format]}; charset=utf-8")
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response